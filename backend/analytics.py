@@ -0,0 +1,380 @@
+# analytics.py
+# Statistics over a user's full set history. The sets are pulled once into a
+# columnar pandas frame (cached per user, and caught up with later writes
+# instead of reloaded) and every statistic is computed with vectorised
+# pandas/NumPy operations instead of Python loops.
+#   FRAME_CACHE_MAX_BYTES=268435456
+import os
+import threading
+from collections import OrderedDict
+from datetime import date as Date
+from typing import Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlmodel import Session, select
+from database import User
+
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LTTB_PASSES = 32
+EPOCH = Date(1970, 1, 1).toordinal()  # day numbers count from here
+
+# Rep ranges used for personal records: (label, lowest reps, highest reps)
+REP_RANGES = [("1", 1, 1), ("2-3", 2, 3), ("4-6", 4, 6), ("7-10", 7, 10), ("11-15", 11, 15), ("16+", 16, None)]
+
+MUSCLE_GROUPS = {
+    "bench press": "chest", "incline bench press": "chest", "dumbbell press": "chest",
+    "chest fly": "chest", "push ups": "chest", "dips": "chest",
+    "squat": "legs", "front squat": "legs", "leg press": "legs", "lunges": "legs",
+    "leg extension": "legs", "leg curl": "legs", "calf raise": "legs", "romanian deadlift": "legs",
+    "deadlift": "back", "barbell row": "back", "dumbbell row": "back", "pull ups": "back",
+    "chin ups": "back", "lat pulldown": "back", "seated row": "back",
+    "overhead press": "shoulders", "shoulder press": "shoulders", "lateral raise": "shoulders",
+    "rear delt fly": "shoulders", "face pull": "shoulders",
+    "bicep curl": "arms", "hammer curl": "arms", "tricep pushdown": "arms",
+    "overhead tricep extension": "arms", "skull crushers": "arms",
+    "plank": "core", "crunches": "core", "hanging leg raise": "core",
+}
+
+class FrameCache:
+    # LRU of per-user frames, each tagged with the change-log revision it was
+    # built at, bounded by the frames' memory rather than their number
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # user id -> (revision, frame, bytes)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, user_id: int):
+        # (revision, frame), or (None, None)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None, None
+            self.entries.move_to_end(user_id)
+            return entry[0], entry[1]
+
+    def put(self, user_id: int, revision: int, frame):
+        size = int(frame.memory_usage(deep=True).sum())
+        with self.lock:
+            old = self.entries.get(user_id)
+            if old and old[0] > revision:
+                return  # a newer frame was stored meanwhile
+            if old:
+                del self.entries[user_id]
+                self.bytes -= old[2]
+            if size > self.max_bytes:
+                return
+            self.entries[user_id] = (revision, frame, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+frame_cache = FrameCache(FRAME_CACHE_MAX_BYTES)
+
+# Plain text query: skips per-row Date conversion, which dominates load time.
+# Every set is loaded, including those without reps or weight (planks,
+# bodyweight work): they count as training days, and only the volume and
+# e1RM calculations leave them out.
+FRAME_QUERY = (
+    "SELECT w.id, w.date, w.exercise_type_id, e.name, t.name, w.reps, w.weight FROM workout w "
+    "JOIN exercise e ON e.id = w.exercise_id "
+    "JOIN exercisetype t ON t.id = w.exercise_type_id "
+    "WHERE w.user_id = :user_id"
+)
+
+def load_frame(session: Session, user_id: int):
+    # Every set write takes a new change-log revision (crud.revision), so a
+    # cached frame is brought up to date with the sets changed and deleted
+    # since its revision, the way GET /sync catches clients up, instead of
+    # being reloaded. The revision is read before the rows: a write committed
+    # in between is applied again next time, which changes nothing.
+    current = session.exec(select(User.revision).where(User.id == user_id)).one()
+    revision, frame = frame_cache.get(user_id)
+    if frame is not None and revision >= current:
+        return frame
+    if frame is None:
+        frame = label(build_frame(session.connection().execute(
+            text(FRAME_QUERY), {"user_id": user_id}
+        ).fetchall()))
+    else:
+        frame = apply_changes(session, user_id, frame, revision)
+    frame_cache.put(user_id, current, frame)
+    return frame
+
+def build_frame(rows):
+    frame = pd.DataFrame(rows, columns=["id", "date", "type_id", "name", "catalog", "reps", "weight"])
+    if len(frame) and isinstance(frame["date"].iloc[0], str):
+        frame["date"] = pd.to_datetime(frame["date"], format="%Y-%m-%d")
+    else:
+        frame["date"] = pd.to_datetime(frame["date"])
+    frame["id"] = frame["id"].astype(np.int64)
+    frame["type_id"] = frame["type_id"].astype(np.int64)
+    frame["name"] = frame["name"].astype("category")
+    frame["catalog"] = frame["catalog"].astype("category")
+    # NaN where a set has no reps or weight, so volume is NaN there too
+    frame["reps"] = frame["reps"].astype(np.float64)
+    frame["weight"] = frame["weight"].astype(np.float64)
+    frame["volume"] = frame["reps"] * frame["weight"]
+    # Integer day numbers and Monday-based week starts make grouping cheap
+    # (1970-01-01 was a Thursday)
+    frame["day"] = frame["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    frame["week"] = frame["day"] - (frame["day"] + 3) % 7
+    return frame.sort_values("day", kind="stable").reset_index(drop=True)
+
+def label(frame):
+    # Results are labelled with the user's own name for each exercise (the
+    # latest spelling, if they used several); the catalog name only picks
+    # the muscle group
+    labels = frame.groupby("type_id")["name"].last()
+    return frame.assign(exercise=frame["type_id"].map(labels).astype("category"))
+
+def apply_changes(session: Session, user_id: int, frame, since: int):
+    # The frame without the sets changed or deleted after revision since,
+    # plus their current rows
+    params = {"user_id": user_id, "since": since}
+    changed = build_frame(session.connection().execute(
+        text(FRAME_QUERY + " AND w.rev > :since"), params
+    ).fetchall())
+    deleted = session.connection().execute(text(
+        "SELECT entity_id FROM tombstone WHERE user_id = :user_id AND kind = 'set' AND rev > :since"
+    ), params).scalars().all()
+    kept = frame[~frame["id"].isin(np.concatenate((changed["id"].to_numpy(), np.array(deleted, dtype=np.int64))))]
+    kept = kept.drop(columns="exercise")
+    if changed.empty:
+        return label(kept.reset_index(drop=True))
+    # Concatenated categoricals stay categorical only with equal categories
+    for column in ("name", "catalog"):
+        categories = kept[column].cat.categories.union(changed[column].cat.categories)
+        kept = kept.assign(**{column: kept[column].cat.set_categories(categories)})
+        changed = changed.assign(**{column: changed[column].cat.set_categories(categories)})
+    merged = pd.concat([kept, changed], ignore_index=True)
+    # New sets are usually on the latest day, which needs no re-sort
+    if len(kept) and changed["day"].iloc[0] < kept["day"].iloc[-1]:
+        merged = merged.sort_values("day", kind="stable").reset_index(drop=True)
+    return label(merged)
+
+def filter_dates(frame, date_from: Optional[Date] = None, date_to: Optional[Date] = None):
+    if date_from:
+        frame = frame[frame["date"] >= pd.Timestamp(date_from)]
+    if date_to:
+        frame = frame[frame["date"] <= pd.Timestamp(date_to)]
+    return frame
+
+def estimated_1rm(weight, reps, formula: str = "epley"):
+    # A single rep is its own max; Brzycki is undefined from 37 reps up
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    if formula == "epley":
+        estimate = weight * (1 + reps / 30)
+    elif formula == "brzycki":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = np.where(reps < 37, weight * 36 / (37 - reps), np.nan)
+    else:
+        raise ValueError(f"Unknown formula '{formula}', expected epley or brzycki")
+    return np.where(reps == 1, weight, estimate)
+
+def layout_points(columns: dict, layout: str = "rows"):
+    # A series given as parallel columns ({"date": [...], "weight": [...]})
+    # as one object per point ("rows"), or as the columns themselves with the
+    # dates under "dates" ("columns"), which is a fraction of the size
+    if layout == "columns":
+        return {("dates" if name == "date" else name): values for name, values in columns.items()}
+    if layout == "rows":
+        return [dict(zip(columns, point)) for point in zip(*columns.values())]
+    raise ValueError(f"Unknown layout '{layout}', expected rows or columns")
+
+def bucket_keys(days: np.ndarray, bucket: str):
+    # Day numbers -> the day number of their day, week (Monday) or month
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        return days - (days + 3) % 7
+    if bucket == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"Unknown bucket '{bucket}', expected day, week or month")
+
+def records(values: np.ndarray):
+    # Points above every earlier one (the first point included); NaN never is
+    best_before = np.concatenate(([-np.inf], np.fmax.accumulate(values)[:-1]))
+    with np.errstate(invalid="ignore"):
+        return values > best_before
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int):
+    # Largest-Triangle-Three-Buckets: indices of n points that keep the shape
+    # of the line, always with the first and the last. The points in between
+    # are split into n - 2 buckets and each bucket keeps the point forming the
+    # largest triangle with the point kept before it and the average of the
+    # next bucket. Rather than walking the buckets one at a time, every bucket
+    # is picked at once against the previous pass's picks until nothing
+    # changes; a pick only moves after the one before it did, so that is the
+    # same result, usually after a handful of passes. Whatever is still
+    # moving after LTTB_PASSES is finished bucket by bucket.
+    size = x.size
+    if n >= size:
+        return np.arange(size)
+    if n <= 2:
+        return np.array([0, size - 1][:max(n, 0)], dtype=np.int64)
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    next_x = np.append(((sum_x[edges[1:]] - sum_x[edges[:-1]]) / counts)[1:], x[-1])
+    next_y = np.append(((sum_y[edges[1:]] - sum_y[edges[:-1]]) / counts)[1:], y[-1])
+    bucket = np.repeat(np.arange(n - 2), counts)  # of each point between the first and the last
+    px, py, nx, ny = x[1:-1], y[1:-1], next_x[bucket], next_y[bucket]
+    kept = edges[:-1].copy()
+    for _ in range(LTTB_PASSES):
+        anchor = np.concatenate(([0], kept[:-1]))[bucket]
+        ax, ay = x[anchor], y[anchor]
+        area = np.abs((ax - nx) * (py - ay) - (ax - px) * (ny - ay))
+        # Largest area first within each bucket, the earliest on ties
+        picked = np.lexsort((-area, bucket))[edges[:-1] - 1] + 1
+        moved = np.flatnonzero(picked != kept)
+        kept = picked
+        if not moved.size:
+            break
+    else:
+        a = kept[moved[0] - 1] if moved[0] else 0
+        for b in range(moved[0], n - 2):
+            lo, hi = edges[b], edges[b + 1]
+            area = np.abs((x[a] - next_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[b] - y[a]))
+            a = kept[b] = lo + int(np.argmax(area))
+    return np.concatenate(([0], kept, [size - 1]))
+
+def downsample(series: dict, max_points: Optional[int] = None, bucket: Optional[str] = None):
+    # Shrinks a progression series (parallel "date", "volume", "weight" and
+    # "reps" columns, chronological) for charting. bucket keeps one point per
+    # day, week or month: the one with the highest volume, earliest on ties.
+    # max_points then picks that many with LTTB on volume over time. Weight
+    # and volume records are always kept, as are the first and last points,
+    # so a series can only exceed max_points by its records, whose number
+    # depends on how far the lifter progressed, not on how long they trained.
+    if bucket is None and (max_points is None or len(series["date"]) <= max_points):
+        return series
+    days = np.fromiter(map(Date.toordinal, series["date"]), np.int64, len(series["date"])) - EPOCH
+    volume = np.asarray(series["volume"], dtype=np.float64)
+    weight = np.array(series["weight"], dtype=np.float64)
+    keep = records(weight) | records(volume)
+    keep[[0, -1]] = True
+    index = np.arange(days.size)
+    if bucket is not None:
+        keys = bucket_keys(days, bucket)
+        # Highest volume first within each bucket, then the first of each
+        order = np.lexsort((index, -volume, keys))
+        first = np.concatenate(([True], keys[order][1:] != keys[order][:-1]))
+        index = np.flatnonzero(keep | np.isin(index, order[first]))
+    if max_points is not None and index.size > max_points:
+        must = index[keep[index]]
+        rest = lttb(days[index].astype(np.float64), volume[index], max_points - must.size)
+        index = np.union1d(must, index[rest])
+    return {name: [values[i] for i in index.tolist()] for name, values in series.items()}
+
+def iso_dates(days):
+    # Day numbers -> "YYYY-MM-DD" strings, vectorised
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype("datetime64[D]")).tolist()
+
+def one_rep_max_history(frame, exercise_type_id: int, formula: str = "epley", window: int = 5,
+                        layout: str = "rows"):
+    sets = frame[frame["type_id"] == exercise_type_id].dropna(subset=["reps", "weight"])
+    if sets.empty:
+        return None
+    e1rm = pd.Series(estimated_1rm(sets["weight"], sets["reps"], formula), index=sets.index)
+    daily = e1rm.groupby(sets["day"].to_numpy()).max().dropna()
+    if daily.empty:
+        return None
+    rolling = daily.rolling(window, min_periods=1).mean()
+    best = daily.cummax()
+    return layout_points({
+        "date": iso_dates(daily.index),
+        "e1rm": daily.round(2).tolist(),
+        "rolling_avg": rolling.round(2).tolist(),
+        "best": best.round(2).tolist(),
+    }, layout)
+
+def personal_records(frame, exercise_type_id: Optional[int] = None):
+    if exercise_type_id is not None:
+        frame = frame[frame["type_id"] == exercise_type_id]
+    frame = frame.dropna(subset=["reps", "weight"])
+    if frame.empty:
+        return {}
+    edges = [0] + [high if high else np.inf for _, _, high in REP_RANGES]
+    labels = [label for label, _, _ in REP_RANGES]
+    rep_range = pd.cut(frame["reps"], bins=edges, labels=labels)
+
+    # Heaviest set per (exercise, rep range); the earliest date wins ties
+    best = frame.groupby([frame["exercise"], rep_range], observed=True)["weight"].idxmax()
+    records = frame.loc[best.to_numpy()]
+
+    result = {}
+    dates = iso_dates(records["day"])
+    for (exercise, label), weight, reps, d in zip(best.index, records["weight"], records["reps"], dates):
+        result.setdefault(exercise, {})[label] = {"weight": float(weight), "reps": int(reps), "date": d}
+    return result
+
+def weekly_volume(frame, by: str = "exercise", window: int = 4):
+    if frame.empty:
+        return {"weeks": [], "series": {}}
+    if by == "muscle_group":
+        # Mapped per category, not per row
+        groups = frame["catalog"].map({
+            name: MUSCLE_GROUPS.get(str(name).strip().lower(), "other")
+            for name in frame["catalog"].cat.categories
+        })
+    elif by == "exercise":
+        groups = frame["exercise"]
+    else:
+        raise ValueError(f"Unknown grouping '{by}', expected exercise or muscle_group")
+
+    # Weeks start on Monday; weeks without training show up as zero volume, as
+    # do sets without reps or weight (NaN, which sum skips)
+    table = frame["volume"].groupby([frame["week"], groups], observed=True).sum().unstack(fill_value=0.0)
+    table = table.reindex(np.arange(table.index.min(), table.index.max() + 1, 7), fill_value=0.0)
+    rolling = table.rolling(window, min_periods=1).mean()
+
+    return {
+        "weeks": iso_dates(table.index),
+        "series": {
+            str(group): {
+                "volume": table[group].round(2).tolist(),
+                "rolling_avg": rolling[group].round(2).tolist(),
+            }
+            for group in table.columns
+        },
+    }
+
+def runs(values: np.ndarray, step: int):
+    # Lengths of runs of consecutive integers (e.g. day or week numbers)
+    if values.size == 0:
+        return np.array([], dtype=np.int64), values
+    breaks = np.flatnonzero(np.diff(values) != step)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [values.size - 1]))
+    return ends - starts + 1, values[ends]
+
+def streaks(frame, today: Optional[Date] = None):
+    today_day = np.datetime64(today or Date.today(), "D").astype(np.int64)
+    today_week = (today_day + 3) // 7
+    # frame is sorted by day, so unique values come out in order
+    days = pd.unique(frame["day"].to_numpy())
+    weeks = np.unique((days + 3) // 7)
+
+    day_runs, day_ends = runs(days, 1)
+    week_runs, week_ends = runs(weeks, 1)
+    # A streak is still current if it reached today/yesterday (this/last week)
+    current_days = int(day_runs[-1]) if day_runs.size and day_ends[-1] >= today_day - 1 else 0
+    current_weeks = int(week_runs[-1]) if week_runs.size and week_ends[-1] >= today_week - 1 else 0
+
+    return {
+        "training_days": int(days.size),
+        "current_day_streak": current_days,
+        "longest_day_streak": int(day_runs.max()) if day_runs.size else 0,
+        "current_week_streak": current_weeks,
+        "longest_week_streak": int(week_runs.max()) if week_runs.size else 0,
+    }
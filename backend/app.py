@@ -1,14 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Path, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Annotated, List, Literal, Optional
 from sqlmodel import Session, select, SQLModel
-from database import init_db, engine, User, Workout, Template, Exercise
-from auth import router as auth_router, get_current_user
+from sqlalchemy import bindparam, delete, func, literal, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from database import init_db, get_session, get_read_session, get_read_db, run_db, pool_stats, DB_WRITE_QUEUE, User, Workout, Template, TemplateItem, Exercise, ExerciseStats
+from auth import router as auth_router, get_current_user, get_current_user_async, user_cache
+from crud import (dialect_insert, ensure_exercises, insert_sets, lock_exercises, record_deletes, refresh_stats,
+                  revision, save_template_items)
+from idempotency import Idempotency, idempotency_key
+from serialization import JSONResponse
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware
+import metrics
+import catalog
+from importer import import_file
+from exporter import export_stream, MEDIA_TYPES
+from writer import set_writer
+import analytics
+import sync
+import versions
+import response_cache
+import base64
 import json
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, field_validator
+from datetime import date as Date, datetime, timedelta
+import calendar
+from collections import defaultdict
 
-app = FastAPI()
+app = FastAPI(default_response_class=JSONResponse)
 init_db()
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
@@ -23,11 +44,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so latency includes compression
+app.add_middleware(MetricsMiddleware)
 
 class Set(BaseModel):
     reps: int
     weight: float
 
+class SetUpdate(BaseModel):
+    reps: Optional[int] = None
+    weight: Optional[float] = None
+
+    @field_validator("reps")
+    @classmethod
+    def reps_not_null(cls, reps):
+        # reps can be left out, but not cleared: every set has them
+        if reps is None:
+            raise ValueError("reps cannot be null")
+        return reps
+
+class SetOrder(BaseModel):
+    set_ids: List[int]
+
 class ExerciseRequest(BaseModel):
     name: str
     sets: List[Set] = []
@@ -36,158 +75,549 @@ class TemplateCreate(BaseModel):
     name: str
     exercises: List[str] = []
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+class DayLog(BaseModel):
+    date: Date
+    exercises: List[ExerciseRequest] = []
+
+class BulkLog(BaseModel):
+    days: List[DayLog]
+
+class SyncChange(BaseModel):
+    # One change made offline (see sync.py). Creates name exercises and sets
+    # by date and exercise name and templates by name; updates and deletes
+    # name the row by id, with the rev it had when the client last saw it.
+    kind: Literal["exercise", "set", "template"]
+    op: Literal["create", "update", "delete"]
+    ref: Optional[str] = None  # echoed in the change's result
+    id: Optional[int] = None
+    base_rev: int = 0
+    date: Optional[Date] = None
+    exercise: Optional[str] = None
+    reps: Optional[int] = None
+    weight: Optional[float] = None
+    name: Optional[str] = None
+    exercises: Optional[List[str]] = None
+
+class SyncBatch(BaseModel):
+    changes: List[SyncChange] = []
+    since: Optional[int] = None  # also return the changes after this revision
 
+MAX_BULK_SETS = 5000
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+
+@app.on_event("shutdown")
+def flush_writer():
+    set_writer.stop()
+
+@app.get("/pool_stats")
+def get_pool_stats():
+    stats = pool_stats()
+    if DB_WRITE_QUEUE:
+        stats["writer"] = set_writer.stats()
+    return stats
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus scrape target: the request metrics plus pool and cache gauges
+    pools = pool_stats()
+    analytics_cache = response_cache.cache_stats()
+    users = user_cache.stats()
+    extra = [
+        metrics.snapshot("gymtracker_db_pool_checked_out", "Connections in use.", ("engine",),
+                         {(name,): stats["checked_out"] for name, stats in pools.items()}),
+        metrics.snapshot("gymtracker_db_pool_checkouts_total", "Connections handed out.", ("engine",),
+                         {(name,): stats["checkouts"] for name, stats in pools.items()}, "counter"),
+        metrics.snapshot("gymtracker_cache_hits_total", "Cache hits.", ("cache",),
+                         {("analytics",): analytics_cache.get("hits"), ("user",): users["hits"]}, "counter"),
+        metrics.snapshot("gymtracker_cache_misses_total", "Cache misses.", ("cache",),
+                         {("analytics",): analytics_cache.get("misses"), ("user",): users["misses"]}, "counter"),
+    ]
+    if DB_WRITE_QUEUE:
+        extra.append(metrics.snapshot("gymtracker_writer_queued", "Sets waiting for the writer.", (),
+                                      {(): set_writer.stats()["queued"]}))
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
 
 @app.post("/add_exercise/{date}")
 def add_exercise(
-    date: str,
+    date: Date,
     exercise: ExerciseRequest,
+    include_day: bool = False,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
-    # Check if exercise already exists
-    existing = session.exec(
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    # Create exercise entry without sets. ON CONFLICT DO NOTHING on the unique
+    # (user_id, date, exercise_type_id) index: a duplicate, even one from a
+    # concurrent request, inserts nothing. The revision is taken before
+    # anything else is written (see crud.revision)
+    rev = revision(session, current_user.id)
+    type_id = catalog.resolve(session, [exercise.name])[exercise.name]
+    added = session.exec(
+        dialect_insert(session)(Exercise)
+        .values(user_id=current_user.id, date=date, exercise_type_id=type_id, name=exercise.name, rev=rev)
+        .on_conflict_do_nothing(index_elements=["user_id", "date", "exercise_type_id"])
+        .returning(Exercise.id)
+    ).first()
+    if not added:
+        session.rollback()
+        return {"error": f"Exercise '{exercise.name}' already exists for {date}"}
+    versions.bump(session, current_user.id, versions.days_touched([date]))
+    content = {"message": f"Exercise '{exercise.name}' added for {date}"}
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
+
+def find_exercise(session: Session, user_id: int, date: Date, exercise_name: str):
+    # The user's Exercise row for exercise_name (any spelling or alias) on date
+    type_id = catalog.lookup(session, exercise_name)
+    if type_id is None:
+        return None
+    return session.exec(
         select(Exercise).where(
-            Exercise.user_id == current_user.id,
+            Exercise.user_id == user_id,
             Exercise.date == date,
-            Exercise.name == exercise.name
+            Exercise.exercise_type_id == type_id
         )
     ).first()
-    
-    if existing:
-        return {"error": f"Exercise '{exercise.name}' already exists for {date}"}
-    
-    # Create exercise entry without sets
-    new_exercise = Exercise(
-        user_id=current_user.id,
-        date=date,
-        name=exercise.name
-    )
-    session.add(new_exercise)
-    session.commit()
-    return {"message": f"Exercise '{exercise.name}' added for {date}"}
 
 @app.post("/add_set/{date}/{exercise_name}")
 def add_set(
-    date: str,
+    date: Date,
     exercise_name: str,
     new_set: Set,
+    include_day: bool = False,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
+    # With the write queue the key is recorded by the writer, in the batch
+    # that inserts the set
+    replayed = idem.replay(session) if DB_WRITE_QUEUE else idem.begin(session)
+    if replayed is not None:
+        return replayed
+
     # Check if the exercise exists (not workouts)
-    exercise = session.exec(
-        select(Exercise).where(
-            Exercise.user_id == current_user.id,
-            Exercise.date == date,
-            Exercise.name == exercise_name
-        )
-    ).first()
-    
+    exercise = find_exercise(session, current_user.id, date, exercise_name)
     if not exercise:
         return {"error": "Exercise not found for this date."}
-    
-    # Create the workout record (set)
-    w = Workout(
-        user_id=current_user.id,
-        date=date,
-        exercise_name=exercise_name,
-        reps=new_set.reps,
-        weight=new_set.weight
-    )
-    session.add(w)
-    session.commit()
-    return {"message": f"Set added to {exercise_name} on {date}"}
+    content = {"message": f"Set added to {exercise_name} on {date}"}
 
-@app.get("/workouts/{date}")
-def get_workouts(
-    date: str,
+    if DB_WRITE_QUEUE:
+        # Hand the insert to the single writer; the session is closed first
+        # so no connection (or WAL read snapshot) is held while waiting
+        exercise_id, type_id = exercise.id, exercise.exercise_type_id
+        session.close()
+        try:
+            set_writer.add_set(current_user.id, exercise_id, date, type_id, new_set.reps, new_set.weight,
+                               idempotency=idem if idem.key else None, content=content)
+        except IntegrityError:
+            # A retry with the same key was written first
+            replayed = idem.replay(session)
+            if replayed is None:
+                raise
+            return replayed
+        # Read after the writer committed; a replay of this key returns the
+        # response without the day
+        return with_day(session, dict(content), current_user.id, date, include_day)
+
+    # Create the workout record (set), after the exercise's last set
+    insert_sets(session, current_user.id, {(date, exercise.exercise_type_id): exercise.id},
+                [(date, exercise.exercise_type_id, new_set.reps, new_set.weight)])
+    refresh_stats(session, [exercise.id])
+    versions.bump(session, current_user.id, versions.days_touched([date], exercises=False) | {versions.SETS})
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
+
+@app.post("/log_workouts")
+def log_workouts(
+    log: BulkLog,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
-    # Get exercises for this date
-    exercises = session.exec(
-        select(Exercise).where(
-            Exercise.user_id == current_user.id,
-            Exercise.date == date
-        )
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    # Collect every (date, exercise) with its sets; repeats (including other
+    # spellings of the same exercise) are merged under the first spelling
+    revision(session, current_user.id)
+    type_ids = catalog.resolve(session, (e.name for day in log.days for e in day.exercises))
+    entries, names = {}, {}
+    for day in log.days:
+        for exercise in day.exercises:
+            key = (day.date, type_ids[exercise.name])
+            entries.setdefault(key, []).extend(exercise.sets)
+            names.setdefault(key, exercise.name)
+    set_count = sum(len(sets) for sets in entries.values())
+    if set_count > MAX_BULK_SETS:
+        return {"error": f"Too many sets in one request (max {MAX_BULK_SETS})."}
+    if not entries:
+        return {"message": "Nothing to log."}
+
+    try:
+        exercise_ids = ensure_exercises(session, current_user.id, names)
+        insert_sets(session, current_user.id, exercise_ids, (
+            (d, type_id, new_set.reps, new_set.weight)
+            for (d, type_id), sets in entries.items()
+            for new_set in sets
+        ))
+        refresh_stats(session, (exercise_ids[key] for key, sets in entries.items() if sets))
+        versions.bump(session, current_user.id, versions.days_touched(d for d, _ in entries) | {versions.SETS})
+        return idem.commit(session, {"message": f"Logged {set_count} sets across {len(entries)} exercises."})
+    except IntegrityError:
+        session.rollback()
+        return {"error": "Workouts changed while logging, please retry."}
+
+@app.post("/import")
+def import_workouts(
+    file: UploadFile,
+    file_format: Annotated[Optional[str], Query(alias="format")] = None,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    # Uploads are spooled to disk by Starlette and read back in chunks
+    if not file_format:
+        file_format = "jsonl" if (file.filename or "").endswith((".jsonl", ".ndjson")) else "csv"
+    try:
+        report = import_file(session, current_user.id, file.file, file_format)
+    except ValueError as e:
+        return {"error": str(e)}
+    return report.as_dict()
+
+@app.get("/export")
+def export_history(
+    file_format: Annotated[str, Query(alias="format")] = "csv",
+    date_from: Annotated[Optional[Date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[Date], Query(alias="to")] = None,
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        stream = export_stream(current_user.id, file_format, date_from, date_to)
+    except ValueError as e:
+        return {"error": str(e)}
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="gymtracker-export.{file_format}"'},
+    )
+
+def load_day(session: Session, user_id: int, date: Date):
+    # One outer join fetches every exercise for the day together with its sets,
+    # grouped in a single pass (exercises without sets still show up)
+    rows = session.exec(
+        select(Exercise.id, Exercise.name, Workout.id, Workout.ordinal, Workout.reps, Workout.weight)
+        .outerjoin(Workout, Workout.exercise_id == Exercise.id)
+        .where(Exercise.user_id == user_id, Exercise.date == date)
+        .order_by(Exercise.id, Workout.ordinal)
     ).all()
-    
+
     result = []
-    for exercise in exercises:
-        # Get sets for each exercise
-        workouts = session.exec(
-            select(Workout).where(
-                Workout.user_id == current_user.id,
-                Workout.date == date,
-                Workout.exercise_name == exercise.name
-            )
-        ).all()
-        
-        sets = [{"reps": w.reps, "weight": w.weight} for w in workouts]
-        result.append({"name": exercise.name, "sets": sets})
-    
+    by_exercise = {}
+    for exercise_id, name, set_id, ordinal, reps, weight in rows:
+        entry = by_exercise.get(exercise_id)
+        if entry is None:
+            entry = by_exercise[exercise_id] = {"name": name, "sets": []}
+            result.append(entry)
+        if set_id is not None:
+            entry["sets"].append({"id": set_id, "ordinal": ordinal, "reps": reps, "weight": weight})
+
     return {"date": date, "exercises": result}
 
+def with_day(session: Session, content: dict, user_id: int, date: Date, include_day: bool):
+    # With ?include_day=true a write's response also carries the updated day
+    # view, read in the write's own transaction, so the client can render it
+    # without a follow-up GET /workouts/{date}
+    if include_day:
+        content["day"] = load_day(session, user_id, date)
+    return content
+
+@app.get("/workouts/{date}")
+async def get_workouts(
+    date: Date,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
+):
+    stamp = await run_db(session, versions.stamp, current_user.id, versions.day(date))
+    if stamp.matches(request):
+        return stamp.not_modified()
+    stamp.apply(response)
+    return await run_db(session, load_day, current_user.id, date)
+
+def encode_cursor(d: Date, exercise_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{d.isoformat()}:{exercise_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    # (date, exercise id) of the last entry on the previous page
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        d, exercise_id = raw.split(":")
+        return Date.fromisoformat(d), int(exercise_id)
+    except ValueError:
+        return None
+
+def load_history(session: Session, user_id: int, date_from: Optional[Date], date_to: Optional[Date],
+                 exercise_name: Optional[str], cursor: Optional[str], limit: int):
+    # One page of exercise entries in (date, id) order, resuming after the
+    # cursor on the (user_id[, exercise_type_id], date, id) index instead of
+    # skipping rows with OFFSET, plus one query for all of the page's sets
+    query = (
+        select(Exercise.id, Exercise.date, Exercise.name)
+        .where(Exercise.user_id == user_id)
+    )
+    if exercise_name:
+        type_id = catalog.lookup(session, exercise_name)
+        if type_id is None:
+            return {"days": [], "next_cursor": None}
+        query = query.where(Exercise.exercise_type_id == type_id)
+    if date_from:
+        query = query.where(Exercise.date >= date_from)
+    if date_to:
+        query = query.where(Exercise.date <= date_to)
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return {"error": "Invalid cursor."}
+        query = query.where(tuple_(Exercise.date, Exercise.id) > tuple_(*after))
+    entries = session.exec(query.order_by(Exercise.date, Exercise.id).limit(limit + 1)).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1][1], entries[-1][0])
+
+    sets = defaultdict(list)
+    if entries:
+        for exercise_id, set_id, ordinal, reps, weight in session.exec(
+            select(Workout.exercise_id, Workout.id, Workout.ordinal, Workout.reps, Workout.weight)
+            .where(Workout.exercise_id.in_([exercise_id for exercise_id, _, _ in entries]))
+            .order_by(Workout.exercise_id, Workout.ordinal)
+        ).all():
+            sets[exercise_id].append({"id": set_id, "ordinal": ordinal, "reps": reps, "weight": weight})
+
+    # Grouped like the day view; a day can continue on the next page
+    days = []
+    for exercise_id, d, name in entries:
+        if not days or days[-1]["date"] != d:
+            days.append({"date": d, "exercises": []})
+        days[-1]["exercises"].append({"name": name, "sets": sets[exercise_id]})
+    return {"days": days, "next_cursor": next_cursor}
+
+@app.get("/workouts")
+async def list_workouts(
+    date_from: Annotated[Optional[Date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[Date], Query(alias="to")] = None,
+    exercise: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_HISTORY_PAGE_SIZE)] = HISTORY_PAGE_SIZE,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
+):
+    # Workout history, limit exercise entries per page; pass next_cursor
+    # back as cursor for the following page (null on the last one)
+    return await run_db(session, load_history, current_user.id, date_from, date_to, exercise, cursor, limit)
+
+@app.get("/sync")
+async def pull_changes(
+    since: Annotated[int, Query(ge=0)] = 0,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
+):
+    # What changed after revision since (everything for 0); pass the returned
+    # revision as since next time. A full copy can run to thousands of rows,
+    # so it is rendered straight away rather than through jsonable_encoder.
+    return JSONResponse(await run_db(session, sync.load_changes, current_user.id, since))
+
+@app.post("/sync")
+def push_changes(
+    batch: SyncBatch,
+    current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
+    session: Session = Depends(get_session),
+):
+    # Changes made offline, applied together; with since, the response also
+    # carries everything that changed after it, the batch included
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    if len(batch.changes) > MAX_BULK_SETS:
+        return {"error": f"Too many changes in one request (max {MAX_BULK_SETS})."}
+    try:
+        content = {"results": sync.apply_changes(session, current_user.id, batch.changes)}
+    except IntegrityError:
+        session.rollback()
+        return {"error": "Workouts changed while syncing, please retry."}
+    if batch.since is not None:
+        content.update(sync.load_changes(session, current_user.id, batch.since))
+    else:
+        content["revision"] = sync.current_revision(session, current_user.id)
+    return JSONResponse(idem.commit(session, content))
+
 @app.delete("/delete_exercise/{date}/{exercise_name}")
 def delete_exercise(
-    date: str,
+    date: Date,
     exercise_name: str,
+    include_day: bool = False,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
     # Find the exercise record
-    exercise = session.exec(
-        select(Exercise).where(
-            Exercise.user_id == current_user.id,
-            Exercise.date == date,
-            Exercise.name == exercise_name
-        )
-    ).first()
-    
+    exercise = find_exercise(session, current_user.id, date, exercise_name)
     if not exercise:
         return {"error": "Exercise not found for this date."}
+    revision(session, current_user.id)
     
-    # Delete all associated workout records (sets)
-    workouts = session.exec(
-        select(Workout).where(
-            Workout.user_id == current_user.id,
-            Workout.date == date,
-            Workout.exercise_name == exercise_name
-        )
-    ).all()
-    
-    for w in workouts:
-        session.delete(w)
-    
+    # Delete all associated workout records (sets) and their summary
+    session.exec(delete(ExerciseStats).where(ExerciseStats.exercise_id == exercise.id))
+    set_ids = session.exec(
+        delete(Workout).where(Workout.exercise_id == exercise.id).returning(Workout.id)
+    ).scalars().all()
+
     # Delete the exercise record itself
     session.delete(exercise)
-    session.commit()
-    return {"message": f"Exercise '{exercise_name}' deleted from {date}"}
+    record_deletes(session, current_user.id, {"exercise": [exercise.id], "set": set_ids})
+    versions.bump(session, current_user.id, versions.days_touched([date]) | {versions.SETS})
+    content = {"message": f"Exercise '{exercise_name}' deleted from {date}"}
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
 
 @app.delete("/delete_set/{date}/{exercise_name}/{set_index}")
 def delete_set(
-    date: str,
+    date: Date,
     exercise_name: str,
     set_index: int,
+    include_day: bool = False,
+    current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
+    session: Session = Depends(get_session),
+):
+    # A retried delete must not remove the set that moved into set_index
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    # The set_index-th set in set order, read off the (exercise_id, ordinal)
+    # index; DELETE /sets/{set_id} avoids the offset altogether
+    exercise = find_exercise(session, current_user.id, date, exercise_name)
+    if not exercise or set_index < 0:
+        return {"error": "Set not found."}
+    set_id = session.exec(
+        select(Workout.id).where(Workout.exercise_id == exercise.id)
+        .order_by(Workout.ordinal).offset(set_index).limit(1)
+    ).first()
+    if set_id is None:
+        return {"error": "Set not found."}
+    revision(session, current_user.id)
+    session.exec(delete(Workout).where(Workout.id == set_id))
+    record_deletes(session, current_user.id, {"set": [set_id]})
+    refresh_stats(session, [exercise.id])
+    versions.bump(session, current_user.id, versions.days_touched([date], exercises=False) | {versions.SETS})
+    content = {"message": f"Set {set_index + 1} deleted from {exercise_name} on {date}"}
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
+
+def set_view(row):
+    return {"id": row.id, "ordinal": row.ordinal, "reps": row.reps, "weight": row.weight}
+
+@app.patch("/sets/{set_id}")
+def update_set(
+    set_id: int,
+    changes: SetUpdate,
+    include_day: bool = False,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
-    workouts = session.exec(
-        select(Workout).where(
-            Workout.user_id == current_user.id,
-            Workout.date == date,
-            Workout.exercise_name == exercise_name
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    values = changes.model_dump(exclude_unset=True, exclude_none=True)
+    if not values:
+        return {"error": "Nothing to update."}
+    # One UPDATE by primary key
+    row = session.exec(
+        update(Workout)
+        .where(Workout.id == set_id, Workout.user_id == current_user.id)
+        .values(**values, rev=revision(session, current_user.id))
+        .returning(Workout.id, Workout.exercise_id, Workout.date, Workout.ordinal, Workout.reps, Workout.weight)
+    ).first()
+    if row is None:
+        return {"error": "Set not found."}
+    refresh_stats(session, [row.exercise_id])
+    versions.bump(session, current_user.id, versions.days_touched([row.date], exercises=False) | {versions.SETS})
+    content = {"message": f"Set {set_id} updated.", "set": set_view(row)}
+    return idem.commit(session, with_day(session, content, current_user.id, row.date, include_day))
+
+@app.delete("/sets/{set_id}")
+def delete_set_by_id(
+    set_id: int,
+    include_day: bool = False,
+    current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
+    session: Session = Depends(get_session),
+):
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    # One DELETE by primary key; the other sets keep their ordinals
+    revision(session, current_user.id)
+    row = session.exec(
+        delete(Workout)
+        .where(Workout.id == set_id, Workout.user_id == current_user.id)
+        .returning(Workout.exercise_id, Workout.date)
+    ).first()
+    if row is None:
+        return {"error": "Set not found."}
+    record_deletes(session, current_user.id, {"set": [set_id]})
+    refresh_stats(session, [row.exercise_id])
+    versions.bump(session, current_user.id, versions.days_touched([row.date], exercises=False) | {versions.SETS})
+    return idem.commit(session, with_day(session, {"message": f"Set {set_id} deleted."}, current_user.id, row.date,
+                                         include_day))
+
+@app.put("/sets/order")
+def reorder_sets(
+    order: SetOrder,
+    include_day: bool = False,
+    current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
+    session: Session = Depends(get_session),
+):
+    # set_ids lists every set of one exercise in its new order
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+    set_ids = order.set_ids
+    if not set_ids or len(set(set_ids)) != len(set_ids):
+        return {"error": "set_ids must list each set once."}
+    rows = session.exec(
+        select(Workout.exercise_id, Workout.date).where(
+            Workout.id.in_(set_ids),
+            Workout.user_id == current_user.id
         )
     ).all()
-    if not workouts or set_index >= len(workouts):
-        return {"error": "Set not found."}
-    session.delete(workouts[set_index])
-    session.commit()
-    return {"message": f"Set {set_index + 1} deleted from {exercise_name} on {date}"}
+    if len(rows) != len(set_ids) or len({exercise_id for exercise_id, _ in rows}) != 1:
+        return {"error": "Sets not found, or not all from one exercise."}
+    exercise_id, date = rows[0]
+    rev = revision(session, current_user.id)
+    lock_exercises(session, [exercise_id])
+    total = session.exec(select(func.count()).select_from(Workout).where(Workout.exercise_id == exercise_id)).one()
+    if total != len(set_ids):
+        return {"error": f"set_ids must list all {total} sets of the exercise."}
+
+    # Negate first so the unique (exercise_id, ordinal) index holds at every
+    # step, then number the sets 1..n in the given order
+    session.exec(update(Workout).where(Workout.exercise_id == exercise_id).values(ordinal=-Workout.ordinal, rev=rev))
+    session.connection().execute(
+        update(Workout.__table__).where(Workout.__table__.c.id == bindparam("set_id")).values(ordinal=bindparam("new_ordinal")),
+        [{"set_id": set_id, "new_ordinal": ordinal} for ordinal, set_id in enumerate(set_ids, start=1)],
+    )
+    refresh_stats(session, [exercise_id])
+    versions.bump(session, current_user.id, versions.days_touched([date], exercises=False) | {versions.SETS})
+    content = {"message": f"Reordered {len(set_ids)} sets."}
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
 
 
 
@@ -195,8 +625,12 @@ def delete_set(
 def add_template(
     template: TemplateCreate,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
     existing = session.exec(
         select(Template).where(
             Template.user_id == current_user.id,
@@ -208,63 +642,84 @@ def add_template(
     t = Template(
         user_id=current_user.id,
         name=template.name,
-        exercises=json.dumps(template.exercises)
+        rev=revision(session, current_user.id)
     )
     session.add(t)
-    session.commit()
-    return {"message": f"Template '{template.name}' added."}
+    session.flush()
+    save_template_items(session, t.id, template.exercises)
+    versions.bump(session, current_user.id, [versions.TEMPLATES])
+    return idem.commit(session, {"message": f"Template '{template.name}' added."})
 
-@app.get("/templates")
-def get_templates(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
-):
-    templates = session.exec(
-        select(Template).where(Template.user_id == current_user.id)
+def load_templates(session: Session, user_id: int):
+    # Templates with their exercise names, in one query (empty templates too)
+    rows = session.exec(
+        select(Template.name, TemplateItem.name)
+        .outerjoin(TemplateItem, TemplateItem.template_id == Template.id)
+        .where(Template.user_id == user_id)
+        .order_by(Template.id, TemplateItem.position)
     ).all()
-    result = {t.name: json.loads(t.exercises) for t in templates}
+    result = {}
+    for template_name, exercise_name in rows:
+        names = result.setdefault(template_name, [])
+        if exercise_name is not None:
+            names.append(exercise_name)
     return {"templates": result}
 
+@app.get("/templates")
+async def get_templates(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
+):
+    stamp = await run_db(session, versions.stamp, current_user.id, versions.TEMPLATES)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    stamp.apply(response)
+    return await run_db(session, load_templates, current_user.id)
+
 @app.post("/apply_template/{date}/{template_name}")
 def apply_template(
-    date: str,
+    date: Date,
     template_name: str,
+    include_day: bool = False,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
-    t = session.exec(
-        select(Template).where(
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
+
+    # One INSERT ... SELECT ... ON CONFLICT DO NOTHING creates the template's
+    # exercises in template order; the ones already on this date (including
+    # those a concurrent apply just added) are skipped by the unique index
+    items = (
+        select(literal(current_user.id), literal(date), TemplateItem.exercise_type_id, TemplateItem.name,
+               literal(revision(session, current_user.id)))
+        .join(Template, Template.id == TemplateItem.template_id)
+        .where(Template.user_id == current_user.id, Template.name == template_name)
+        .order_by(TemplateItem.position)
+    )
+    added = session.exec(
+        dialect_insert(session)(Exercise)
+        .from_select(["user_id", "date", "exercise_type_id", "name", "rev"], items)
+        .on_conflict_do_nothing(index_elements=["user_id", "date", "exercise_type_id"])
+        .returning(Exercise.id)
+    ).all()
+    if added:
+        versions.bump(session, current_user.id, versions.days_touched([date]))
+    elif session.exec(
+        select(Template.id).where(
             Template.user_id == current_user.id,
             Template.name == template_name
         )
-    ).first()
-    if not t:
+    ).first() is None:
+        # Nothing was added because the template does not exist (rather than
+        # being empty or already applied)
         return {"error": "Template not found."}
-
-    exercises = json.loads(t.exercises)
-    
-    # Actually create the Exercise records in the database
-    for exercise_name in exercises:
-        # Check if exercise already exists for this date
-        existing = session.exec(
-            select(Exercise).where(
-                Exercise.user_id == current_user.id,
-                Exercise.date == date,
-                Exercise.name == exercise_name
-            )
-        ).first()
-        
-        # Only create if it doesn't exist
-        if not existing:
-            new_exercise = Exercise(
-                user_id=current_user.id,
-                date=date,
-                name=exercise_name
-            )
-            session.add(new_exercise)
-    
-    session.commit()
-    return {"message": f"Template '{template_name}' applied to {date}"}
+    content = {"message": f"Template '{template_name}' applied to {date}"}
+    return idem.commit(session, with_day(session, content, current_user.id, date, include_day))
 
 
 @app.put("/edit_template/{template_name}")
@@ -272,8 +727,12 @@ def edit_template(
     template_name: str,
     updated: TemplateCreate,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
     t = session.exec(
         select(Template).where(
             Template.user_id == current_user.id,
@@ -282,17 +741,21 @@ def edit_template(
     ).first()
     if not t:
         return {"error": "Template not found."}
-    t.exercises = json.dumps(updated.exercises)
-    session.add(t)
-    session.commit()
-    return {"message": f"Template '{template_name}' updated."}
+    t.rev = revision(session, current_user.id)
+    save_template_items(session, t.id, updated.exercises)
+    versions.bump(session, current_user.id, [versions.TEMPLATES])
+    return idem.commit(session, {"message": f"Template '{template_name}' updated."})
 
 @app.delete("/delete_template/{template_name}")
 def delete_template(
     template_name: str,
     current_user: User = Depends(get_current_user),
+    idem: Idempotency = Depends(idempotency_key),
     session: Session = Depends(get_session),
 ):
+    replayed = idem.begin(session)
+    if replayed is not None:
+        return replayed
     t = session.exec(
         select(Template).where(
             Template.user_id == current_user.id,
@@ -301,39 +764,51 @@ def delete_template(
     ).first()
     if not t:
         return {"error": "Template not found."}
+    revision(session, current_user.id)
+    session.exec(delete(TemplateItem).where(TemplateItem.template_id == t.id))
     session.delete(t)
-    session.commit()
-    return {"message": f"Template '{template_name}' deleted."}
+    record_deletes(session, current_user.id, {"template": [t.id]})
+    versions.bump(session, current_user.id, [versions.TEMPLATES])
+    return idem.commit(session, {"message": f"Template '{template_name}' deleted."})
 
 
 @app.get("/analytics/calendar/{year}/{month}")
-def get_monthly_calendar(
-    year: int,
-    month: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+async def get_monthly_calendar(
+    year: Annotated[int, Path(ge=1, le=9999)],
+    month: Annotated[int, Path(ge=1, le=12)],
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
 ):
-    # Get all exercises for the specified month
-    month_str = f"{year}-{month:02d}"  # Format as "2025-01"
-    
-    exercises = session.exec(
-        select(Exercise).where(
-            Exercise.user_id == current_user.id,
-            Exercise.date.like(f"{month_str}-%")
+    stamp = await run_db(session, versions.stamp, current_user.id, versions.month(year, month))
+    if stamp.matches(request):
+        return stamp.not_modified()
+    params = {"year": year, "month": month}
+    cached = response_cache.lookup(stamp, "calendar", params)
+    if cached is not None:
+        return cached
+    content = await run_db(session, load_calendar, current_user.id, year, month)
+    return response_cache.store(stamp, "calendar", params, content)
+
+def load_calendar(session: Session, user_id: int, year: int, month: int):
+    # Distinct workout dates in [first, last] day of the month
+    days_in_month = calendar.monthrange(year, month)[1]
+    first = Date(year, month, 1)
+    last = Date(year, month, days_in_month)
+
+    workout_dates = set(session.exec(
+        select(Exercise.date).distinct().where(
+            Exercise.user_id == user_id,
+            Exercise.date >= first,
+            Exercise.date <= last
         )
-    ).all()
-    
-    # Get unique workout dates
-    workout_dates = set(exercise.date for exercise in exercises)
-    
+    ).all())
+
     # Create a dictionary with all dates in the month
-    import calendar
-    days_in_month = calendar.monthrange(year, month)[1]
-    
     result = {}
-    for day in range(1, days_in_month + 1):
-        date_str = f"{year}-{month:02d}-{day:02d}"
-        result[date_str] = date_str in workout_dates
+    for day in range(days_in_month):
+        d = first + timedelta(days=day)
+        result[d.isoformat()] = d in workout_dates
     
     return {
         "year": year,
@@ -341,48 +816,212 @@ def get_monthly_calendar(
         "days": result
     }
 
+def load_dashboard(session: Session, user_id: int, date: Date):
+    return {
+        "date": date,
+        "day": load_day(session, user_id, date),
+        "calendar": load_calendar(session, user_id, date.year, date.month),
+        "templates": load_templates(session, user_id)["templates"],
+    }
+
+@app.get("/dashboard")
+async def get_dashboard(
+    date: Date,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
+):
+    # What the main page shows for a date (the day view, its month's calendar
+    # and the templates) in one round trip: one token check, one stamp query
+    # for all three parts and one query per part, on one session
+    resources = [versions.day(date), versions.month(date.year, date.month), versions.TEMPLATES]
+    stamp = await run_db(session, versions.combined, current_user.id, f"dashboard:{date.isoformat()}", resources)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    stamp.apply(response)
+    return await run_db(session, load_dashboard, current_user.id, date)
+
 
 @app.get("/analytics/exercise_progression/{exercise_name}")
-def get_exercise_progression(
+async def get_exercise_progression(
     exercise_name: str,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    request: Request,
+    date_from: Annotated[Optional[Date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[Date], Query(alias="to")] = None,
+    limit: Annotated[Optional[int], Query(ge=1)] = None,
+    max_points: Annotated[Optional[int], Query(ge=3)] = None,
+    bucket: Optional[str] = None,
+    layout: str = "rows",
+    current_user: User = Depends(get_current_user_async),
+    session=Depends(get_read_db),
 ):
-    # Get all workout records for this exercise (all dates)
-    workouts = session.exec(
-        select(Workout).where(
-            Workout.user_id == current_user.id,
-            Workout.exercise_name == exercise_name
-        ).order_by(Workout.date)  # Sort by date chronologically
-    ).all()
-    
-    if not workouts:
+    stamp = await run_db(session, versions.stamp, current_user.id, versions.SETS)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    params = {"exercise": exercise_name, "from": date_from, "to": date_to, "limit": limit,
+              "max_points": max_points, "bucket": bucket, "layout": layout}
+    cached = response_cache.lookup(stamp, "progression", params)
+    if cached is not None:
+        return cached
+    try:
+        content = await run_db(session, load_progression, current_user.id, exercise_name, date_from, date_to,
+                               limit, layout, max_points, bucket)
+    except ValueError as e:
+        return {"error": str(e)}
+    return response_cache.store(stamp, "progression", params, content)
+
+def load_progression(session: Session, user_id: int, exercise_name: str,
+                     date_from: Optional[Date] = None, date_to: Optional[Date] = None,
+                     limit: Optional[int] = None, layout: str = "rows",
+                     max_points: Optional[int] = None, bucket: Optional[str] = None):
+    # One pre-aggregated row per training day, optionally within [from, to]
+    # and cut to the latest limit days; each set position is a series in the
+    # given layout (see analytics.layout_points), optionally bucketed and cut
+    # to about max_points points (see analytics.downsample)
+    type_id = catalog.lookup(session, exercise_name)
+    if type_id is None:
         return {"error": "No data found for this exercise"}
+    query = select(ExerciseStats.date, ExerciseStats.sets).where(
+        ExerciseStats.user_id == user_id,
+        ExerciseStats.exercise_type_id == type_id
+    )
+    if date_from:
+        query = query.where(ExerciseStats.date >= date_from)
+    if date_to:
+        query = query.where(ExerciseStats.date <= date_to)
+    if limit:
+        # Newest first down the index, then back to chronological order
+        days = session.exec(query.order_by(ExerciseStats.date.desc()).limit(limit)).all()[::-1]
+    else:
+        days = session.exec(query.order_by(ExerciseStats.date)).all()  # Sort by date chronologically
     
-    # Group by date - each date will have multiple sets
-    from collections import defaultdict
-    dates_data = defaultdict(list)  # {"2025-09-01": [set1, set2, set3], ...}
-    
-    for workout in workouts:
-        dates_data[workout.date].append({
-            "reps": workout.reps,
-            "weight": workout.weight,
-            "volume": workout.reps * workout.weight  # Calculate volume
-        })
+    if not days:
+        return {"error": "No data found for this exercise"}
     
-    # Reorganize by set position
-    set_data = defaultdict(list)  # {"1": [...], "2": [...], ...}
+    # Reorganize by set position (ExerciseStats.sets is in ordinal order)
+    columns = {}  # {"1": {"date": [...], "volume": [...], ...}, "2": ...}
     
-    for date, sets in dates_data.items():
-        for set_index, set_info in enumerate(sets, start=1):
-            set_data[str(set_index)].append({
-                "date": date,
-                "volume": set_info["volume"],
-                "weight": set_info["weight"],
-                "reps": set_info["reps"]
-            })
+    for date, sets in days:
+        for set_index, (reps, weight) in enumerate(json.loads(sets), start=1):
+            series = columns.get(set_index)
+            if series is None:
+                series = columns[set_index] = {"date": [], "volume": [], "weight": [], "reps": []}
+            series["date"].append(date)
+            series["volume"].append((reps or 0) * (weight or 0))
+            series["weight"].append(weight)
+            series["reps"].append(reps)
     
     return {
         "exercise_name": exercise_name,
-        "set_data": dict(set_data)
-    }
\ No newline at end of file
+        "set_data": {
+            str(set_index): analytics.layout_points(analytics.downsample(series, max_points, bucket), layout)
+            for set_index, series in columns.items()
+        }
+    }
+
+
+@app.get("/analytics/cache_stats")
+def get_analytics_cache_stats():
+    return response_cache.cache_stats()
+
+
+@app.get("/analytics/one_rep_max/{exercise_name}")
+def get_one_rep_max(
+    exercise_name: str,
+    request: Request,
+    formula: str = "epley",
+    window: Annotated[int, Query(ge=1, le=100)] = 5,
+    date_from: Annotated[Optional[Date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[Date], Query(alias="to")] = None,
+    layout: str = "rows",
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_read_session),
+):
+    stamp = versions.stamp(session, current_user.id, versions.SETS)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    params = {"exercise": exercise_name, "formula": formula, "window": window, "from": date_from, "to": date_to,
+              "layout": layout}
+    cached = response_cache.lookup(stamp, "one_rep_max", params)
+    if cached is not None:
+        return cached
+
+    type_id = catalog.lookup(session, exercise_name)
+    frame = analytics.filter_dates(analytics.load_frame(session, current_user.id), date_from, date_to)
+    try:
+        history = analytics.one_rep_max_history(frame, type_id, formula, window, layout)
+    except ValueError as e:
+        return {"error": str(e)}
+    if not history:
+        content = {"error": "No data found for this exercise"}
+    else:
+        content = {"exercise_name": exercise_name, "formula": formula, "history": history}
+    return response_cache.store(stamp, "one_rep_max", params, content)
+
+
+@app.get("/analytics/personal_records")
+def get_personal_records(
+    request: Request,
+    exercise: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_read_session),
+):
+    stamp = versions.stamp(session, current_user.id, versions.SETS)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    params = {"exercise": exercise}
+    cached = response_cache.lookup(stamp, "personal_records", params)
+    if cached is not None:
+        return cached
+
+    frame = analytics.load_frame(session, current_user.id)
+    if exercise:
+        type_id = catalog.lookup(session, exercise)
+        content = {"records": analytics.personal_records(frame, type_id) if type_id is not None else {}}
+    else:
+        content = {"records": analytics.personal_records(frame)}
+    return response_cache.store(stamp, "personal_records", params, content)
+
+
+@app.get("/analytics/weekly_volume")
+def get_weekly_volume(
+    request: Request,
+    by: str = "exercise",
+    window: Annotated[int, Query(ge=1, le=52)] = 4,
+    date_from: Annotated[Optional[Date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[Date], Query(alias="to")] = None,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_read_session),
+):
+    stamp = versions.stamp(session, current_user.id, versions.SETS)
+    if stamp.matches(request):
+        return stamp.not_modified()
+    params = {"by": by, "window": window, "from": date_from, "to": date_to}
+    cached = response_cache.lookup(stamp, "weekly_volume", params)
+    if cached is not None:
+        return cached
+
+    frame = analytics.filter_dates(analytics.load_frame(session, current_user.id), date_from, date_to)
+    try:
+        content = analytics.weekly_volume(frame, by, window)
+    except ValueError as e:
+        return {"error": str(e)}
+    return response_cache.store(stamp, "weekly_volume", params, content)
+
+
+@app.get("/analytics/streaks")
+def get_streaks(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_read_session),
+):
+    # "Current" streaks depend on today's date, so the day is part of the key
+    stamp = versions.stamp(session, current_user.id, versions.SETS)
+    today = Date.today()
+    params = {"today": today}
+    cached = response_cache.lookup(stamp, "streaks", params)
+    if cached is not None:
+        return cached
+    content = analytics.streaks(analytics.load_frame(session, current_user.id), today)
+    return response_cache.store(stamp, "streaks", params, content)
@@ -1,8 +1,18 @@
+import asyncio
 import bcrypt
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session as SQLSession, select
-from database import engine, User
+from database import get_db, get_session, run_db, User
+import metrics
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from pydantic import BaseModel
@@ -13,6 +23,11 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 4)))
 
 class UserCreate(BaseModel):
     username: str
@@ -22,45 +37,171 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-def get_session():
-    with SQLSession(engine) as session:
-        yield session
+class UserCache:
+    # LRU of resolved users keyed by token subject (username), each entry
+    # expiring after ttl seconds
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str):
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry and entry[1] > time.monotonic():
+                self.entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self.entries[username]
+            self.misses += 1
+            return None
+
+    def put(self, user: User):
+        # Store a detached copy so no request session's instance is shared
+        cached = User(id=user.id, username=user.username, hashed_password=user.hashed_password)
+        with self.lock:
+            self.entries[user.username] = (cached, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user.username)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self.lock:
+            self.entries.pop(username, None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
+
+# Drop cached users whenever their row changes (password change) or is deleted
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.username)
 
 def hash_password(plain_password: str) -> str:
-    hashed = bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt())
+    hashed = bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
     return hashed.decode("utf-8")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
+def needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<rounds>$<salt+hash>
+    return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel
+# without blocking the event loop. Requests beyond HASH_MAX_PENDING queued
+# hashes are turned away with 429 instead of piling up behind the pool.
+hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_pending = 0
+
+async def run_hashing(func, *args):
+    global hash_pending
+    if hash_pending >= HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    hash_pending += 1
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_pool, func, *args)
+    finally:
+        hash_pending -= 1
+        metrics.observe_bcrypt(func.__name__, time.perf_counter() - t0)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Register and login are async so they can await the hash pool; their
+# database work runs on the threadpool, never on the event loop. The session
+# is closed before bcrypt runs to give the connection back to the pool.
+def find_user(session: SQLSession, username: str):
+    user = session.exec(select(User).where(User.username == username)).first()
+    session.close()
+    return user
+
+def add_user(session: SQLSession, username: str, hashed_password: str) -> bool:
+    session.add(User(username=username, hashed_password=hashed_password))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+def save_password_hash(session: SQLSession, user: User, hashed_password: str):
+    session.add(user)
+    user.hashed_password = hashed_password
+    session.commit()
+
 @router.post("/register")
-def register_user(user: UserCreate, session: SQLSession = Depends(get_session)):
-    existing_user = session.exec(select(User).where(User.username == user.username)).first()
-    if existing_user:
+async def register_user(user: UserCreate, session: SQLSession = Depends(get_session)):
+    if await run_in_threadpool(find_user, session, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    hashed_password = await run_hashing(hash_password, user.password)
+    if not await run_in_threadpool(add_user, session, user.username, hashed_password):
         raise HTTPException(status_code=400, detail="Username already registered")
-    new_user = User(username=user.username, hashed_password=hash_password(user.password))
-    session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
     return {"message": "User registered successfully"}
 
 @router.post("/login")
-def login_user(user: UserCreate, session: SQLSession = Depends(get_session)):
-    db_user = session.exec(select(User).where(User.username == user.username)).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login_user(user: UserCreate, session: SQLSession = Depends(get_session)):
+    db_user = await run_in_threadpool(find_user, session, user.username)
+    if not db_user or not await run_hashing(verify_password, user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    claims = {"sub": db_user.username, "uid": db_user.id}
+    # Upgrade hashes made with a different work factor while we have the password
+    if needs_rehash(db_user.hashed_password):
+        new_hash = await run_hashing(hash_password, user.password)
+        await run_in_threadpool(save_password_hash, session, db_user, new_hash)
     access_token = create_access_token(
-        data={"sub": db_user.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        data=claims, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+@router.get("/cache_stats")
+def get_cache_stats():
+    return user_cache.stats()
+
+def get_current_user(token: str = Depends(oauth2_scheme), session: SQLSession = Depends(get_session)):
+    t0 = time.perf_counter()
+    try:
+        return load_current_user(token, session)
+    finally:
+        metrics.add_auth_time(time.perf_counter() - t0)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), session=Depends(get_db)):
+    # get_current_user for the async routes: a cache hit never leaves the
+    # event loop, a miss is looked up through run_db (the async engine with
+    # DB_ASYNC, the threadpool otherwise)
+    t0 = time.perf_counter()
+    try:
+        payload = decode_token(token)
+        user = cached_user(payload)
+        if user:
+            return user
+        return await run_db(session, find_token_user, payload)
+    finally:
+        metrics.add_auth_time(time.perf_counter() - t0)
+
+def decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -68,8 +209,35 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    with SQLSession(engine) as session:
-        user = session.exec(select(User).where(User.username == username)).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+    return payload
+
+def cached_user(payload: dict):
+    # The cache is keyed by username, which a new account can take over once
+    # the old one is deleted: the token's user id has to match as well
+    user = user_cache.get(payload["sub"])
+    if user and payload.get("uid") not in (None, user.id):
+        return None
+    return user
+
+def load_current_user(token: str, session: SQLSession):
+    payload = decode_token(token)
+    user = cached_user(payload)
+    if user:
         return user
+    return find_token_user(session, payload)
+
+def find_token_user(session: SQLSession, payload: dict):
+    # Cache miss: tokens carry the user id, so look up by primary key (older
+    # tokens without "uid" fall back to username)
+    username = payload["sub"]
+    user_id = payload.get("uid")
+    if user_id is not None:
+        user = session.get(User, user_id)
+        if user and user.username != username:
+            user = None
+    else:
+        user = session.exec(select(User).where(User.username == username)).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    user_cache.put(user)
+    return user
@@ -0,0 +1,105 @@
+# bench_analytics.py
+# Times the /analytics/* statistics endpoints for a synthetic user with five
+# years of history (~200k sets): one cold call that builds the frame, then
+# repeated warm calls served from the cached frame, calls right after a set
+# was added or edited (the cached frame is brought up to date), and calls
+# answered from the response cache. Fails if a cold call, or a warm or
+# post-write p99, is over its target.
+#   python bench_analytics.py [days] [requests]
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlmodel import Session, select, update
+from starlette.requests import Request
+from bench_workouts import seed, percentile
+from crud import insert_sets, refresh_stats, revision
+from database import engine, Exercise, Workout
+import analytics
+import app
+import response_cache
+import versions
+
+TARGET_MS = 100
+COLD_TARGET_MS = 2500
+REQUEST = Request({"type": "http", "headers": []})
+
+ENDPOINTS = [
+    ("one_rep_max", lambda user, s: app.get_one_rep_max("bench press", REQUEST, current_user=user, session=s)),
+    ("personal_records", lambda user, s: app.get_personal_records(REQUEST, current_user=user, session=s)),
+    ("weekly_volume", lambda user, s: app.get_weekly_volume(REQUEST, current_user=user, session=s)),
+    ("weekly_volume/muscle", lambda user, s: app.get_weekly_volume(REQUEST, "muscle_group", current_user=user, session=s)),
+    ("streaks", lambda user, s: app.get_streaks(REQUEST, current_user=user, session=s)),
+]
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 365
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    user, _ = seed(days, sets_range=(8, 11))
+    with Session(engine) as session:
+        frame = analytics.load_frame(session, user.id)
+    print(f"Seeded {days} days, {len(frame)} sets")
+
+    with Session(engine) as session:
+        latest = session.exec(select(Exercise).where(Exercise.user_id == user.id).order_by(Exercise.date.desc())).first()
+        set_ids = session.exec(select(Workout.id).where(Workout.user_id == user.id)).all()
+    rng = random.Random(7)
+
+    def write(i):
+        # What POST /add_set does on the latest day, or PATCH /sets/{id} on
+        # any older set (which moves it within the frame)
+        with Session(engine) as session:
+            rev = revision(session, user.id)
+            if i % 2:
+                session.exec(update(Workout).where(Workout.id == rng.choice(set_ids))
+                             .values(weight=rng.randint(20, 140) * 1.0, rev=rev))
+            else:
+                key = (latest.date, latest.exercise_type_id)
+                insert_sets(session, user.id, {key: latest.id}, [(*key, 5, rng.randint(20, 140) * 1.0)])
+                refresh_stats(session, [latest.id])
+            versions.bump(session, user.id, {versions.SETS})
+            session.commit()
+
+    def time_calls(call, writes=False):
+        timings = []
+        for i in range(requests):
+            if writes:
+                write(i)
+            with Session(engine) as session:
+                t0 = time.perf_counter()
+                call(user, session)
+                timings.append((time.perf_counter() - t0) * 1000)
+        return percentile(timings, 50), percentile(timings, 99)
+
+    slow = []
+    cache = response_cache.response_cache
+    for name, call in ENDPOINTS:
+        # Cold, warm-frame and post-write timings bypass the response cache
+        response_cache.response_cache = None
+        analytics.frame_cache.clear()
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            call(user, session)
+            cold = (time.perf_counter() - t0) * 1000
+        p50, p99 = time_calls(call)
+        written_p50, written_p99 = time_calls(call, writes=True)
+        response_cache.response_cache = cache
+        cached_p50, cached_p99 = time_calls(call)
+        if cold > COLD_TARGET_MS:
+            slow.append(f"{name}: cold {cold:.0f}ms > {COLD_TARGET_MS}ms")
+        if p99 > TARGET_MS:
+            slow.append(f"{name}: warm p99 {p99:.0f}ms > {TARGET_MS}ms")
+        if written_p99 > TARGET_MS:
+            slow.append(f"{name}: post-write p99 {written_p99:.0f}ms > {TARGET_MS}ms")
+        print(f"{name:<22} cold={cold:7.1f}ms  warm p50={p50:6.1f}ms  p99={p99:6.1f}ms  "
+              f"after write p50={written_p50:6.1f}ms  p99={written_p99:6.1f}ms  "
+              f"cached p50={cached_p50:5.2f}ms  p99={cached_p99:5.2f}ms")
+    print("response cache:", response_cache.cache_stats())
+    print(f"frame cache: {len(analytics.frame_cache.entries)} frames, {analytics.frame_cache.bytes / 1e6:.1f} MB")
+
+    if slow:
+        sys.exit("Over target: " + "; ".join(slow))
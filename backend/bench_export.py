@@ -0,0 +1,45 @@
+# bench_export.py
+# Exports a large seeded history in every format and fails if the Python heap
+# peak during the export grows past a fixed bound.
+#   python bench_export.py [days] [limit_mb]
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from bench_workouts import seed, EXERCISES
+from exporter import export_stream
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 3650
+    limit_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 32
+    user, _ = seed(days)
+    print(f"Seeded {days} days x {len(EXERCISES)} exercises")
+
+    failed = False
+    for fmt in ("csv", "jsonl", "parquet"):
+        try:
+            stream = export_stream(user.id, fmt)
+        except ValueError as e:
+            print(f"{fmt:<8} skipped: {e}")
+            continue
+        rss_before = max_rss_mb()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        size = sum(len(chunk) for chunk in stream)
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        print(f"{fmt:<8} {size / 1024 / 1024:7.1f} MB in {elapsed:5.1f}s  heap peak={peak:5.1f} MB  "
+              f"max RSS growth={max_rss_mb() - rss_before:5.1f} MB")
+        failed |= peak > limit_mb
+
+    if failed:
+        sys.exit(f"Export heap peak exceeded {limit_mb} MB")
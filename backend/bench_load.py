@@ -0,0 +1,88 @@
+# bench_load.py
+# Locust-style load test: starts uvicorn against a seeded database once with
+# the sync engine and once with DB_ASYNC=1, then runs concurrent virtual users
+# over the read endpoints and reports throughput and latency for each mode.
+#   python bench_load.py [users] [seconds] [days]
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load.db")
+
+import httpx
+from bench_workouts import seed, percentile
+from auth import create_access_token
+
+PORT = 8765
+
+def requests_for(dates):
+    return [
+        lambda rng: f"/workouts/{rng.choice(dates)}",
+        lambda rng: "/templates",
+        lambda rng: "/analytics/calendar/{}/{}".format(*rng.choice(dates).split("-")[:2]),
+        lambda rng: "/analytics/exercise_progression/bench press?from={}".format(rng.choice(dates)),
+    ]
+
+async def virtual_user(client, paths, deadline, timings, errors, seed_value):
+    rng = random.Random(seed_value)
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)(rng)
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            if r.status_code != 200:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        timings.append((time.perf_counter() - t0) * 1000)
+
+async def run_load(token, dates, users, seconds):
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=users)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", headers=headers,
+                                 limits=limits, timeout=30) as client:
+        timings, errors = [], []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(
+            virtual_user(client, requests_for(dates), deadline, timings, errors, i) for i in range(users)
+        ))
+    return timings, errors
+
+def start_server(env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/docs")
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit("Server did not start")
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 730
+    user, seeded = seed(days)
+    dates = [d.isoformat() for d in seeded]
+    token = create_access_token({"sub": user.username, "uid": user.id})
+    print(f"Seeded {days} days; {users} users for {seconds:.0f}s per mode")
+
+    for mode, flag in (("sync", "0"), ("async", "1")):
+        server = start_server({**os.environ, "DB_ASYNC": flag})
+        try:
+            timings, errors = asyncio.run(run_load(token, dates, users, seconds))
+            pools = httpx.get(f"http://127.0.0.1:{PORT}/pool_stats").json()
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:<6} {len(timings) / seconds:7.1f} req/s  p50={percentile(timings, 50):6.1f}ms  "
+              f"p95={percentile(timings, 95):6.1f}ms  p99={percentile(timings, 99):6.1f}ms  "
+              f"errors={len(errors)}  pools={pools}")
@@ -0,0 +1,59 @@
+# bench_login.py
+# Login storm against the app in-process: N concurrent clients logging in,
+# with bcrypt run inline on the event loop (old behaviour) and on the pool.
+#   python bench_login.py [clients] [logins_per_client]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import httpx
+from database import engine
+import app
+import auth
+
+engine.echo = False
+
+async def inline_hashing(func, *args):
+    return func(*args)
+
+async def storm(clients, logins):
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/auth/register", json={"username": "benchuser", "password": "password123"})
+        timings, statuses = [], {}
+
+        async def worker():
+            for _ in range(logins):
+                t0 = time.perf_counter()
+                r = await client.post("/auth/login", json={"username": "benchuser", "password": "password123"})
+                timings.append(time.perf_counter() - t0)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, sorted(timings), statuses
+
+def report(label, elapsed, timings, statuses):
+    ok = statuses.get(200, 0)
+    cores = os.cpu_count() or 1
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+    print(f"{label:<8} {ok / elapsed:7.1f} logins/s  {ok / elapsed / cores:6.1f}/s per core  "
+          f"p50={p50:7.1f}ms  p99={p99:7.1f}ms  statuses={statuses}")
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{clients} clients x {logins} logins, bcrypt rounds={auth.BCRYPT_ROUNDS}, "
+          f"pool workers={auth.HASH_WORKERS}, max pending={auth.HASH_MAX_PENDING}")
+
+    pooled = auth.run_hashing
+    auth.run_hashing = inline_hashing
+    report("inline", *asyncio.run(storm(clients, logins)))
+    auth.run_hashing = pooled
+    report("pool", *asyncio.run(storm(clients, logins)))
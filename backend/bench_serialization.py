@@ -0,0 +1,83 @@
+# bench_serialization.py
+# Payload size and serialization time of a heavy progression response
+# (five years of bench press, 8-11 sets a day): row vs columnar layout,
+# json.dumps vs orjson, and the gzip/brotli sizes and times the compression
+# middleware adds. Ends with full requests through the app, response cache
+# off, to show the bytes on the wire per Accept-Encoding.
+#   python bench_serialization.py [days] [requests]
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from auth import get_current_user, get_current_user_async
+from bench_workouts import seed, percentile
+from compression import brotli, GZIP_LEVEL, BROTLI_QUALITY
+from crud import rebuild_stats
+from database import engine
+from serialization import dumps
+import app
+import response_cache
+
+EXERCISE = "bench press"
+
+def timed(func, runs):
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return result, percentile(timings, 50)
+
+SERIALIZERS = [
+    # FastAPI's default path before: jsonable_encoder walk, then json.dumps
+    ("json (encoder)", lambda c: json.dumps(jsonable_encoder(c), ensure_ascii=False, separators=(",", ":")).encode()),
+    ("json", lambda c: json.dumps(c, ensure_ascii=False, separators=(",", ":"), default=jsonable_encoder).encode()),
+    ("orjson", dumps),
+]
+
+COMPRESSORS = [("gzip", lambda body: gzip.compress(body, GZIP_LEVEL))]
+if brotli is not None:
+    COMPRESSORS.append(("br", lambda body: brotli.compress(body, quality=BROTLI_QUALITY)))
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 365
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    user, _ = seed(days, sets_range=(8, 11))
+    with Session(engine) as session:
+        rebuild_stats(session)
+    print(f"Seeded {days} days of {EXERCISE}, 8-11 sets a day")
+
+    for layout in ("rows", "columns"):
+        with Session(engine) as session:
+            content, build_ms = timed(
+                lambda: app.load_progression(session, user.id, EXERCISE, layout=layout), runs)
+        points = sum(len(s) if layout == "rows" else len(s["dates"]) for s in content["set_data"].values())
+        print(f"\nlayout={layout}: {points} points, built in {build_ms:.1f}ms")
+        for name, serialize in SERIALIZERS:
+            body, ms = timed(lambda: serialize(content), runs)
+            print(f"  {name:<15} {len(body) / 1024:8.1f} KiB  {ms:7.2f}ms")
+        for name, compress in COMPRESSORS:
+            compressed, ms = timed(lambda: compress(body), runs)
+            print(f"  + {name:<13} {len(compressed) / 1024:8.1f} KiB  {ms:7.2f}ms")
+
+    # End to end, rendering every time (no response cache)
+    response_cache.response_cache = None
+    app.app.dependency_overrides[get_current_user] = lambda: user
+    app.app.dependency_overrides[get_current_user_async] = lambda: user
+    client = TestClient(app.app)
+    path = f"/analytics/exercise_progression/{EXERCISE}"
+    print()
+    for layout in ("rows", "columns"):
+        for encoding in ["identity", "gzip"] + (["br"] if brotli is not None else []):
+            response, ms = timed(lambda: client.get(path, params={"layout": layout},
+                                                    headers={"Accept-Encoding": encoding}), runs)
+            print(f"GET layout={layout:<8} Accept-Encoding={encoding:<9} "
+                  f"{response.num_bytes_downloaded / 1024:8.1f} KiB on the wire  p50={ms:7.2f}ms")
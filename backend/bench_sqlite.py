@@ -0,0 +1,89 @@
+# bench_sqlite.py
+# Concurrent writers (add_set) and readers (day view) against one SQLite file,
+# run under three setups, each in its own process with a fresh database:
+#   default     rollback journal, no pragmas (the old behaviour)
+#   production  WAL + synchronous=NORMAL + mmap/cache/busy_timeout
+#   queue       production profile plus the single-writer queue
+#   python bench_sqlite.py [writers] [readers] [seconds]
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MODES = {
+    "default": {"SQLITE_PROFILE": "default", "DB_WRITE_QUEUE": "0"},
+    "production": {"SQLITE_PROFILE": "production", "DB_WRITE_QUEUE": "0"},
+    "queue": {"SQLITE_PROFILE": "production", "DB_WRITE_QUEUE": "1"},
+}
+
+def worker(target, deadline, counts, key):
+    while time.perf_counter() < deadline:
+        try:
+            target()
+            counts[key] += 1
+        except Exception as e:
+            if "locked" in str(e) or "busy" in str(e):
+                counts["lock_errors"] += 1
+            else:
+                counts["other_errors"] += 1
+
+def run_mode(writers: int, readers: int, seconds: float):
+    import random
+    from sqlmodel import Session
+    from database import engine, User
+    from app import add_set, load_day, Set
+    from writer import set_writer
+    from idempotency import Idempotency
+    from bench_workouts import seed, EXERCISES
+
+    user, dates = seed(365)
+    user = User(id=user.id, username=user.username, hashed_password="x")
+    rng = random.Random(7)
+    counts = {"writes": 0, "reads": 0, "lock_errors": 0, "other_errors": 0}
+
+    def write():
+        with Session(engine) as session:
+            result = add_set(rng.choice(dates[-30:]), rng.choice(EXERCISES), Set(reps=8, weight=100.0),
+                             current_user=user, idem=Idempotency(user.id, None, None), session=session)
+            if "error" in result:
+                raise RuntimeError(result["error"])
+
+    def read():
+        with Session(engine) as session:
+            load_day(session, user.id, rng.choice(dates))
+
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=worker, args=(write, deadline, counts, "writes")) for _ in range(writers)]
+    threads += [threading.Thread(target=worker, args=(read, deadline, counts, "reads")) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    set_writer.stop()
+    print(json.dumps({**counts, "writer": set_writer.stats()}))
+
+if __name__ == "__main__":
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    if os.getenv("BENCH_SQLITE_CHILD"):
+        run_mode(writers, readers, seconds)
+        sys.exit()
+
+    print(f"{writers} writers, {readers} readers, {seconds:.0f}s per mode")
+    for mode, env in MODES.items():
+        url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+        out = subprocess.run(
+            [sys.executable, __file__, str(writers), str(readers), str(seconds)],
+            env={**os.environ, **env, "DATABASE_URL": url, "BENCH_SQLITE_CHILD": "1"},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        attempts = r["writes"] + r["lock_errors"] + r["other_errors"]
+        print(f"{mode:<11} writes {r['writes'] / seconds:7.1f}/s  reads {r['reads'] / seconds:7.1f}/s  "
+              f"lock errors {r['lock_errors']} ({100 * r['lock_errors'] / max(attempts, 1):.1f}%)  "
+              f"other errors {r['other_errors']}  avg batch {r['writer']['average_batch']}")
@@ -0,0 +1,421 @@
+# bench_suite.py
+# Benchmark suite covering every endpoint of app.py and auth.py, run
+# in-process against users with generated multi-year histories
+# (generate_data.py). Each case reports latency percentiles, SQL statements
+# per request and the Python heap peak of one request. Results can be saved
+# as JSON and compared with a saved baseline: extra queries, or a slower p50
+# and p95 or bigger heap peak beyond the tolerance, fail the run. Latencies
+# are scaled by a CPU calibration timed in both runs, as shared machines
+# drift by tens of percent between runs. Read endpoints run
+# against the main user's history, writes against dates after it. The run
+# fails up front if an endpoint has no case.
+#   python bench_suite.py [--users 5] [--years 3] [--seed 42] [--runs 30]
+#   python bench_suite.py --save-baseline            (writes bench_baseline.json)
+#   python bench_suite.py --baseline bench_baseline.json [--tolerance 0.5] [--output results.json]
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/suite.db")
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from bench_workouts import percentile
+from database import engine, Exercise, ExerciseType, Template, Workout
+from generate_data import generate, END_DATE, PASSWORD
+import app
+import auth
+import response_cache
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# Differences below these are noise, whatever the tolerance
+MIN_LATENCY_DELTA_MS = 3.0
+MIN_MEMORY_DELTA_KIB = 256
+# Writes go to days after the generated history, a block per case
+SCRATCH_START = END_DATE + timedelta(days=400)
+
+query_count = 0
+
+@event.listens_for(Engine, "after_cursor_execute")
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+class Case:
+    def __init__(self, method: str, route: str, request, name: str = None, prepare=None, status: int = 200,
+                 runs: int = None, uncached: bool = False):
+        self.method = method
+        self.route = route  # route template, for the coverage check
+        self.name = name or f"{method} {route}"
+        self.request = request  # (i, prepared) -> (path, request kwargs)
+        self.prepare = prepare  # i -> prepared, run before each request, untimed
+        self.status = status
+        self.runs = runs  # fewer runs for slow cases (bcrypt, exports)
+        self.uncached = uncached  # bypass the analytics response cache
+
+class Suite:
+    def __init__(self, client: TestClient, seed: int, user_id: int, username: str):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.username = username
+        self.headers = {"Authorization": "Bearer " + auth.create_access_token({"sub": username, "uid": user_id})}
+        with Session(engine) as session:
+            self.dates = [d.isoformat() for d in session.exec(
+                select(Exercise.date).distinct().where(Exercise.user_id == user_id).order_by(Exercise.date)
+            ).all()]
+            # The main user's most logged exercise
+            self.exercise = session.exec(
+                select(ExerciseType.name).join(Workout, Workout.exercise_type_id == ExerciseType.id)
+                .where(Workout.user_id == user_id).group_by(ExerciseType.name)
+                .order_by(func.count().desc()).limit(1)
+            ).one()
+            self.templates = session.exec(select(Template.name).where(Template.user_id == user_id)).all()
+        self.blocks = 0
+
+    def scratch(self):
+        # A function mapping i to a fresh day for one write case
+        start = SCRATCH_START + timedelta(days=1000 * self.blocks)
+        self.blocks += 1
+        return lambda i: (start + timedelta(days=i)).isoformat()
+
+    def log_day(self, d: str, exercises=("bench press", "squat", "barbell row", "overhead press", "deadlift"),
+                sets: int = 4):
+        log = {"days": [{"date": d, "exercises": [
+            {"name": name, "sets": [{"reps": 5 + n, "weight": 60.0 + 2.5 * n} for n in range(sets)]}
+            for name in exercises
+        ]}]}
+        self.ok(self.client.post("/log_workouts", json=log, headers=self.headers))
+        return self.ok(self.client.get(f"/workouts/{d}", headers=self.headers)).json()
+
+    def ok(self, response):
+        if response.status_code != 200 or response.content.startswith(b'{"error"'):
+            raise RuntimeError(f"Setup request failed: {response.status_code} {response.text[:200]}")
+        return response
+
+    def get(self, path: str, **params):
+        return path, {"params": params, "headers": self.headers}
+
+    def send(self, body_kind: str, path: str, body):
+        return path, {body_kind: body, "headers": self.headers}
+
+    def cases(self):
+        rng, headers = self.rng, self.headers
+        day = lambda: rng.choice(self.dates)
+        name = self.exercise
+        cases = [
+            Case("GET", "/pool_stats", lambda i, _: ("/pool_stats", {})),
+            Case("GET", "/metrics", lambda i, _: ("/metrics", {})),
+            Case("GET", "/auth/cache_stats", lambda i, _: ("/auth/cache_stats", {})),
+            Case("GET", "/analytics/cache_stats", lambda i, _: ("/analytics/cache_stats", {})),
+            Case("GET", "/workouts/{date}", lambda i, _: self.get(f"/workouts/{day()}")),
+            Case("GET", "/workouts/{date}", name="GET /workouts/{date} (304)",
+                 prepare=lambda i: self.client.get(f"/workouts/{self.dates[i]}", headers=headers),
+                 request=lambda i, r: (f"/workouts/{self.dates[i]}",
+                                       {"headers": dict(headers, **{"If-None-Match": r.headers["ETag"]})}),
+                 status=304),
+            Case("GET", "/dashboard", lambda i, _: self.get("/dashboard", date=day())),
+            Case("GET", "/dashboard", name="GET /dashboard (304)",
+                 prepare=lambda i: self.client.get("/dashboard", params={"date": self.dates[i]}, headers=headers),
+                 request=lambda i, r: ("/dashboard", {"params": {"date": self.dates[i]},
+                                                      "headers": dict(headers, **{"If-None-Match": r.headers["ETag"]})}),
+                 status=304),
+            Case("GET", "/workouts", lambda i, _: self.get("/workouts", limit=50)),
+            Case("GET", "/workouts", name="GET /workouts (exercise, from)",
+                 request=lambda i, _: self.get("/workouts", exercise=name, **{"from": day()})),
+            Case("GET", "/templates", lambda i, _: self.get("/templates")),
+            Case("GET", "/analytics/calendar/{year}/{month}",
+                 lambda i, _: self.get("/analytics/calendar/{}/{}".format(*day().split("-")[:2])), uncached=True),
+            Case("GET", "/analytics/exercise_progression/{exercise_name}",
+                 lambda i, _: self.get(f"/analytics/exercise_progression/{name}"), uncached=True),
+            Case("GET", "/analytics/exercise_progression/{exercise_name}",
+                 name="GET /analytics/exercise_progression/{exercise_name} (cached)",
+                 request=lambda i, _: self.get(f"/analytics/exercise_progression/{name}")),
+            Case("GET", "/analytics/exercise_progression/{exercise_name}",
+                 name="GET /analytics/exercise_progression/{exercise_name} (max_points)",
+                 request=lambda i, _: self.get(f"/analytics/exercise_progression/{name}", max_points=100),
+                 uncached=True),
+            Case("GET", "/analytics/exercise_progression/{exercise_name}",
+                 name="GET /analytics/exercise_progression/{exercise_name} (week)",
+                 request=lambda i, _: self.get(f"/analytics/exercise_progression/{name}", bucket="week"),
+                 uncached=True),
+            Case("GET", "/analytics/one_rep_max/{exercise_name}",
+                 lambda i, _: self.get(f"/analytics/one_rep_max/{name}"), uncached=True),
+            Case("GET", "/analytics/personal_records", lambda i, _: self.get("/analytics/personal_records"),
+                 uncached=True),
+            Case("GET", "/analytics/weekly_volume",
+                 lambda i, _: self.get("/analytics/weekly_volume", by="muscle_group"), uncached=True),
+            Case("GET", "/analytics/streaks", lambda i, _: self.get("/analytics/streaks"), uncached=True),
+            Case("GET", "/export", lambda i, _: self.get("/export", format="csv"), runs=10),
+            Case("POST", "/auth/register", runs=5, request=lambda i, _: (
+                "/auth/register", {"json": {"username": f"suite-{i}-{time.time_ns()}", "password": PASSWORD}})),
+            Case("POST", "/auth/login", runs=5, request=lambda i, _: (
+                "/auth/login", {"json": {"username": self.username, "password": PASSWORD}})),
+        ]
+
+        d = self.scratch()
+        cases.append(Case("POST", "/add_exercise/{date}",
+                          lambda i, _: self.send("json", f"/add_exercise/{d(i)}", {"name": name})))
+        d_set = self.scratch()
+        cases.append(Case(
+            "POST", "/add_set/{date}/{exercise_name}",
+            prepare=lambda i: self.ok(self.client.post(f"/add_exercise/{d_set(i)}", json={"name": name},
+                                                       headers=headers)),
+            request=lambda i, _: self.send("json", f"/add_set/{d_set(i)}/{name}", {"reps": 5, "weight": 100.0}),
+        ))
+        d_day = self.scratch()
+        cases.append(Case(
+            "POST", "/add_set/{date}/{exercise_name}", name="POST /add_set/{date}/{exercise_name} (include_day)",
+            prepare=lambda i: self.log_day(d_day(i)),
+            request=lambda i, _: (f"/add_set/{d_day(i)}/bench press", {
+                "params": {"include_day": "true"}, "json": {"reps": 5, "weight": 100.0}, "headers": headers}),
+        ))
+        d_log = self.scratch()
+        cases.append(Case("POST", "/log_workouts", lambda i, _: self.send("json", "/log_workouts", {"days": [
+            {"date": d_log(i), "exercises": [
+                {"name": exercise, "sets": [{"reps": 8, "weight": 50.0}] * 4}
+                for exercise in ("bench press", "squat", "barbell row", "overhead press", "deadlift")
+            ]}
+        ]})))
+        d_import = self.scratch()
+        cases.append(Case("POST", "/import", lambda i, _: (
+            "/import", {"files": {"file": ("week.csv", io.BytesIO(
+                ("date,exercise,reps,weight\n" + "".join(
+                    f"{d_import(7 * i + n)},{exercise},{5 + s},{60 + 2.5 * s}\n"
+                    for n in range(5)
+                    for exercise in ("bench press", "squat", "barbell row", "overhead press", "deadlift")
+                    for s in range(4)
+                )).encode()), "text/csv")}, "headers": headers})))
+        d_patch = self.scratch()
+        cases.append(Case(
+            "PATCH", "/sets/{set_id}",
+            prepare=lambda i: self.log_day(d_patch(i))["exercises"][0]["sets"][0]["id"],
+            request=lambda i, set_id: self.send("json", f"/sets/{set_id}", {"reps": 3, "weight": 102.5}),
+        ))
+        d_order = self.scratch()
+        cases.append(Case(
+            "PUT", "/sets/order",
+            prepare=lambda i: [s["id"] for s in self.log_day(d_order(i), ["bench press"], 6)["exercises"][0]["sets"]],
+            request=lambda i, set_ids: self.send("json", "/sets/order", {"set_ids": set_ids[::-1]}),
+        ))
+        d_delete = self.scratch()
+        cases.append(Case(
+            "DELETE", "/sets/{set_id}",
+            prepare=lambda i: self.log_day(d_delete(i))["exercises"][0]["sets"][0]["id"],
+            request=lambda i, set_id: (f"/sets/{set_id}", {"headers": headers}),
+        ))
+        d_index = self.scratch()
+        cases.append(Case(
+            "DELETE", "/delete_set/{date}/{exercise_name}/{set_index}",
+            prepare=lambda i: self.log_day(d_index(i)),
+            request=lambda i, _: (f"/delete_set/{d_index(i)}/bench press/0", {"headers": headers}),
+        ))
+        d_exercise = self.scratch()
+        cases.append(Case(
+            "DELETE", "/delete_exercise/{date}/{exercise_name}",
+            prepare=lambda i: self.log_day(d_exercise(i)),
+            request=lambda i, _: (f"/delete_exercise/{d_exercise(i)}/bench press", {"headers": headers}),
+        ))
+
+        cases.append(Case("GET", "/sync", name="GET /sync (full)", request=lambda i, _: self.get("/sync"), runs=10))
+        d_sync = self.scratch()
+        revision = lambda: self.ok(self.client.get("/sync", params={"since": 1}, headers=headers)).json()["revision"]
+        cases.append(Case(
+            "GET", "/sync", name="GET /sync (since)",
+            prepare=lambda i: (revision(), self.log_day(d_sync(i)))[0],
+            request=lambda i, since: self.get("/sync", since=since),
+        ))
+        d_push = self.scratch()
+        cases.append(Case(
+            "POST", "/sync",
+            prepare=lambda i: (self.log_day(d_push(i))["exercises"][0]["sets"], revision()),
+            request=lambda i, prepared: self.send("json", "/sync", {"changes": [
+                {"kind": "set", "op": "update", "id": prepared[0][0]["id"], "base_rev": prepared[1], "weight": 102.5},
+                {"kind": "set", "op": "delete", "id": prepared[0][1]["id"], "base_rev": prepared[1]},
+            ] + [
+                {"kind": "set", "op": "create", "date": d_push(i), "exercise": exercise, "reps": 5, "weight": 60.0}
+                for exercise in ("bench press", "squat", "barbell row", "overhead press", "deadlift")
+            ]}),
+        ))
+
+        exercises = ["bench press", "overhead press", "incline bench press", "lateral raise", "tricep pushdown", "dips"]
+        create = lambda t: self.ok(self.client.post("/add_template", json={"name": t, "exercises": exercises},
+                                                    headers=headers))
+        cases.append(Case("POST", "/add_template", lambda i, _: self.send(
+            "json", "/add_template", {"name": f"suite add {i}", "exercises": exercises})))
+        cases.append(Case(
+            "PUT", "/edit_template/{template_name}", prepare=lambda i: create(f"suite edit {i}"),
+            request=lambda i, _: self.send("json", f"/edit_template/suite edit {i}",
+                                           {"name": f"suite edit {i}", "exercises": exercises[::-1]}),
+        ))
+        d_apply = self.scratch()
+        cases.append(Case("POST", "/apply_template/{date}/{template_name}", lambda i, _: (
+            f"/apply_template/{d_apply(i)}/{self.templates[i % len(self.templates)]}", {"headers": headers})))
+        cases.append(Case(
+            "DELETE", "/delete_template/{template_name}", prepare=lambda i: create(f"suite delete {i}"),
+            request=lambda i, _: (f"/delete_template/suite delete {i}", {"headers": headers}),
+        ))
+        return cases
+
+def endpoints():
+    # (method, path) of every API route, the auth router under its /auth prefix
+    routes = {(m, r.path) for r in app.app.routes if isinstance(r, APIRoute) for m in r.methods}
+    routes |= {(m, "/auth" + r.path) for r in auth.router.routes if isinstance(r, APIRoute) for m in r.methods}
+    return routes
+
+def run_case(suite: Suite, case: Case, runs: int):
+    global query_count
+    cache = response_cache.response_cache
+    if case.uncached:
+        response_cache.response_cache = None
+    try:
+        timings, queries, errors = [], 0, []
+        n = case.runs or runs
+        # One warm-up request, n timed ones, then one under tracemalloc
+        for i in range(n + 2):
+            prepared = case.prepare(i) if case.prepare else None
+            path, kwargs = case.request(i, prepared)
+            traced = i == n + 1
+            if traced:
+                tracemalloc.start()
+            q0 = query_count
+            t0 = time.perf_counter()
+            response = suite.client.request(case.method, path, **kwargs)
+            elapsed = (time.perf_counter() - t0) * 1000
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif i:
+                timings.append(elapsed)
+                queries += query_count - q0
+            if response.status_code != case.status or response.content.startswith(b'{"error"'):
+                errors.append(f"{response.status_code} {response.text[:120]}")
+    finally:
+        response_cache.response_cache = cache
+    return {
+        "route": f"{case.method} {case.route}",
+        "runs": n,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / n, 3),
+        "queries": round(queries / n, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }, errors
+
+def calibrate() -> float:
+    # Milliseconds for a fixed pure-Python workload (best of 5), so timings
+    # from a busier or slower machine can be scaled before comparing
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        rng = random.Random(0)
+        rows = [{"date": rng.random(), "reps": rng.randint(1, 20)} for _ in range(20000)]
+        json.dumps(sorted(rows, key=lambda row: row["date"]))
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+def compare(results, baseline, tolerance: float):
+    # Regression messages, empty when the run is within tolerance
+    keys = ("users", "years", "seed", "runs", "database")
+    different = [k for k in keys if baseline["meta"].get(k) != results["meta"].get(k)]
+    if different:
+        return [f"baseline was recorded with different {', '.join(different)}; record a new one"]
+    speed = results["meta"]["calibration_ms"] / baseline["meta"]["calibration_ms"]
+    regressions = []
+    for name, base in baseline["cases"].items():
+        base = dict(base, **{p: base[p] * speed for p in ("p50_ms", "p95_ms")})
+        current = results["cases"].get(name)
+        if current is None:
+            regressions.append(f"{name}: no longer benchmarked")
+            continue
+        if current["queries"] > base["queries"]:
+            regressions.append(f"{name}: {base['queries']} -> {current['queries']} queries per request")
+        # A real slowdown moves the median too; a p95 alone is one or two
+        # unlucky samples (GC, scheduler)
+        if all(current[p] > base[p] * (1 + tolerance) and current[p] - base[p] > MIN_LATENCY_DELTA_MS
+               for p in ("p50_ms", "p95_ms")):
+            regressions.append(f"{name}: p50 {base['p50_ms']:.1f}ms -> {current['p50_ms']:.1f}ms, "
+                               f"p95 {base['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if (current["peak_kib"] > base["peak_kib"] * (1 + tolerance)
+                and current["peak_kib"] - base["peak_kib"] > MIN_MEMORY_DELTA_KIB):
+            regressions.append(f"{name}: heap peak {base['peak_kib']:.0f}KiB -> {current['peak_kib']:.0f}KiB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every endpoint against generated histories")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=30, help="timed requests per case")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with this results file and fail on regressions")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    engine.echo = False
+    with Session(engine) as session:
+        usernames = [f"bench{n}" for n in range(1, args.users + 1)]
+        t0 = time.perf_counter()
+        users = generate(session, usernames, args.years, args.seed)
+        sets = session.exec(select(func.count()).select_from(Workout)).one()
+    print(f"Generated {args.users} users, {sets} sets in {time.perf_counter() - t0:.1f}s ({engine.url})")
+
+    suite = Suite(TestClient(app.app), args.seed, users[usernames[0]], usernames[0])
+    cases = suite.cases()
+    uncovered = endpoints() - {(case.method, case.route) for case in cases}
+    if uncovered:
+        sys.exit(f"Endpoints without a benchmark case: {', '.join(f'{m} {p}' for m, p in sorted(uncovered))}")
+
+    results = {
+        "meta": {
+            "users": args.users, "years": args.years, "seed": args.seed, "runs": args.runs, "sets": sets,
+            "database": engine.dialect.name, "python": platform.python_version(),
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "cases": {},
+    }
+    failed = []
+    print(f"{'case':<62} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'heap KiB':>9}")
+    for case in cases:
+        result, errors = run_case(suite, case, args.runs)
+        results["cases"][case.name] = result
+        print(f"{case.name:<62} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+              f"{result['queries']:8.2f} {result['peak_kib']:9.1f}")
+        if errors:
+            failed.append(f"{case.name}: {len(errors)} unexpected responses, e.g. {errors[0]}")
+    results["meta"]["calibration_ms"] = calibrate()
+    results["meta"]["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(f"max RSS {results['meta']['max_rss_mb']}MB, calibration {results['meta']['calibration_ms']}ms")
+
+    for path in filter(None, (args.output, BASELINE if args.save_baseline else None)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {path}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+        failed += regressions
+    if failed:
+        for message in failed:
+            print("FAIL", message)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# bench_workouts.py
+# Benchmarks GET /workouts/{date} against a user with thousands of logged days.
+#   python bench_workouts.py [days] [requests]
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import event, insert
+from sqlmodel import Session, select
+from database import engine, User, Workout, Exercise, ExerciseType
+import catalog
+from app import load_day
+
+engine.echo = False
+
+EXERCISES = [
+    "bench press", "squat", "deadlift", "overhead press", "barbell row", "pull ups",
+    "dips", "lateral raise", "tricep pushdown", "bicep curl", "leg press", "calf raise",
+]
+
+query_count = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+def seed(days: int, sets_range=(3, 5)):
+    rng = random.Random(42)
+    with Session(engine) as session:
+        user = User(username="benchuser", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        type_ids = catalog.resolve(session, EXERCISES)
+
+        start = date.today() - timedelta(days=days)
+        exercise_rows, set_rows = [], []
+        for i in range(days):
+            d = start + timedelta(days=i)
+            for name in EXERCISES:
+                exercise_id = len(exercise_rows) + 1
+                exercise_rows.append({"id": exercise_id, "user_id": user.id, "date": d, "exercise_type_id": type_ids[name],
+                                      "name": name})
+                for ordinal in range(1, rng.randint(*sets_range) + 1):
+                    set_rows.append({
+                        "user_id": user.id, "exercise_id": exercise_id, "date": d, "exercise_type_id": type_ids[name],
+                        "ordinal": ordinal, "reps": rng.randint(5, 12), "weight": rng.randint(20, 140) * 1.0,
+                    })
+        session.exec(insert(Exercise), params=exercise_rows)
+        session.exec(insert(Workout), params=set_rows)
+        session.commit()
+        session.refresh(user)
+        return user, [start + timedelta(days=i) for i in range(days)]
+
+# The previous implementation: one query for the exercises plus one per exercise
+def get_workouts_n_plus_one(date, current_user, session):
+    exercises = session.exec(
+        select(Exercise).where(Exercise.user_id == current_user.id, Exercise.date == date)
+    ).all()
+    result = []
+    for exercise in exercises:
+        workouts = session.exec(
+            select(Workout).where(
+                Workout.user_id == current_user.id,
+                Workout.date == date,
+                Workout.exercise_type_id == exercise.exercise_type_id
+            )
+        ).all()
+        name = session.get(ExerciseType, exercise.exercise_type_id).name
+        result.append({"name": name, "sets": [{"reps": w.reps, "weight": w.weight} for w in workouts]})
+    return {"date": date, "exercises": result}
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def run(label, handler, user, dates, requests):
+    global query_count
+    rng = random.Random(7)
+    timings = []
+    query_count = 0
+    for _ in range(requests):
+        d = rng.choice(dates)
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            handler(date=d, current_user=user, session=session)
+            timings.append((time.perf_counter() - t0) * 1000)
+    print(f"{label:<14} queries/request={query_count / requests:5.1f}  "
+          f"p50={percentile(timings, 50):6.2f}ms  p99={percentile(timings, 99):6.2f}ms")
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    user, dates = seed(days)
+    print(f"Seeded {days} days x {len(EXERCISES)} exercises ({engine.url})")
+    run("n+1 (old)", get_workouts_n_plus_one, user, dates, requests)
+    run("load_day", lambda date, current_user, session: load_day(session, current_user.id, date), user, dates, requests)
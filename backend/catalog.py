@@ -0,0 +1,94 @@
+# catalog.py
+# Maps free-text exercise names to ExerciseType ids. Names match regardless
+# of case, spacing, hyphens and underscores ("Bench  Press", "bench-press"),
+# and through ExerciseAlias rows ("bench" -> "bench press").
+import re
+from typing import Optional
+from sqlmodel import Session, select
+from database import ExerciseType, ExerciseAlias
+from crud import dialect_insert
+
+# alias -> canonical catalog name, seeded by the migrations
+DEFAULT_ALIASES = {
+    "bench": "Bench Press",
+    "flat bench": "Bench Press",
+    "barbell bench press": "Bench Press",
+    "incline bench": "Incline Bench Press",
+    "db press": "Dumbbell Press",
+    "back squat": "Squat",
+    "barbell squat": "Squat",
+    "conventional deadlift": "Deadlift",
+    "rdl": "Romanian Deadlift",
+    "ohp": "Overhead Press",
+    "military press": "Overhead Press",
+    "bb row": "Barbell Row",
+    "bent over row": "Barbell Row",
+    "db row": "Dumbbell Row",
+    "pullups": "Pull Ups",
+    "pullup": "Pull Ups",
+    "chinups": "Chin Ups",
+    "chinup": "Chin Ups",
+    "pushups": "Push Ups",
+    "pushup": "Push Ups",
+    "skullcrushers": "Skull Crushers",
+    "curl": "Bicep Curl",
+    "biceps curl": "Bicep Curl",
+    "triceps pushdown": "Tricep Pushdown",
+    "lat pull down": "Lat Pulldown",
+}
+
+def normalize(name: str) -> str:
+    return re.sub(r"[\s_\-]+", " ", name.casefold()).strip()
+
+def lookup_keys(session: Session, keys):
+    # {key: exercise type id} for the keys already known (aliases first)
+    keys = set(keys)
+    if not keys:
+        return {}
+    found = dict(session.exec(
+        select(ExerciseAlias.key, ExerciseAlias.exercise_type_id).where(ExerciseAlias.key.in_(keys))
+    ).all())
+    rest = keys - found.keys()
+    if rest:
+        found.update(session.exec(
+            select(ExerciseType.key, ExerciseType.id).where(ExerciseType.key.in_(rest))
+        ).all())
+    return found
+
+def resolve(session: Session, names):
+    # {name: exercise type id} for every name, adding unknown exercises to the
+    # catalog (labelled with the first spelling seen; users are shown their
+    # own, see database.Exercise.name). Does not commit.
+    names = list(dict.fromkeys(names))
+    keys = {name: normalize(name) for name in names}
+    found = lookup_keys(session, keys.values())
+    missing = {}
+    for name in names:
+        if keys[name] not in found:
+            missing.setdefault(keys[name], name.strip())
+    if missing:
+        # A concurrent request may add the same exercise: skip it and re-read
+        insert = dialect_insert(session)
+        session.exec(insert(ExerciseType).values([
+            {"name": name, "key": key} for key, name in missing.items()
+        ]).on_conflict_do_nothing(index_elements=["key"]))
+        found.update(lookup_keys(session, missing))
+    return {name: found[keys[name]] for name in names}
+
+def lookup(session: Session, name: str) -> Optional[int]:
+    # Exercise type id for name, or None when it is not in the catalog
+    return lookup_keys(session, [normalize(name)]).get(normalize(name))
+
+def seed(session: Session, aliases=DEFAULT_ALIASES):
+    # Adds the canonical exercises and aliases that are missing. Does not commit.
+    resolve(session, sorted(set(aliases.values())))
+    canonical = lookup_keys(session, [normalize(name) for name in aliases.values()])
+    known = set(session.exec(select(ExerciseAlias.key)).all())
+    rows = [
+        {"key": normalize(alias), "exercise_type_id": canonical[normalize(target)]}
+        for alias, target in aliases.items()
+        if normalize(alias) not in known
+    ]
+    if rows:
+        insert = dialect_insert(session)
+        session.exec(insert(ExerciseAlias).values(rows).on_conflict_do_nothing(index_elements=["key"]))
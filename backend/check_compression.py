@@ -0,0 +1,69 @@
+# check_compression.py
+# Checks response compression: large JSON bodies and streamed exports are
+# sent brotli- or gzip-compressed as Accept-Encoding prefers (and decode to
+# the uncompressed body), small bodies and Parquet are sent as they are.
+# Needs the brotli package from requirements.txt. Runs against a throwaway
+# SQLite database unless DATABASE_URL is set.
+#   python check_compression.py
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/compression.db")
+
+from fastapi.testclient import TestClient
+from app import app
+import compression
+
+client = TestClient(app)
+client.post("/auth/register", json={"username": "compressor", "password": "secret"})
+token = client.post("/auth/login", json={"username": "compressor", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def get(path, encoding, **params):
+    return client.get(path, params=params, headers=dict(headers, **{"Accept-Encoding": encoding}))
+
+check("br" in compression.COMPRESSORS, "brotli is not installed")
+
+days = [{"date": f"2025-{m:02d}-{d:02d}", "exercises": [{"name": "bench press", "sets": [{"reps": 5, "weight": 100}] * 3}]}
+        for m in range(1, 13) for d in range(1, 29, 2)]
+client.post("/log_workouts", json={"days": days}, headers=headers)
+progression = "/analytics/exercise_progression/bench press"
+
+# Large JSON bodies, in the encoding the client prefers
+plain = get(progression, "identity")
+check("content-encoding" not in plain.headers and len(plain.content) >= compression.COMPRESSION_MIN_SIZE,
+      f"identity: {plain.headers}")
+for accept, expected in (("br, gzip", "br"), ("gzip, deflate, br", "br"), ("gzip", "gzip"), ("br;q=0, gzip", "gzip"),
+                         ("*", "br"), ("deflate", None)):
+    r = get(progression, accept)
+    check(r.headers.get("content-encoding") == expected, f"{accept}: {r.headers.get('content-encoding')}")
+    check(r.content == plain.content, f"{accept}: body differs")
+    if expected:
+        check("Accept-Encoding" in r.headers.get("vary", ""), f"{accept}: no Vary")
+
+# Small bodies are not worth it
+r = get("/templates", "br")
+check("content-encoding" not in r.headers, f"small body compressed: {r.headers}")
+
+# Streamed exports are compressed chunk by chunk; Parquet already is
+for fmt in ("csv", "jsonl"):
+    plain = get("/export", "identity", format=fmt)
+    for encoding in ("br", "gzip"):
+        r = get("/export", encoding, format=fmt)
+        check(r.headers.get("content-encoding") == encoding, f"{fmt} export: {r.headers.get('content-encoding')}")
+        check(r.content == plain.content and len(plain.content) > 0, f"{fmt} export: body differs")
+r = get("/export", "br", format="parquet")
+check("content-encoding" not in r.headers, "parquet export compressed")
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,144 @@
+# check_downsampling.py
+# Checks the max_points / bucket downsampling of progression series: LTTB
+# picks the same points as a straightforward per-point implementation, every
+# weight and volume record survives, buckets keep their best day, and
+# GET /analytics/exercise_progression stays within max_points however long
+# the history. Runs against a throwaway SQLite database unless DATABASE_URL
+# is set.
+#   python check_downsampling.py
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/downsampling.db")
+
+import numpy as np
+from fastapi.testclient import TestClient
+from app import app
+import analytics
+
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def reference_lttb(x, y, n):
+    # LTTB as usually written, one point at a time
+    size = len(x)
+    every = (size - 2) / (n - 2)
+    kept, a = [0], 0
+    for b in range(n - 2):
+        lo, hi = int(b * every) + 1, int((b + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((b + 2) * every) + 1, size)
+        if b == n - 3:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x = sum(x[next_lo:next_hi]) / (next_hi - next_lo)
+            avg_y = sum(y[next_lo:next_hi]) / (next_hi - next_lo)
+        areas = [abs((x[a] - avg_x) * (y[i] - y[a]) - (x[a] - x[i]) * (avg_y - y[a])) for i in range(lo, hi)]
+        a = lo + areas.index(max(areas))
+        kept.append(a)
+    return kept + [size - 1]
+
+def history(rng, days):
+    # A training series: slow progress with noise, a deload now and then
+    start = date(2015, 1, 5)
+    series = {"date": [], "volume": [], "weight": [], "reps": []}
+    weight = 60.0
+    for i in range(days):
+        weight = max(40.0, weight + rng.choice([0, 0, 0, 2.5, -2.5]) - (10 if rng.random() < 0.01 else 0))
+        reps = rng.randint(3, 10)
+        series["date"].append(start + timedelta(days=2 * i))
+        series["weight"].append(weight)
+        series["reps"].append(reps)
+        series["volume"].append(weight * reps)
+    return series
+
+rng = random.Random(7)
+
+# The vectorised LTTB keeps the same points as the per-point version
+for size, n in ((10, 3), (100, 10), (1000, 37), (5000, 500)):
+    x = np.cumsum(np.array([rng.randint(1, 4) for _ in range(size)], dtype=np.float64))
+    y = np.array([rng.gauss(0, 1) for _ in range(size)])
+    kept = analytics.lttb(x, y, n).tolist()
+    check(kept == reference_lttb(x.tolist(), y.tolist(), n), f"lttb({size}, {n}) differs from the reference")
+check(analytics.lttb(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4], "lttb: short series cut")
+
+# Records always survive; the rest is bounded by max_points
+series = history(rng, 3000)
+weight, volume = np.array(series["weight"]), np.array(series["volume"])
+records = {
+    series["date"][i]
+    for i in np.flatnonzero(analytics.records(weight) | analytics.records(volume))
+} | {series["date"][0], series["date"][-1]}
+for max_points in (3, 50, 300):
+    out = analytics.downsample(series, max_points)
+    check(records <= set(out["date"]), f"max_points={max_points}: records dropped")
+    check(len(out["date"]) <= max(max_points, len(records)), f"max_points={max_points}: {len(out['date'])} points")
+    check(out["date"] == sorted(out["date"]), f"max_points={max_points}: not chronological")
+    check(max(out["volume"]) == volume.max() and max(out["weight"]) == weight.max(), "peaks dropped")
+    check(all((d, v) in zip(series["date"], series["volume"]) for d, v in zip(out["date"], out["volume"])),
+          "points were not taken from the series")
+check(analytics.downsample(series) is series, "no parameters: series changed")
+
+# Buckets keep their highest-volume day (and any record)
+for bucket, key in (("week", lambda d: d - timedelta(days=d.weekday())), ("month", lambda d: (d.year, d.month))):
+    out = analytics.downsample(series, bucket=bucket)
+    best = {}
+    for d, v in zip(series["date"], series["volume"]):
+        if key(d) not in best or v > best[key(d)][1]:
+            best[key(d)] = (d, v)
+    expected = sorted({d for d, _ in best.values()} | records)
+    check(out["date"] == expected, f"bucket={bucket}: wrong days kept")
+check(analytics.downsample(series, bucket="day")["date"] == series["date"], "bucket=day changed the series")
+try:
+    analytics.downsample(series, bucket="year")
+    check(False, "unknown bucket accepted")
+except ValueError:
+    pass
+
+# Ten years of every-other-day training in a few milliseconds
+long = history(rng, 1825)
+start = time.perf_counter()
+for _ in range(20):
+    analytics.downsample(long, 200, "week")
+elapsed = (time.perf_counter() - start) / 20 * 1000
+check(elapsed < 50, f"downsample took {elapsed:.1f} ms")
+
+# Through the endpoint
+client = TestClient(app)
+client.post("/auth/register", json={"username": "downsampler", "password": "secret"})
+token = client.post("/auth/login", json={"username": "downsampler", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+days = [{"date": d.isoformat(), "exercises": [{"name": "bench press", "sets": [{"reps": r, "weight": w}] * 2}]}
+        for d, r, w in zip(long["date"], long["reps"], long["weight"])]
+client.post("/log_workouts", json={"days": days}, headers=headers)
+
+def progression(**params):
+    return client.get("/analytics/exercise_progression/bench press", params=params, headers=headers).json()
+
+full = progression()
+check(len(full["set_data"]["1"]) == len(days), f"full series: {len(full['set_data']['1'])} points")
+small = progression(max_points=100)
+long_records = np.count_nonzero(analytics.records(np.array(long["weight"])) | analytics.records(np.array(long["volume"])))
+check(all(len(points) <= max(100, long_records + 1) for points in small["set_data"].values()),
+      "max_points not applied")
+check(len(small["set_data"]["1"]) < len(days), "max_points: nothing removed")
+check(progression(max_points=100, layout="columns")["set_data"]["1"]["dates"] == [p["date"] for p in small["set_data"]["1"]],
+      "columns layout picks other points")
+monthly = progression(bucket="month")
+check(len(monthly["set_data"]["1"]) < len(days) / 10, f"bucket=month: {len(monthly['set_data']['1'])} points")
+check("error" in progression(bucket="year"), "unknown bucket accepted by the endpoint")
+r = client.get("/analytics/exercise_progression/bench press", params={"max_points": 2}, headers=headers)
+check(r.status_code == 422, f"max_points=2: {r.status_code}")
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,141 @@
+# check_etags.py
+# Checks conditional GETs on the cached read endpoints: an unchanged view
+# answers 304 to its own ETag, and each mutation invalidates exactly the views
+# it touched, both for ETags and in the analytics response cache. Runs
+# against a throwaway database.
+#   python check_etags.py            (also with DB_WRITE_QUEUE=1 / DB_ASYNC=1)
+import os
+import sys
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/etags.db"
+
+from fastapi.testclient import TestClient
+from app import app
+import response_cache
+
+DAY_A, DAY_B = "2025-03-03", "2025-04-07"
+VIEWS = {
+    "day A": f"/workouts/{DAY_A}",
+    "day B": f"/workouts/{DAY_B}",
+    "templates": "/templates",
+    "march": "/analytics/calendar/2025/3",
+    "april": "/analytics/calendar/2025/4",
+    "progression": "/analytics/exercise_progression/bench press",
+    "dashboard A": f"/dashboard?date={DAY_A}",
+}
+# Mutation -> views it must invalidate; every other view must stay cached
+MUTATIONS = [
+    ("add_set", "post", f"/add_set/{DAY_A}/bench press", {"json": {"reps": 5, "weight": 100}},
+     {"day A", "progression", "dashboard A"}),
+    ("add_set again", "post", f"/add_set/{DAY_A}/bench press", {"json": {"reps": 3, "weight": 110}},
+     {"day A", "progression", "dashboard A"}),
+    ("delete_set", "delete", f"/delete_set/{DAY_A}/bench press/0", {},
+     {"day A", "progression", "dashboard A"}),
+    ("apply_template", "post", f"/apply_template/{DAY_B}/push", {},
+     {"day B", "april"}),
+    ("edit_template", "put", "/edit_template/push", {"json": {"name": "push", "exercises": ["dips"]}},
+     {"templates", "dashboard A"}),
+]
+
+client = TestClient(app)
+client.post("/auth/register", json={"username": "etaguser", "password": "secret"})
+token = client.post("/auth/login", json={"username": "etaguser", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def fetch(path, etag=None, **extra):
+    h = dict(headers, **extra)
+    if etag:
+        h["If-None-Match"] = etag
+    return client.get(path, headers=h)
+
+client.post(f"/add_exercise/{DAY_A}", json={"name": "bench press"}, headers=headers)
+client.post(f"/add_set/{DAY_A}/bench press", json={"reps": 8, "weight": 80}, headers=headers)
+client.post("/add_template", json={"name": "push", "exercises": ["bench press", "dips"]}, headers=headers)
+
+etags, bodies = {}, {}
+for view, path in VIEWS.items():
+    r = fetch(path)
+    check(r.status_code == 200 and "ETag" in r.headers, f"{view}: first GET has no ETag")
+    etags[view], bodies[view] = r.headers.get("ETag"), r.json()
+    r = fetch(path, etags[view])
+    check(r.status_code == 304 and not r.content, f"{view}: repeated GET is not 304 ({r.status_code})")
+    check(r.headers.get("ETag") == etags[view], f"{view}: 304 carries a different ETag")
+
+r = fetch(VIEWS["templates"], **{"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+check(r.status_code == 304, "templates: If-Modified-Since in the future is not 304")
+r = fetch(VIEWS["templates"], **{"If-Modified-Since": "Thu, 01 Jan 2015 00:00:00 GMT"})
+check(r.status_code == 200, "templates: If-Modified-Since in the past is not 200")
+
+def mutate(name, method, path, kwargs, touched):
+    r = getattr(client, method)(path, headers=headers, **kwargs)
+    check(r.status_code == 200 and "error" not in r.json(), f"{name}: request failed {r.text}")
+    for view, view_path in VIEWS.items():
+        r = fetch(view_path, etags[view])
+        if view in touched:
+            check(r.status_code == 200, f"{name}: {view} still answered 304")
+            check(r.headers.get("ETag") not in (None, etags[view]), f"{name}: {view} kept its ETag")
+            check(r.json() != bodies[view], f"{name}: {view} body did not change")
+            etags[view], bodies[view] = r.headers.get("ETag"), r.json()
+        else:
+            check(r.status_code == 304, f"{name}: {view} was invalidated ({r.status_code})")
+
+for mutation in MUTATIONS:
+    mutate(*mutation)
+
+# Set-id endpoints, on the ids the day view returns
+set_ids = [s["id"] for s in bodies["day A"]["exercises"][0]["sets"]]
+touched = {"day A", "progression", "dashboard A"}
+mutate("reorder sets", "put", "/sets/order", {"json": {"set_ids": set_ids[::-1]}}, touched)
+mutate("update set", "patch", f"/sets/{set_ids[0]}", {"json": {"reps": 12}}, touched)
+mutate("delete set", "delete", f"/sets/{set_ids[0]}", {}, touched)
+
+# The dashboard is the day view, calendar and templates in one response, and
+# ?include_day=true returns the day view a write left behind
+dashboard = fetch(VIEWS["dashboard A"]).json()
+check(dashboard["day"] == bodies["day A"] and dashboard["calendar"] == bodies["march"]
+      and dashboard["templates"] == bodies["templates"]["templates"], "dashboard differs from the separate views")
+r = client.post(f"/add_set/{DAY_A}/bench press?include_day=true", json={"reps": 2, "weight": 120}, headers=headers)
+check(r.json().get("day") == fetch(VIEWS["day A"]).json(), f"add_set ?include_day=true: {r.text[:200]}")
+r = client.post(f"/add_set/{DAY_A}/bench press", json={"reps": 2, "weight": 120}, headers=headers)
+check("day" not in r.json(), "add_set returned the day without ?include_day=true")
+for view in ("day A", "progression", "dashboard A"):
+    r = fetch(VIEWS[view])
+    etags[view], bodies[view] = r.headers.get("ETag"), r.json()
+
+# Response cache: repeats are hits, and a committed add_set evicts the
+# user's set-derived entries but keeps the calendar's
+def cache_counts():
+    return client.get("/analytics/cache_stats").json()
+
+def check_response_cache():
+    for view in ("progression", "march"):
+        fetch(VIEWS[view])
+    before = cache_counts()
+    for view in ("progression", "march"):
+        r = fetch(VIEWS[view])
+        check(r.json() == bodies[view], f"cache: {view} served a different body")
+    after = cache_counts()
+    check(after["hits"] - before["hits"] == 2, f"cache: repeated GETs were not hits ({before} -> {after})")
+    client.post(f"/add_set/{DAY_A}/bench press", json={"reps": 1, "weight": 150}, headers=headers)
+    evicted = cache_counts()
+    check(evicted["invalidations"] > after["invalidations"], "cache: add_set evicted nothing")
+    fetch(VIEWS["march"])
+    check(cache_counts()["hits"] == evicted["hits"] + 1, "cache: add_set evicted the calendar")
+    r = fetch(VIEWS["progression"])
+    check(r.json() != bodies["progression"], "cache: progression is stale after add_set")
+
+if response_cache.response_cache is not None:
+    check_response_cache()
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,123 @@
+# check_idempotency.py
+# Checks that the write endpoints are safe to race and to retry: concurrent
+# apply_template / add_exercise / log_workouts calls create each exercise
+# once, applying a template is a single INSERT, and a retried write with the
+# same Idempotency-Key is replayed instead of repeated. Runs against a
+# throwaway SQLite database unless DATABASE_URL is set.
+#   python check_idempotency.py      (also with DB_WRITE_QUEUE=1)
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/idempotency.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlmodel import Session, select
+from database import engine, Exercise, Workout
+from app import app
+
+THREADS = 16
+TEMPLATE = [
+    "bench press", "incline bench press", "overhead press", "dips", "push ups",
+    "tricep pushdown", "skull crushers", "lateral raise", "cable fly", "chest press",
+    "front raise", "close grip bench", "pec deck", "landmine press", "face pull",
+]
+
+client = TestClient(app)
+client.post("/auth/register", json={"username": "idemuser", "password": "secret"})
+token = client.post("/auth/login", json={"username": "idemuser", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def race(method, path, key=None, **kwargs):
+    # The same request from THREADS clients at once
+    h = dict(headers, **({"Idempotency-Key": key} if key else {}))
+    def send(_):
+        return getattr(TestClient(app), method)(path, headers=h, **kwargs)
+    with ThreadPoolExecutor(THREADS) as pool:
+        return list(pool.map(send, range(THREADS)))
+
+def count(model, d):
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(model).where(model.date == date.fromisoformat(d))).one()
+
+exercise_inserts = []
+
+@event.listens_for(engine, "before_cursor_execute")
+def capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith("INSERT INTO EXERCISE "):
+        exercise_inserts.append(statement)
+
+client.post("/add_template", json={"name": "push", "exercises": TEMPLATE}, headers=headers)
+
+# A 15-exercise template is applied with one statement
+client.post("/apply_template/2025-05-01/push", headers=headers)
+check(len(exercise_inserts) == 1, f"apply_template: {len(exercise_inserts)} INSERT statements")
+check(count(Exercise, "2025-05-01") == len(TEMPLATE), "apply_template: wrong number of exercises")
+
+# Concurrent applies of the same template
+responses = race("post", "/apply_template/2025-05-02/push")
+check(all(r.status_code == 200 and "error" not in r.json() for r in responses),
+      f"apply_template race: {[r.text for r in responses if r.status_code != 200 or 'error' in r.json()][:3]}")
+check(count(Exercise, "2025-05-02") == len(TEMPLATE), f"apply_template race: {count(Exercise, '2025-05-02')} exercises")
+
+# Concurrent add_exercise: exactly one is added
+responses = race("post", "/add_exercise/2025-05-03", json={"name": "Deadlift"})
+added = [r for r in responses if "message" in r.json()]
+check(len(added) == 1, f"add_exercise race: {len(added)} added")
+check(all("already exists" in r.json().get("error", "") for r in responses if r not in added),
+      "add_exercise race: unexpected error")
+check(count(Exercise, "2025-05-03") == 1, "add_exercise race: duplicate rows")
+
+# Concurrent log_workouts creating the same new exercise
+log = {"days": [{"date": "2025-05-04", "exercises": [{"name": "squat", "sets": [{"reps": 5, "weight": 100}]}]}]}
+responses = race("post", "/log_workouts", json=log)
+check(all("message" in r.json() for r in responses), f"log_workouts race: {[r.text for r in responses][:2]}")
+check(count(Exercise, "2025-05-04") == 1, "log_workouts race: duplicate exercises")
+check(count(Workout, "2025-05-04") == THREADS, "log_workouts race: lost sets")
+
+# Retries with one Idempotency-Key write once and replay the same response
+client.post("/add_exercise/2025-05-05", json={"name": "bench press"}, headers=headers)
+responses = race("post", "/add_set/2025-05-05/bench press", key="set-1", json={"reps": 5, "weight": 100})
+check(all(r.status_code == 200 for r in responses), f"add_set retries: {[r.status_code for r in responses]}")
+check(len({r.content for r in responses}) == 1, "add_set retries: responses differ")
+replayed = sum(r.headers.get("Idempotency-Replayed") == "true" for r in responses)
+check(replayed == THREADS - 1, f"add_set retries: {replayed} replayed")
+check(count(Workout, "2025-05-05") == 1, f"add_set retries: {count(Workout, '2025-05-05')} sets written")
+
+r = client.post("/add_set/2025-05-05/bench press", json={"reps": 8, "weight": 100},
+                headers=dict(headers, **{"Idempotency-Key": "set-1"}))
+check(r.status_code == 422, f"reused key with another body: {r.status_code}")
+r = client.post("/add_set/2025-05-05/bench press", json={"reps": 8, "weight": 100},
+                headers=dict(headers, **{"Idempotency-Key": "set-2"}))
+check(r.status_code == 200 and "Idempotency-Replayed" not in r.headers, "new key was not written")
+
+log = {"days": [{"date": "2025-05-06", "exercises": [{"name": "row", "sets": [{"reps": 8, "weight": 60}] * 3}]}]}
+for _ in range(3):
+    client.post("/log_workouts", json=log, headers=dict(headers, **{"Idempotency-Key": "log-1"}))
+check(count(Workout, "2025-05-06") == 3, f"log_workouts retries: {count(Workout, '2025-05-06')} sets")
+
+for _ in range(2):
+    client.delete("/delete_set/2025-05-06/row/0", headers=dict(headers, **{"Idempotency-Key": "delete-1"}))
+check(count(Workout, "2025-05-06") == 2, "delete_set retry deleted a second set")
+
+# A failed write does not use up its key
+h = dict(headers, **{"Idempotency-Key": "missing"})
+client.post("/add_set/2025-05-07/bench press", json={"reps": 5, "weight": 100}, headers=h)
+client.post("/add_exercise/2025-05-07", json={"name": "bench press"}, headers=headers)
+r = client.post("/add_set/2025-05-07/bench press", json={"reps": 5, "weight": 100}, headers=h)
+check("message" in r.json() and count(Workout, "2025-05-07") == 1, "key of a failed write was kept")
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
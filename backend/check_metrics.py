@@ -0,0 +1,135 @@
+# check_metrics.py
+# Checks GET /metrics: the exposition parses, every request is counted under
+# its route template, and the SQL statement count of the hot endpoints stays
+# within budget however much data a request touches, which is how an N+1
+# regression (one query per exercise or set) shows up. Also checks the slow
+# request log. Runs against a throwaway SQLite database unless DATABASE_URL
+# is set.
+#   python check_metrics.py
+import logging
+import os
+import re
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/metrics.db")
+
+from fastapi.testclient import TestClient
+from app import app
+import metrics
+
+# Statements per request, whatever the number of exercises or sets involved
+BUDGETS = {
+    ("GET", "/workouts/{date}"): 2,
+    ("GET", "/workouts"): 3,
+    ("POST", "/apply_template/{date}/{template_name}"): 4,
+    ("POST", "/log_workouts"): 12,
+    ("GET", "/analytics/exercise_progression/{exercise_name}"): 4,
+    ("GET", "/dashboard"): 4,
+    ("GET", "/sync"): 5,
+    ("POST", "/sync"): 12,
+}
+SAMPLE = re.compile(r'^[a-z_]+(\{([a-z_]+="([^"\\]|\\.)*",?)*\})? -?[0-9.e+-]+$|^[a-z_]+(\{.*\})? \+?Inf$')
+
+client = TestClient(app)
+client.post("/auth/register", json={"username": "metricsuser", "password": "secret"})
+token = client.post("/auth/login", json={"username": "metricsuser", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def scrape(validate=False):
+    # {(metric name, frozenset of labels): value}
+    samples = {}
+    lines = [line for line in client.get("/metrics").text.splitlines() if line and not line.startswith("#")]
+    if validate:
+        malformed = [line for line in lines if not SAMPLE.match(line)]
+        check(not malformed, f"malformed samples: {malformed[:3]}")
+    for line in lines:
+        name, _, rest = line.partition("{")
+        if rest:
+            labels, _, value = rest.rpartition("} ")
+            labels = frozenset(re.findall(r'([a-z_]+)="((?:[^"\\]|\\.)*)"', labels))
+        else:
+            name, value = line.split(" ")
+            labels = frozenset()
+        samples[(name, labels)] = float(value)
+    return samples
+
+def statements(samples, method, route):
+    key = ("gymtracker_sql_statements_per_request_sum", frozenset({("method", method), ("route", route)}))
+    return samples.get(key, 0.0)
+
+used_by_size = {}
+
+def within_budget(method, route, send):
+    before = statements(scrape(), method, route)
+    send()
+    used = statements(scrape(), method, route) - before
+    check(0 < used <= BUDGETS[(method, route)], f"{method} {route}: {used:.0f} statements")
+    used_by_size.setdefault((method, route), []).append(used)
+
+# Small and large versions of the same requests use the same number of statements
+for size, d in ((1, "2025-06-01"), (12, "2025-06-02")):
+    names = [f"exercise {i}" for i in range(size)]
+    client.post("/add_template", json={"name": f"t{size}", "exercises": names}, headers=headers)
+    within_budget("POST", "/apply_template/{date}/{template_name}",
+                  lambda: client.post(f"/apply_template/{d}/t{size}", headers=headers))
+    log = {"days": [{"date": d, "exercises": [{"name": n, "sets": [{"reps": 5, "weight": 50}] * 5} for n in names]}]}
+    within_budget("POST", "/log_workouts", lambda: client.post("/log_workouts", json=log, headers=headers))
+    within_budget("GET", "/workouts/{date}", lambda: client.get(f"/workouts/{d}", headers=headers))
+    within_budget("GET", "/workouts", lambda: client.get("/workouts", params={"from": d, "to": d}, headers=headers))
+    within_budget("GET", "/analytics/exercise_progression/{exercise_name}",
+                  lambda: client.get("/analytics/exercise_progression/exercise 0", headers=headers))
+    within_budget("GET", "/dashboard", lambda: client.get("/dashboard", params={"date": d}, headers=headers))
+    changes = [{"kind": "set", "op": "create", "date": d, "exercise": n, "reps": 3, "weight": 60} for n in names]
+    since = client.get("/sync", params={"since": 1}, headers=headers).json()["revision"]
+    within_budget("POST", "/sync", lambda: client.post("/sync", json={"changes": changes}, headers=headers))
+    within_budget("GET", "/sync", lambda: client.get("/sync", params={"since": since}, headers=headers))
+for (method, route), used in used_by_size.items():
+    check(used[0] == used[1], f"{method} {route}: {used[0]:.0f} statements for 1 exercise, {used[1]:.0f} for 12")
+
+# Every request is counted once, under its route template, in every metric
+client.get("/workouts/2025-06-01", headers=headers)
+client.get("/no_such_page")
+samples = scrape(validate=True)
+route = frozenset({("method", "GET"), ("route", "/workouts/{date}")})
+total = sum(v for (name, labels), v in samples.items()
+            if name == "gymtracker_http_requests_total" and route <= labels)
+check(total == 3, f"/workouts/{{date}} counted {total} times")
+check(samples.get(("gymtracker_http_request_duration_seconds_count", route)) == total, "latency count differs")
+check(samples.get(("gymtracker_sql_statements_per_request_count", route)) == total, "statement count differs")
+check(samples.get(("gymtracker_http_request_duration_seconds_bucket", route | {("le", "+Inf")})) == total,
+      "+Inf bucket differs from count")
+check(samples.get(("gymtracker_auth_duration_seconds_total", route), 0) > 0, "token checks not timed")
+check(not any(("route", "/workouts/2025-06-01") in labels for _, labels in samples), "raw path used as a label")
+check(any(("route", "unmatched") in labels for _, labels in samples), "404 not counted")
+bcrypt = {dict(labels)["operation"]: v for (name, labels), v in samples.items()
+          if name == "gymtracker_bcrypt_duration_seconds_count"}
+check(bcrypt.get("hash_password") == 1 and bcrypt.get("verify_password") == 1, f"bcrypt timings: {bcrypt}")
+check(("gymtracker_db_pool_checkouts_total", frozenset({("engine", "sync")})) in samples, "pool stats missing")
+
+# Slow requests are logged with their statements
+logged = []
+handler = logging.Handler()
+handler.emit = logged.append
+metrics.logger.addHandler(handler)
+metrics.SLOW_REQUEST_MS = 1e-6
+client.get("/workouts/2025-06-02", headers=headers)
+metrics.SLOW_REQUEST_MS = 0
+metrics.logger.removeHandler(handler)
+message = logged[0].getMessage() if logged else ""
+check(len(logged) == 1 and "GET /workouts/2025-06-02 -> 200" in message and "FROM exercise" in message,
+      f"slow request log: {message[:200]}")
+slow = scrape().get(("gymtracker_slow_requests_total", route))
+check(slow == 1, f"slow requests counted {slow}")
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,123 @@
+# check_migrations.py
+# Checks that a database created by every earlier schema version upgrades to
+# the current one with its data intact: each version's app (checked out from
+# git into a temporary worktree) writes a few exercises, sets and a template,
+# then the current app migrates the file and reads them back. SQLite only.
+#   python check_migrations.py
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# The commit that introduced each schema version (0: before migrations)
+VERSIONS = {
+    0: "bcdaa2a",
+    1: "ada93c6",
+    2: "db7b344",
+    3: "08d9adf",
+    4: "e6630b7",
+    5: "d2821b2",
+    6: "4b94c78",
+    7: "49c4916",
+}
+
+# Run by the old app, in its own checkout
+WRITE = """
+from fastapi.testclient import TestClient
+from app import app
+with TestClient(app) as client:
+    client.post("/auth/register", json={"username": "migrator", "password": "secret"})
+    token = client.post("/auth/login", json={"username": "migrator", "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/add_exercise/2025-06-01", json={"name": "Flat Bench"}, headers=headers)
+    client.post("/add_set/2025-06-01/Flat Bench", json={"reps": 5, "weight": 100}, headers=headers)
+    client.post("/add_set/2025-06-01/Flat Bench", json={"reps": 5, "weight": 105}, headers=headers)
+    client.post("/add_exercise/2025-06-02", json={"name": "Zercher Squat"}, headers=headers)
+    client.post("/add_set/2025-06-02/Zercher Squat", json={"reps": 8, "weight": 80}, headers=headers)
+    client.post("/add_template", json={"name": "push", "exercises": ["Flat Bench", "dips"]}, headers=headers)
+"""
+
+# Run by the current app on the old file
+READ = """
+import json
+from fastapi.testclient import TestClient
+from app import app
+from database import engine
+from migrations import LATEST_VERSION
+with TestClient(app) as client:
+    token = client.post("/auth/login", json={"username": "migrator", "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    days = [client.get(f"/workouts/{d}", headers=headers).json() for d in ("2025-06-01", "2025-06-02")]
+    client.post("/add_set/2025-06-02/zercher squat", json={"reps": 8, "weight": 85}, headers=headers)
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("SELECT MAX(version) FROM schema_version").scalar()
+        foreign_keys = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+    print(json.dumps({
+        "days": days,
+        "templates": client.get("/templates", headers=headers).json()["templates"],
+        "after_write": client.get("/workouts/2025-06-02", headers=headers).json(),
+        "version": version,
+        "latest": LATEST_VERSION,
+        "foreign_keys": foreign_keys,
+    }, default=str))
+"""
+
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def run(code, cwd, db_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    env.pop("DB_ASYNC", None)
+    return subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+
+backend = os.path.dirname(os.path.abspath(__file__))
+root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=backend, capture_output=True, text=True,
+                      check=True).stdout.strip()
+work = tempfile.mkdtemp()
+
+for version, commit in VERSIONS.items():
+    tree = os.path.join(work, f"v{version}")
+    db_path = os.path.join(work, f"v{version}.db")
+    subprocess.run(["git", "worktree", "add", "--detach", "-q", tree, commit], cwd=root, check=True)
+    try:
+        old_backend = os.path.join(tree, "backend")
+        written = run(WRITE, old_backend, db_path)
+        # The first version has its database path hard-coded
+        if not os.path.exists(db_path) and os.path.exists(os.path.join(old_backend, "gymtracker.db")):
+            shutil.copy(os.path.join(old_backend, "gymtracker.db"), db_path)
+        check(written.returncode == 0, f"v{version}: old app failed: {written.stderr[-500:]}")
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=root, check=True)
+    if written.returncode:
+        continue
+
+    read = run(READ, backend, db_path)
+    check(read.returncode == 0, f"v{version}: upgrade failed: {read.stderr[-500:]}")
+    if read.returncode:
+        continue
+    result = json.loads(read.stdout.strip().splitlines()[-1])
+    check(result["version"] == result["latest"], f"v{version}: schema version {result['version']}")
+    check(result["foreign_keys"] == 1, f"v{version}: foreign keys left off")
+
+    # Versions 4 to 7 showed catalog names; earlier ones kept the spelling
+    bench = "Flat Bench" if version < 4 else "bench press"
+    days = [{e["name"]: [(s["reps"], s["weight"]) for s in e["sets"]] for e in day["exercises"]}
+            for day in result["days"]]
+    check(days == [{bench: [(5, 100), (5, 105)]}, {"Zercher Squat": [(8, 80)]}], f"v{version}: days {days}")
+    check(result["templates"].get("push") == [bench, "dips"], f"v{version}: templates {result['templates']}")
+    sets = result["after_write"]["exercises"][0]["sets"]
+    check([s["weight"] for s in sets] == [80, 85] and sets[1]["id"] > sets[0]["id"],
+          f"v{version}: write after upgrade {sets}")
+
+shutil.rmtree(work, ignore_errors=True)
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,110 @@
+# check_postgres.py
+# Runs the same API scenario against SQLite and PostgreSQL, with the read
+# replica engine pointed at the same database, and checks both give identical
+# responses. PostgreSQL comes from POSTGRES_URL, or from an embedded server
+# (pip install pgserver) when that is not set. Needs psycopg[binary].
+#   python check_postgres.py
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+def scenario():
+    from fastapi.testclient import TestClient
+    from app import app
+    from database import pool_checkouts, DATABASE_REPLICA_URL
+
+    client = TestClient(app)
+    client.post("/auth/register", json={"username": "pguser", "password": "secret"})
+    token = client.post("/auth/login", json={"username": "pguser", "password": "secret"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    steps = [
+        ("post", "/add_exercise/2025-03-03", {"json": {"name": "bench press"}}),
+        ("post", "/add_exercise/2025-03-03", {"json": {"name": "bench press"}}),
+        ("post", "/add_set/2025-03-03/bench press", {"json": {"reps": 5, "weight": 100}}),
+        ("post", "/add_set/2025-03-03/bench press", {"json": {"reps": 3, "weight": 110}}),
+        ("post", "/log_workouts", {"json": {"days": [
+            {"date": "2025-03-05", "exercises": [{"name": "squat", "sets": [{"reps": 5, "weight": 140}]}]},
+            {"date": "2025-03-10", "exercises": [{"name": "bench press", "sets": [{"reps": 1, "weight": 120}]}]},
+        ]}}),
+        ("post", "/import", {"files": {"file": ("log.csv", "date,exercise,reps,weight\n2025-03-12,deadlift,5,180\n2025-03-12,deadlift,x,180\n")}}),
+        ("post", "/add_template", {"json": {"name": "push", "exercises": ["bench press", "dips"]}}),
+        ("post", "/apply_template/2025-03-14/push", {}),
+        ("put", "/edit_template/push", {"json": {"name": "push", "exercises": ["bench press", "overhead press"]}}),
+        ("get", "/workouts/2025-03-03", {}),
+        ("get", "/workouts/2025-03-14", {}),
+        ("get", "/templates", {}),
+        ("get", "/analytics/calendar/2025/3", {}),
+        ("get", "/analytics/exercise_progression/bench press", {}),
+        ("get", "/analytics/exercise_progression/bench press?limit=1", {}),
+        ("get", "/workouts?from=2025-03-04&to=2025-03-31&exercise=bench press", {}),
+        ("get", "/analytics/one_rep_max/bench press", {}),
+        ("get", "/analytics/personal_records", {}),
+        ("get", "/analytics/weekly_volume?by=muscle_group", {}),
+        ("get", "/analytics/streaks", {}),
+        ("get", "/export?format=jsonl", {}),
+        ("delete", "/delete_set/2025-03-03/bench press/0", {}),
+        ("delete", "/delete_exercise/2025-03-05/squat", {}),
+        ("delete", "/delete_template/push", {}),
+        ("get", "/analytics/exercise_progression/bench press", {}),
+        ("get", "/export?format=csv", {}),
+    ]
+    results = []
+    for method, path, kwargs in steps:
+        r = getattr(client, method)(path, headers=headers, **kwargs)
+        body = r.json() if r.headers.get("content-type", "").startswith("application/json") else r.text
+        results.append([method.upper(), path, r.status_code, body])
+    # Walk the history one entry per page; cursors hold row ids, which the
+    # two databases may hand out differently, so only the pages are compared
+    cursor, pages = None, []
+    while True:
+        page = client.get("/workouts", params={"limit": 1, **({"cursor": cursor} if cursor else {})}, headers=headers).json()
+        pages.append(page["days"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    results.append(["GET", "/workouts?limit=1 (all pages)", 200, pages])
+    replica_reads = pool_checkouts.get("replica", 0) if DATABASE_REPLICA_URL else None
+    return {"results": results, "replica_reads": replica_reads}
+
+def run_child(url: str):
+    env = {**os.environ, "DATABASE_URL": url, "DATABASE_REPLICA_URL": url, "CHECK_POSTGRES_CHILD": "1"}
+    out = subprocess.run([sys.executable, __file__], env=env, capture_output=True, text=True)
+    if out.returncode:
+        sys.exit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if os.getenv("CHECK_POSTGRES_CHILD"):
+        print(json.dumps(scenario()))
+        sys.exit()
+
+    pg_url = os.getenv("POSTGRES_URL")
+    server = None
+    if not pg_url:
+        try:
+            import pgserver
+        except ImportError:
+            sys.exit("Set POSTGRES_URL or pip install pgserver for an embedded server")
+        server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="stop")
+        pg_url = server.get_uri()
+        server.psql("DROP DATABASE IF EXISTS gymtracker_check;")
+        server.psql("CREATE DATABASE gymtracker_check;")
+        pg_url = pg_url.replace("/postgres?", "/gymtracker_check?")
+
+    try:
+        sqlite = run_child(f"sqlite:///{tempfile.mkdtemp()}/check.db")
+        postgres = run_child(pg_url)
+    finally:
+        if server:
+            server.cleanup()
+
+    failures = 0
+    for lite, pg in zip(sqlite["results"], postgres["results"]):
+        if lite != pg:
+            failures += 1
+            print(f"MISMATCH {pg[0]} {pg[1]}\n  sqlite:   {lite[2:]}\n  postgres: {pg[2:]}")
+    print(f"Compared {len(postgres['results'])} responses, {failures} mismatch(es); "
+          f"replica checkouts: {postgres['replica_reads']}")
+    sys.exit(1 if failures or not postgres["replica_reads"] else 0)
@@ -0,0 +1,117 @@
+# check_query_plans.py
+# Runs every endpoint against a throwaway SQLite database, captures the SQL it
+# issues and fails if EXPLAIN QUERY PLAN shows a full table scan for any of it.
+#   python check_query_plans.py
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/plans.db")
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+from starlette.requests import Request
+from database import engine, User
+from idempotency import Idempotency
+import app
+import auth
+import sync
+import versions
+from exporter import export_stream
+
+engine.echo = False
+
+captured = []
+
+@event.listens_for(engine, "before_cursor_execute")
+def capture(conn, cursor, statement, parameters, context, executemany):
+    if executemany:
+        # The plan is the same for every parameter set
+        parameters = parameters[0]
+    if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")) or "SELECT" in statement.upper():
+        # Includes INSERT ... SELECT and the INSERT of sets, which reads MAX(ordinal)
+        captured.append((statement, parameters))
+
+def exercise_endpoints():
+    with Session(engine) as session:
+        asyncio.run(auth.register_user(auth.UserCreate(username="planuser", password="pw"), session=session))
+        asyncio.run(auth.login_user(auth.UserCreate(username="planuser", password="pw"), session=session))
+        user = session.exec(select(User).where(User.username == "planuser")).one()
+
+        day = date(2025, 1, 15)
+        request = Request({"type": "http", "headers": []})
+        idem = Idempotency(user.id, None, None)
+        app.add_exercise(day, app.ExerciseRequest(name="bench press"), current_user=user, idem=idem, session=session)
+        app.add_exercise(day, app.ExerciseRequest(name="bench press"), current_user=user, idem=idem, session=session)
+        app.add_set(day, "bench press", app.Set(reps=5, weight=100), current_user=user, idem=idem, session=session)
+        for _ in range(2):
+            # First use of the key, then a replay
+            keyed = Idempotency(user.id, "plan-key", "fingerprint")
+            app.add_set(day, "bench press", app.Set(reps=5, weight=100), current_user=user, idem=keyed, session=session)
+        app.log_workouts(app.BulkLog(days=[app.DayLog(date=day, exercises=[
+            app.ExerciseRequest(name="bench press", sets=[app.Set(reps=3, weight=110)]),
+            app.ExerciseRequest(name="squat", sets=[app.Set(reps=5, weight=140)]),
+        ])]), current_user=user, idem=idem, session=session)
+        versions.stamp(session, user.id, versions.day(day))
+        app.load_day(session, user.id, day)
+        versions.combined(session, user.id, "dashboard", [versions.day(day), versions.month(2025, 1), versions.TEMPLATES])
+        app.load_dashboard(session, user.id, day)
+        app.delete_set(day, "bench press", 0, current_user=user, idem=idem, session=session)
+        set_ids = [s["id"] for s in app.load_day(session, user.id, day)["exercises"][0]["sets"]]
+        app.reorder_sets(app.SetOrder(set_ids=set_ids[::-1]), current_user=user, idem=idem, session=session)
+        app.update_set(set_ids[0], app.SetUpdate(weight=105), current_user=user, idem=idem, session=session)
+        app.delete_set_by_id(set_ids[0], current_user=user, idem=idem, session=session)
+        app.load_progression(session, user.id, "bench press")
+        app.load_progression(session, user.id, "bench press", date(2025, 1, 1), date(2025, 1, 31))
+        app.load_progression(session, user.id, "bench press", limit=10)
+        page = app.load_history(session, user.id, None, None, None, None, 1)
+        app.load_history(session, user.id, None, None, None, page["next_cursor"], 1)
+        app.load_history(session, user.id, date(2025, 1, 1), date(2025, 1, 31), "bench press", page["next_cursor"], 10)
+        app.load_calendar(session, user.id, 2025, 1)
+        app.get_one_rep_max("bench press", request, current_user=user, session=session)
+        app.get_weekly_volume(request, current_user=user, session=session)
+        app.add_template(app.TemplateCreate(name="Push", exercises=["dips", "bench press"]), current_user=user, idem=idem, session=session)
+        app.load_templates(session, user.id)
+        app.apply_template(day, "Push", current_user=user, idem=idem, session=session)
+        app.edit_template("Push", app.TemplateCreate(name="Push", exercises=["dips"]), current_user=user, idem=idem, session=session)
+        list(export_stream(user.id, "csv", day, day))
+        since = sync.current_revision(session, user.id)
+        rows = sync.load_changes(session, user.id)
+        sync.load_changes(session, user.id, since - 1)
+        sync.apply_changes(session, user.id, [
+            app.SyncChange(kind="set", op="update", id=rows["sets"][0]["id"], base_rev=since, reps=4),
+            app.SyncChange(kind="set", op="delete", id=rows["sets"][-1]["id"], base_rev=since),
+            app.SyncChange(kind="set", op="create", date=day, exercise="squat", reps=5, weight=150),
+            app.SyncChange(kind="template", op="update", id=rows["templates"][0]["id"], base_rev=since, name="Pull"),
+            app.SyncChange(kind="template", op="create", name="Legs", exercises=["squat"]),
+            app.SyncChange(kind="exercise", op="delete", id=rows["exercises"][-1]["id"], base_rev=since),
+        ])
+        session.commit()
+        sync.load_changes(session, user.id, since)
+        app.edit_template("Pull", app.TemplateCreate(name="Push", exercises=["dips"]), current_user=user, idem=idem, session=session)
+        app.delete_exercise(day, "bench press", current_user=user, idem=idem, session=session)
+        app.delete_template("Push", current_user=user, idem=idem, session=session)
+
+def full_scans():
+    failures = []
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        for statement, parameters in captured:
+            plan = raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            details = [row[-1] for row in plan]
+            if any(d.startswith("SCAN") for d in details):
+                failures.append((statement, details))
+    return failures
+
+if __name__ == "__main__":
+    exercise_endpoints()
+    failures = full_scans()
+    print(f"Checked {len(captured)} statements")
+    for statement, details in failures:
+        print("\nFULL SCAN:")
+        print(" ".join(statement.split()))
+        for d in details:
+            print("   ", d)
+    sys.exit(1 if failures else 0)
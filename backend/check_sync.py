@@ -0,0 +1,175 @@
+# check_sync.py
+# Checks the delta sync protocol: a full GET /sync, incremental syncs that
+# carry only what changed (tombstones included), POST /sync applying creates,
+# updates and deletes with base_rev conflict detection, a retried POST with
+# the same Idempotency-Key being replayed, and exercise names shown the way
+# each user typed them. Runs against a throwaway SQLite database unless
+# DATABASE_URL is set.
+#   python check_sync.py      (also with DB_WRITE_QUEUE=1)
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/sync.db")
+
+from fastapi.testclient import TestClient
+from app import app
+
+client = TestClient(app)
+client.post("/auth/register", json={"username": "syncuser", "password": "secret"})
+token = client.post("/auth/login", json={"username": "syncuser", "password": "secret"}).json()["access_token"]
+headers = {"Authorization": f"Bearer {token}"}
+failures = []
+checks = 0
+
+def check(condition, message):
+    global checks
+    checks += 1
+    if not condition:
+        failures.append(message)
+        print("FAIL", message)
+
+def pull(since=0):
+    return client.get("/sync", params={"since": since}, headers=headers).json()
+
+def push(changes, since=None, key=None):
+    h = dict(headers, **({"Idempotency-Key": key} if key else {}))
+    body = {"changes": changes, **({"since": since} if since is not None else {})}
+    return client.post("/sync", json=body, headers=h)
+
+def day_weights(d):
+    day = client.get(f"/workouts/{d}", headers=headers).json()
+    return {e["name"]: [s["weight"] for s in e["sets"]] for e in day["exercises"]}
+
+# Data written through the regular endpoints
+client.post("/add_exercise/2025-06-01", json={"name": "bench press"}, headers=headers)
+client.post("/add_set/2025-06-01/bench press", json={"reps": 5, "weight": 100}, headers=headers)
+client.post("/add_set/2025-06-01/bench press", json={"reps": 5, "weight": 105}, headers=headers)
+client.post("/add_template", json={"name": "push", "exercises": ["bench press", "dips"]}, headers=headers)
+
+full = pull()
+check(full["full"] and full["revision"] == 4, f"full sync: revision {full['revision']}")
+check(len(full["exercises"]) == 1 and full["exercises"][0]["name"] == "bench press", "full sync: exercises")
+check([s["weight"] for s in full["sets"]] == [100, 105], f"full sync: sets {full['sets']}")
+check(full["templates"][0]["exercises"] == ["bench press", "dips"], "full sync: templates")
+revision = full["revision"]
+
+# Nothing changed: an empty delta
+delta = pull(revision)
+check(not delta["full"] and delta["revision"] == revision, "empty delta: revision moved")
+check(not delta["exercises"] and not delta["sets"] and not delta["templates"], "empty delta: rows sent")
+
+# A since the server never reached gets a full copy
+check(pull(revision + 100)["full"], "unknown revision: no full copy")
+
+# Only the changed rows, and the deleted ids
+first_set, second_set = full["sets"]
+client.patch(f"/sets/{first_set['id']}", json={"reps": 6}, headers=headers)
+client.delete(f"/sets/{second_set['id']}", headers=headers)
+client.delete("/delete_template/push", headers=headers)
+delta = pull(revision)
+check(delta["revision"] == revision + 3, f"delta: revision {delta['revision']}")
+check([s["id"] for s in delta["sets"]] == [first_set["id"]] and delta["sets"][0]["reps"] == 6,
+      f"delta: sets {delta['sets']}")
+check(not delta["exercises"] and not delta["templates"], "delta: unchanged rows sent")
+check(delta["deleted"]["sets"] == [second_set["id"]], f"delta: deleted sets {delta['deleted']}")
+check(delta["deleted"]["templates"] == [full["templates"][0]["id"]], "delta: deleted template missing")
+check(pull(delta["revision"])["deleted"]["sets"] == [], "delta: tombstone sent twice")
+revision = delta["revision"]
+first_set = delta["sets"][0]
+
+# Offline changes: creates return ids, the response carries the delta
+r = push([
+    {"kind": "set", "op": "create", "ref": "a", "date": "2025-06-01", "exercise": "Bench Press", "reps": 3,
+     "weight": 110},
+    {"kind": "set", "op": "create", "ref": "b", "date": "2025-06-02", "exercise": "squat", "reps": 5,
+     "weight": 140},
+    {"kind": "set", "op": "create", "ref": "c", "date": "2025-06-02", "exercise": "squat", "reps": 5,
+     "weight": 145},
+    {"kind": "set", "op": "update", "ref": "d", "id": first_set["id"], "base_rev": first_set["rev"],
+     "weight": 102.5},
+    {"kind": "template", "op": "create", "ref": "e", "name": "legs", "exercises": ["squat"]},
+], since=revision).json()
+results = {result["ref"]: result for result in r["results"]}
+check(all(result["status"] == "applied" for result in r["results"]), f"push: {r['results']}")
+check(r["revision"] == revision + 1, "push: batch took more than one revision")
+pushed = {s["id"]: s for s in r["sets"]}
+check(pushed.get(results["b"]["id"], {}).get("weight") == 140 and pushed.get(results["c"]["id"], {}).get("weight") == 145,
+      f"push: created set ids {results}")
+check(pushed.get(results["a"]["id"], {}).get("ordinal") == 2, "push: set not appended to its exercise")
+check(pushed.get(first_set["id"], {}).get("weight") == 102.5, "push: update missing from the delta")
+check([t["name"] for t in r["templates"]] == ["legs"], f"push: templates {r['templates']}")
+check(list(day_weights("2025-06-02").values()) == [[140, 145]], f"push: day view {day_weights('2025-06-02')}")
+revision = r["revision"]
+
+# Changes made against an old base_rev conflict and leave the row alone
+stale = first_set["rev"]
+r = push([
+    {"kind": "set", "op": "update", "ref": "x", "id": first_set["id"], "base_rev": stale, "reps": 1},
+    {"kind": "set", "op": "delete", "ref": "y", "id": first_set["id"], "base_rev": stale},
+    {"kind": "exercise", "op": "delete", "ref": "z", "id": first_set["exercise_id"], "base_rev": stale},
+    {"kind": "template", "op": "create", "ref": "t", "name": "legs"},
+]).json()
+statuses = {result["ref"]: result["status"] for result in r["results"]}
+check(statuses == {"x": "conflict", "y": "conflict", "z": "conflict", "t": "conflict"}, f"conflicts: {statuses}")
+check(r["results"][0]["current"]["weight"] == 102.5, "conflict: current row missing")
+check(pull(revision)["sets"] == [], "conflict: rows were changed")
+
+# Deleting an exercise takes its sets, and deleting again is a no-op
+exercise_id = pushed[results["b"]["id"]]["exercise_id"]
+r = push([{"kind": "exercise", "op": "delete", "ref": "ex", "id": exercise_id, "base_rev": revision}]).json()
+check(r["results"][0]["status"] == "applied", f"exercise delete: {r['results']}")
+delta = pull(revision)
+check(delta["deleted"]["exercises"] == [exercise_id], "exercise delete: no tombstone")
+check(sorted(delta["deleted"]["sets"]) == sorted([results["b"]["id"], results["c"]["id"]]),
+      f"exercise delete: set tombstones {delta['deleted']}")
+check(day_weights("2025-06-02") == {}, "exercise delete: day not empty")
+r = push([{"kind": "exercise", "op": "delete", "ref": "ex", "id": exercise_id, "base_rev": revision}]).json()
+check(r["results"][0]["status"] == "applied", "repeated delete: not applied")
+
+# Invalid changes are reported per change
+r = push([
+    {"kind": "set", "op": "create", "ref": "n", "date": "2025-06-03", "exercise": "row"},
+    {"kind": "exercise", "op": "update", "ref": "u", "id": exercise_id},
+]).json()
+check([result["status"] for result in r["results"]] == ["error", "error"], f"invalid: {r['results']}")
+
+# A retried push is replayed, not applied twice
+change = [{"kind": "set", "op": "create", "date": "2025-06-04", "exercise": "row", "reps": 8, "weight": 60}]
+responses = [push(change, key="sync-1") for _ in range(3)]
+check(len({r.content for r in responses}) == 1, "retried push: responses differ")
+check(list(day_weights("2025-06-04").values()) == [[60]], "retried push: applied twice")
+
+# Ids are never reused: a set added after the newest one was deleted gets a
+# new id, and the delete still reaches clients
+revision = pull()["revision"]
+newest = max(s["id"] for s in pull()["sets"])
+client.delete(f"/sets/{newest}", headers=headers)
+client.post("/add_set/2025-06-04/row", json={"reps": 8, "weight": 65}, headers=headers)
+delta = pull(revision)
+check([s["id"] for s in delta["sets"]] == [newest + 1], f"reused id: {delta['sets']}")
+check(delta["deleted"]["sets"] == [newest], f"reused id: deleted {delta['deleted']}")
+
+# Writes of another user do not show up
+client.post("/auth/register", json={"username": "other", "password": "secret"})
+other = client.post("/auth/login", json={"username": "other", "password": "secret"}).json()["access_token"]
+client.post("/add_exercise/2025-06-01", json={"name": "deadlift"}, headers={"Authorization": f"Bearer {other}"})
+check(not pull(pull()["revision"])["exercises"], "another user's rows were sent")
+
+# Everyone sees the names they typed, not the catalog's or another user's
+other_headers = {"Authorization": f"Bearer {other}"}
+client.post("/add_exercise/2025-06-05", json={"name": "zercher squat"}, headers=headers)
+client.post("/add_exercise/2025-06-05", json={"name": "Zercher Squat"}, headers=other_headers)
+client.post("/add_exercise/2025-06-05", json={"name": "BENCH press"}, headers=other_headers)
+client.post("/add_template", json={"name": "mine", "exercises": ["Zercher Squat", "ohp"]}, headers=other_headers)
+mine = client.get("/workouts/2025-06-05", headers=headers).json()
+theirs = client.get("/workouts/2025-06-05", headers=other_headers).json()
+check([e["name"] for e in mine["exercises"]] == ["zercher squat"], f"display names: {mine}")
+check([e["name"] for e in theirs["exercises"]] == ["Zercher Squat", "BENCH press"], f"display names: {theirs}")
+check(client.get("/templates", headers=other_headers).json()["templates"]["mine"] == ["Zercher Squat", "ohp"],
+      "display names: template")
+check(client.get("/sync", headers=other_headers).json()["exercises"][-1]["name"] == "BENCH press",
+      "display names: sync")
+
+print(f"Checked {checks} conditions, {len(failures)} failure(s)")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,207 @@
+# crud.py
+# Set-based write helpers shared by the endpoints and the importer.
+import json
+from sqlalchemy import bindparam, delete, event, func, insert, update
+from sqlmodel import Session, select
+from database import User, Workout, Exercise, ExerciseStats, TemplateItem, Tombstone
+
+def epley(weight, reps):
+    # Estimated one-rep max
+    if not weight or not reps:
+        return None
+    return weight if reps == 1 else weight * (1 + reps / 30)
+
+def dialect_insert(session: Session):
+    # insert() with on_conflict_do_nothing / on_conflict_do_update for the
+    # session's database
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def revision(session: Session, user_id: int) -> int:
+    # The change-log revision this transaction's changes to the user's rows
+    # are stamped with (see sync.py): the user's counter, incremented once per
+    # transaction. On Postgres the row lock it takes makes the user's writes
+    # commit in revision order, so a client syncing from the last revision it
+    # saw never skips one; take it before locking or changing other rows.
+    # Does not commit.
+    revisions = session.info.setdefault("revisions", {})
+    if user_id not in revisions:
+        revisions[user_id] = session.exec(
+            update(User).where(User.id == user_id).values(revision=User.revision + 1).returning(User.revision)
+        ).scalar_one()
+    return revisions[user_id]
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_revisions(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("revisions", None)
+
+def record_deletes(session: Session, user_id: int, deleted):
+    # Tombstones for deleted rows, deleted being {kind: ids}, so clients that
+    # synced before the delete drop them too. Does not commit.
+    rows = [
+        {"user_id": user_id, "kind": kind, "entity_id": entity_id, "rev": revision(session, user_id)}
+        for kind, ids in deleted.items()
+        for entity_id in ids
+    ]
+    if rows:
+        stmt = dialect_insert(session)(Tombstone)
+        session.exec(stmt.on_conflict_do_update(
+            index_elements=["user_id", "kind", "entity_id"],
+            set_={"rev": stmt.excluded.rev},
+        ), params=rows)
+
+def ensure_exercises(session: Session, user_id: int, keys):
+    # Map every (date, exercise type id) in keys, a {key: name as typed}
+    # mapping, to its Exercise id, creating the missing rows (in the order
+    # given, under that name) with one multi-row INSERT. Rows a concurrent
+    # request created first are skipped and read back. Does not commit.
+    if not keys:
+        return {}
+    dates = {d for d, _ in keys}
+    type_ids = {type_id for _, type_id in keys}
+    exercise_ids = {
+        (d, type_id): exercise_id
+        for exercise_id, d, type_id in session.exec(
+            select(Exercise.id, Exercise.date, Exercise.exercise_type_id).where(
+                Exercise.user_id == user_id,
+                Exercise.date.in_(dates),
+                Exercise.exercise_type_id.in_(type_ids)
+            )
+        ).all()
+        if (d, type_id) in keys
+    }
+    missing = [key for key in keys if key not in exercise_ids]
+    if missing:
+        created = session.exec(
+            dialect_insert(session)(Exercise)
+            .on_conflict_do_nothing(index_elements=["user_id", "date", "exercise_type_id"])
+            .returning(Exercise.id, Exercise.date, Exercise.exercise_type_id),
+            params=[
+                {"user_id": user_id, "date": d, "exercise_type_id": type_id, "name": keys[d, type_id],
+                 "rev": revision(session, user_id)}
+                for d, type_id in missing
+            ],
+        ).all()
+        exercise_ids.update({(d, type_id): exercise_id for exercise_id, d, type_id in created})
+        if len(created) < len(missing):
+            exercise_ids.update(ensure_exercises(
+                session, user_id, {key: keys[key] for key in missing if key not in exercise_ids}
+            ))
+    return exercise_ids
+
+def lock_exercises(session: Session, exercise_ids):
+    # Postgres: row locks on the exercises, in id order, so concurrent writers
+    # of an exercise take turns and each reads the sets the other committed.
+    # NO KEY UPDATE does not wait on the KEY SHARE locks that inserting sets
+    # (foreign keys) takes. SQLite already runs one writer at a time.
+    if exercise_ids and session.get_bind().dialect.name == "postgresql":
+        session.exec(
+            select(Exercise.id).where(Exercise.id.in_(sorted(set(exercise_ids))))
+            .order_by(Exercise.id).with_for_update(key_share=True)
+        )
+
+def insert_sets(session: Session, user_id: int, exercise_ids, sets):
+    # sets: iterable of (date, exercise type id, reps, weight); one
+    # executemany INSERT. Each set is appended to its exercise: the INSERT
+    # computes the ordinal itself (MAX + 1 on the (exercise_id, ordinal)
+    # index), so a concurrent writer cannot take the same one. Does not commit.
+    sets = list(sets)
+    rev = revision(session, user_id) if sets else None
+    rows = [
+        {
+            "user_id": user_id,
+            "exercise_id": exercise_ids[(d, type_id)],
+            "of_exercise": exercise_ids[(d, type_id)],
+            "date": d,
+            "exercise_type_id": type_id,
+            "reps": reps,
+            "weight": weight,
+            "rev": rev,
+        }
+        for d, type_id, reps, weight in sets
+    ]
+    if rows:
+        lock_exercises(session, {row["exercise_id"] for row in rows})
+        next_ordinal = (
+            select(func.coalesce(func.max(Workout.ordinal), 0) + 1)
+            .where(Workout.exercise_id == bindparam("of_exercise"))
+            .scalar_subquery()
+        )
+        session.exec(insert(Workout).values(ordinal=next_ordinal), params=rows)
+    return len(rows)
+
+def save_template_items(session: Session, template_id: int, exercise_names):
+    # Replace a template's items; an exercise listed twice (in any spelling)
+    # keeps its first position and spelling. Does not commit.
+    import catalog  # catalog imports crud
+    session.exec(delete(TemplateItem).where(TemplateItem.template_id == template_id))
+    type_ids = catalog.resolve(session, exercise_names)
+    items = {}  # type id -> name as typed
+    for name in exercise_names:
+        items.setdefault(type_ids[name], name)
+    if items:
+        session.exec(insert(TemplateItem), params=[
+            {"template_id": template_id, "position": position, "exercise_type_id": type_id, "name": name}
+            for position, (type_id, name) in enumerate(items.items())
+        ])
+
+def refresh_stats(session: Session, exercise_ids):
+    # Recompute the ExerciseStats rows of the given exercises from their sets
+    # (O(sets in those days)). Exercises left without sets lose their row.
+    # Does not commit.
+    exercise_ids = sorted(set(exercise_ids))
+    if not exercise_ids:
+        return
+    lock_exercises(session, exercise_ids)
+    session.exec(delete(ExerciseStats).where(ExerciseStats.exercise_id.in_(exercise_ids)))
+
+    sets_by_exercise = {}
+    for exercise_id, reps, weight in session.exec(
+        select(Workout.exercise_id, Workout.reps, Workout.weight)
+        .where(Workout.exercise_id.in_(exercise_ids))
+        .order_by(Workout.exercise_id, Workout.ordinal)
+    ).all():
+        sets_by_exercise.setdefault(exercise_id, []).append((reps, weight))
+    if not sets_by_exercise:
+        return
+
+    rows = []
+    for exercise_id, user_id, d, type_id in session.exec(
+        select(Exercise.id, Exercise.user_id, Exercise.date, Exercise.exercise_type_id)
+        .where(Exercise.id.in_(list(sets_by_exercise)))
+    ).all():
+        sets = sets_by_exercise[exercise_id]
+        weights = [w for _, w in sets if w is not None]
+        e1rms = [e for e in (epley(w, r) for r, w in sets) if e is not None]
+        rows.append({
+            "exercise_id": exercise_id,
+            "user_id": user_id,
+            "date": d,
+            "exercise_type_id": type_id,
+            "set_count": len(sets),
+            "top_weight": max(weights) if weights else None,
+            "total_volume": sum((r or 0) * (w or 0) for r, w in sets),
+            "best_e1rm": max(e1rms) if e1rms else None,
+            "sets": json.dumps([[r, w] for r, w in sets]),
+        })
+    session.exec(insert(ExerciseStats), params=rows)
+
+def rebuild_stats(session: Session, batch_size: int = 2000, progress=None):
+    # Recompute every ExerciseStats row, batch by batch of exercise ids
+    last_id, done = 0, 0
+    while True:
+        exercise_ids = session.exec(
+            select(Exercise.id).where(Exercise.id > last_id).order_by(Exercise.id).limit(batch_size)
+        ).all()
+        if not exercise_ids:
+            return done
+        refresh_stats(session, exercise_ids)
+        session.commit()
+        last_id = exercise_ids[-1]
+        done += len(exercise_ids)
+        if progress:
+            progress(done)
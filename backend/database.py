@@ -1,40 +1,298 @@
-from sqlmodel import SQLModel, Field, Relationship, create_engine
+from sqlmodel import SQLModel, Field, Relationship, Session, create_engine
+from sqlalchemy import Index, event
+import os
+from datetime import date as Date, datetime
 from typing import Optional, List
 
-DATABASE_URL = "sqlite:///./gymtracker.db"
-engine = create_engine(DATABASE_URL, echo=True)
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./gymtracker.db")
+# Optional read replica (e.g. a Postgres streaming replica of DATABASE_URL)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or None
+DEBUG = env_flag("DEBUG")
+SQL_ECHO = env_flag("SQL_ECHO") or DEBUG
+# DB_ASYNC serves the read endpoints from an async engine (aiosqlite/psycopg)
+# instead of the threadpool
+DB_ASYNC = env_flag("DB_ASYNC")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# SQLite production profile (SQLITE_PROFILE=default turns it off): WAL lets
+# readers run alongside the single writer, synchronous=NORMAL only fsyncs at
+# checkpoints, and busy_timeout makes writers wait for the lock instead of
+# failing straight away with "database is locked"
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production").strip().lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB
+    "temp_store": "MEMORY",
+}
+# DB_WRITE_QUEUE routes add_set through the single writer in writer.py, which
+# commits many small inserts in one transaction
+DB_WRITE_QUEUE = env_flag("DB_WRITE_QUEUE")
+
+def pool_options(url: str):
+    # In-memory SQLite uses a single-connection pool without sizing options
+    if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+        return {}
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def normalize_url(url: str) -> str:
+    # postgres:// and plain postgresql:// URLs use psycopg (v3), which serves
+    # both the sync and the async engine
+    scheme, rest = url.split(":", 1)
+    if scheme in ("postgres", "postgresql"):
+        return "postgresql+psycopg:" + rest
+    return url
+
+def async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return url
+
+def configure_sqlite(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys when asked to, per connection; the
+    # profile pragmas are per connection too (journal_mode sticks to the file)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    if SQLITE_PROFILE == "production":
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+pool_checkouts = {}
+
+def instrument(sync_engine, name: str):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", configure_sqlite)
+    pool_checkouts[name] = 0
+
+    @event.listens_for(sync_engine, "checkout")
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts[name] += 1
+
+def make_engines(url: str, name: str, async_name: str):
+    # (sync engine, async engine or None) for one database
+    url = normalize_url(url)
+    sync_engine = create_engine(url, echo=SQL_ECHO, **pool_options(url))
+    instrument(sync_engine, name)
+    async_engine = None
+    if DB_ASYNC:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        async_engine = create_async_engine(async_url(url), echo=SQL_ECHO, **pool_options(url))
+        instrument(async_engine.sync_engine, async_name)
+    return sync_engine, async_engine
+
+# Writes always go to the primary. Read-only endpoints use the replica when
+# DATABASE_REPLICA_URL is set, and the primary otherwise.
+engine, async_engine = make_engines(DATABASE_URL, "sync", "async")
+if DATABASE_REPLICA_URL:
+    read_engine, async_read_engine = make_engines(DATABASE_REPLICA_URL, "replica", "replica_async")
+else:
+    read_engine, async_read_engine = engine, async_engine
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
     hashed_password: str
+    revision: int = 0  # last change-log revision handed out (crud.revision)
 
     workouts: List["Workout"] = Relationship(back_populates="user")
     templates: List["Template"] = Relationship(back_populates="user")
 
+class ExerciseType(SQLModel, table=True):
+    # Exercise catalog. Day entries, sets and templates refer to exercises by
+    # id; key is the normalised name (catalog.normalize) that names match on.
+    # name is only the catalog's own label: users see the name they typed,
+    # kept on their exercise and template item rows.
+    __table_args__ = (
+        Index("ix_exercisetype_key", "key", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    key: str
+
+class ExerciseAlias(SQLModel, table=True):
+    # Extra normalised names for a catalog exercise ("bench" -> bench press)
+    key: str = Field(primary_key=True)
+    exercise_type_id: int = Field(foreign_key="exercisetype.id")
+
 class Workout(SQLModel, table=True):
+    __table_args__ = (
+        # Day view / set lookups go through the owning exercise row, in set
+        # order; also hands out the next ordinal (MAX + 1)
+        Index("ix_workout_exercise_ordinal", "exercise_id", "ordinal", unique=True),
+        # Per-exercise lookups: WHERE user_id AND exercise_type_id ORDER BY date
+        Index("ix_workout_user_type_date", "user_id", "exercise_type_id", "date"),
+        # GET /sync: sets changed after a revision
+        Index("ix_workout_user_rev", "user_id", "rev"),
+        # Ids are never handed out twice (SQLite reuses the highest one once
+        # deleted otherwise), so a stale id cannot name a newer set
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
-    date: str
-    exercise_name: str
+    exercise_id: Optional[int] = Field(default=None, foreign_key="exercise.id")
+    date: Date
+    exercise_type_id: int = Field(foreign_key="exercisetype.id")
+    ordinal: int  # position within the exercise, from 1; may have gaps
     reps: Optional[int]
     weight: Optional[float]
+    rev: int = 0  # revision of the last change (see sync.py)
 
     user: Optional[User] = Relationship(back_populates="workouts")
 
 class Template(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_template_user_name", "user_id", "name"),
+        Index("ix_template_user_rev", "user_id", "rev"),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     name: str
-    exercises: str  
+    rev: int = 0  # revision of the last change, items included
 
     user: Optional[User] = Relationship(back_populates="templates")
-    
+
+class TemplateItem(SQLModel, table=True):
+    # The exercises of a template, in order
+    template_id: int = Field(foreign_key="template.id", primary_key=True)
+    position: int = Field(primary_key=True)
+    exercise_type_id: int = Field(foreign_key="exercisetype.id")
+    name: str  # as the user typed it
+
 class Exercise(SQLModel, table=True):
+    __table_args__ = (
+        # One row per exercise per day; also serves the day view and calendar
+        Index("ix_exercise_user_date_type", "user_id", "date", "exercise_type_id", unique=True),
+        # Keyset pages of GET /workouts, ordered by (date, id), with and
+        # without an exercise filter
+        Index("ix_exercise_user_date_id", "user_id", "date", "id"),
+        Index("ix_exercise_user_type_date_id", "user_id", "exercise_type_id", "date", "id"),
+        Index("ix_exercise_user_rev", "user_id", "rev"),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
-    date: str
-    name: str
+    date: Date
+    exercise_type_id: int = Field(foreign_key="exercisetype.id")
+    name: str  # as the user typed it; exercise_type_id is what matches
+    rev: int = 0  # revision it was created at (see sync.py)
+
+class ExerciseStats(SQLModel, table=True):
+    # Per (user, exercise, day) summary kept in step with the sets by
+    # crud.refresh_stats; progression charts read only from here
+    __table_args__ = (
+        Index("ix_exercisestats_user_type_date", "user_id", "exercise_type_id", "date"),
+    )
+
+    exercise_id: int = Field(foreign_key="exercise.id", primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    date: Date
+    exercise_type_id: int = Field(foreign_key="exercisetype.id")
+    set_count: int
+    top_weight: Optional[float]
+    total_volume: float
+    best_e1rm: Optional[float]
+    sets: str  # JSON [[reps, weight], ...] in set order
+
+class ResourceVersion(SQLModel, table=True):
+    # Per-user version stamp of a cached view ("day:2025-03-03",
+    # "month:2025-03", "templates", "sets"); bumped by versions.bump in the
+    # same transaction as the change
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    resource: str = Field(primary_key=True)
+    version: int = 0
+    updated_at: datetime
+
+class Tombstone(SQLModel, table=True):
+    # A deleted exercise, set or template, kept so GET /sync can tell clients
+    # that synced before the delete; rev is the revision it was deleted at
+    __table_args__ = (
+        Index("ix_tombstone_user_rev", "user_id", "rev"),
+    )
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    kind: str = Field(primary_key=True)  # "exercise", "set" or "template"
+    entity_id: int = Field(primary_key=True)
+    rev: int
+
+class IdempotencyKey(SQLModel, table=True):
+    # Response of a write made with an Idempotency-Key header, stored in the
+    # same transaction as the write so a retry replays it (see idempotency.py)
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    key: str = Field(primary_key=True)
+    fingerprint: str  # hash of method, path and body
+    response: str  # JSON body
+    created_at: datetime
+
+def get_session():
+    # Shared by the routes and auth.get_current_user; FastAPI resolves it once
+    # per request, so both see the same session
+    with Session(engine) as session:
+        yield session
+
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def get_async_read_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    async with AsyncSession(async_read_engine, expire_on_commit=False) as session:
+        yield session
+
+# Session dependencies for the endpoints that can run on either engine
+get_db = get_async_session if DB_ASYNC else get_session
+get_read_db = get_async_read_session if DB_ASYNC else get_read_session
+
+async def run_db(session, func, *args):
+    # Run func(sync_session, *args): on the event loop through the async
+    # engine, or on the threadpool with a regular Session
+    if DB_ASYNC:
+        return await session.run_sync(func, *args)
+    from fastapi.concurrency import run_in_threadpool
+    return await run_in_threadpool(func, session, *args)
+
+def pool_stats():
+    stats = {}
+    engines = [("sync", engine), ("async", async_engine)]
+    if DATABASE_REPLICA_URL:
+        engines += [("replica", read_engine), ("replica_async", async_read_engine)]
+    for name, e in engines:
+        if e is None:
+            continue
+        pool = e.pool
+        stats[name] = {
+            "class": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checkouts": pool_checkouts[name],
+        }
+    return stats
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    from migrations import run_migrations
+    run_migrations(engine)
@@ -0,0 +1,107 @@
+# exporter.py
+# Streams a user's full history as CSV, JSONL or Parquet straight off a
+# server-side cursor, one batch at a time.
+import csv
+import io
+import json
+from typing import Optional
+from datetime import date as Date
+from sqlmodel import Session, select
+from database import read_engine, Exercise, Workout
+
+BATCH_SIZE = 2000
+COLUMNS = ["date", "exercise", "set", "reps", "weight"]
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def history_batches(user_id: int, date_from: Optional[Date] = None, date_to: Optional[Date] = None):
+    # Plain column tuples (no ORM objects), walked in (date, exercise, set)
+    # order through the exercise index. Opens its own session (on the read
+    # replica, if any) because the body is produced after the route returns.
+    query = (
+        select(Exercise.date, Exercise.name, Workout.reps, Workout.weight)
+        .join(Workout, Workout.exercise_id == Exercise.id)
+        .where(Exercise.user_id == user_id)
+    )
+    if date_from:
+        query = query.where(Exercise.date >= date_from)
+    if date_to:
+        query = query.where(Exercise.date <= date_to)
+    query = query.order_by(Exercise.date, Exercise.id, Workout.ordinal).execution_options(yield_per=BATCH_SIZE)
+
+    with Session(read_engine) as session:
+        result = session.exec(query)
+        last_key, set_number = None, 0
+        for partition in result.partitions():
+            batch = []
+            for d, name, reps, weight in partition:
+                set_number = set_number + 1 if (d, name) == last_key else 1
+                last_key = (d, name)
+                batch.append((d.isoformat(), name, set_number, reps, weight))
+            yield batch
+
+def csv_stream(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def jsonl_stream(batches):
+    for batch in batches:
+        yield "".join(json.dumps(dict(zip(COLUMNS, row))) + "\n" for row in batch)
+
+class _Sink(io.RawIOBase):
+    # Write-only file that hands back whatever was written since the last drain
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_stream(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("date", pa.string()), ("exercise", pa.string()), ("set", pa.int32()),
+        ("reps", pa.int32()), ("weight", pa.float64()),
+    ])
+    sink = _Sink()
+    # One row group per batch keeps the writer's buffer bounded
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [[] for _ in COLUMNS]
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def export_stream(user_id: int, fmt: str, date_from: Optional[Date] = None, date_to: Optional[Date] = None):
+    batches = history_batches(user_id, date_from, date_to)
+    if fmt == "csv":
+        return csv_stream(batches)
+    if fmt == "jsonl":
+        return jsonl_stream(batches)
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow installed")
+        return parquet_stream(batches)
+    raise ValueError(f"Unsupported format '{fmt}', expected csv, jsonl or parquet")
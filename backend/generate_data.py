@@ -0,0 +1,196 @@
+# generate_data.py
+# Synthetic training histories for benchmarks and local development: N users,
+# each on a split (push/pull/legs, upper/lower or full body) saved as
+# templates, training 3-5 days a week for several years with missed sessions,
+# breaks, exercise swaps, progressive overload and deloads. Everything comes
+# from a seeded RNG, one stream per user, so the same arguments always give
+# the same data. Rows go in with multi-row INSERTs, one user per transaction.
+#   python generate_data.py --users 20 --years 5 --seed 42
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from database import init_db, engine, User, Exercise, Workout, Template, TemplateItem
+from crud import refresh_stats
+import catalog
+
+END_DATE = date(2025, 6, 30)
+PASSWORD = "password123"
+
+PROGRAMS = {
+    "push pull legs": {
+        "push": ["bench press", "overhead press", "incline bench press", "lateral raise", "tricep pushdown"],
+        "pull": ["deadlift", "pull ups", "barbell row", "face pull", "bicep curl"],
+        "legs": ["squat", "romanian deadlift", "leg press", "leg curl", "calf raise"],
+    },
+    "upper lower": {
+        "upper": ["bench press", "barbell row", "overhead press", "lat pulldown", "bicep curl", "tricep pushdown"],
+        "lower": ["squat", "romanian deadlift", "leg press", "leg curl", "calf raise"],
+    },
+    "full body": {
+        "full body a": ["squat", "bench press", "barbell row", "lateral raise"],
+        "full body b": ["deadlift", "overhead press", "pull ups", "dips"],
+    },
+}
+# Occasional swaps for a session (equipment taken, variety)
+SWAPS = {
+    "bench press": ["dumbbell press", "incline bench press"],
+    "squat": ["front squat", "leg press"],
+    "barbell row": ["dumbbell row", "seated row"],
+    "overhead press": ["shoulder press"],
+    "pull ups": ["chin ups", "lat pulldown"],
+    "tricep pushdown": ["skull crushers", "overhead tricep extension"],
+    "bicep curl": ["hammer curl"],
+    "leg curl": ["leg extension"],
+}
+# Typical working weight (kg) of an intermediate lifter; pull ups and dips
+# are added weight
+START_WEIGHT = {
+    "squat": 100, "front squat": 80, "deadlift": 120, "romanian deadlift": 90, "leg press": 160,
+    "bench press": 80, "incline bench press": 65, "dumbbell press": 30, "overhead press": 50,
+    "shoulder press": 25, "barbell row": 70, "dumbbell row": 30, "seated row": 60, "lat pulldown": 60,
+    "pull ups": 5, "chin ups": 5, "dips": 10, "lateral raise": 10, "face pull": 25, "bicep curl": 15,
+    "hammer curl": 15, "tricep pushdown": 30, "skull crushers": 30, "overhead tricep extension": 25,
+    "leg curl": 45, "leg extension": 50, "calf raise": 80,
+}
+COMPOUND = {"squat", "front squat", "deadlift", "romanian deadlift", "bench press", "incline bench press",
+            "overhead press", "barbell row"}
+
+def working_weight(name: str, strength: float, weeks: float, deload: bool) -> float:
+    # Fast early gains that level off, rounded to the nearest plate step
+    weight = START_WEIGHT[name] * strength * (1 + 0.25 * math.log1p(weeks / 8))
+    if deload:
+        weight *= 0.9
+    step = 2.5 if weight >= 20 else 1.0
+    return round(weight / step) * step
+
+def sessions(rng: random.Random, start: date, end: date, days_per_week: int):
+    # Training days: a fixed weekly pattern with ~8% missed sessions and a
+    # one to three week break about twice a year
+    weekdays = sorted(rng.sample(range(7), days_per_week))
+    d = start
+    while d <= end:
+        if rng.random() < 0.005:
+            d += timedelta(weeks=rng.randint(1, 3))
+            continue
+        if d.weekday() in weekdays and rng.random() >= 0.08:
+            yield d
+        d += timedelta(days=1)
+
+def user_history(rng: random.Random, start: date, end: date):
+    # (templates {name: exercises}, [(date, exercise name, [(reps, weight), ...]), ...])
+    templates = PROGRAMS[rng.choice(list(PROGRAMS))]
+    strength = rng.lognormvariate(0, 0.25)
+    days_per_week = rng.choice([3, 3, 4, 4, 4, 5])
+    deload_every = rng.randint(6, 9)
+    rotation = list(templates)
+    entries = []
+    for n, d in enumerate(sessions(rng, start, end, days_per_week)):
+        weeks = (d - start).days / 7
+        deload = int(weeks) % deload_every == deload_every - 1
+        day = templates[rotation[n % len(rotation)]]
+        done = set()
+        for name in day:
+            if name in SWAPS and rng.random() < 0.05:
+                swap = rng.choice(SWAPS[name])
+                if swap not in day and swap not in done:
+                    name = swap
+            done.add(name)
+            weight = working_weight(name, strength, weeks, deload)
+            low, high = (3, 8) if name in COMPOUND else (8, 15)
+            reps = rng.randint(low, high)
+            sets = []
+            for _ in range(rng.randint(3, 5)):
+                sets.append((reps, weight))
+                # Fatigue: later sets lose a rep now and then
+                reps = max(1, reps - (rng.random() < 0.3))
+            entries.append((d, name, sets))
+    return templates, entries
+
+def generate(session: Session, usernames, years: float = 3, seed: int = 42, end: date = END_DATE,
+             hashed_password: str = None, progress=None):
+    # Creates the users with their templates, history and ExerciseStats;
+    # returns {username: user id}. Commits once per user.
+    if hashed_password is None:
+        from auth import hash_password
+        hashed_password = hash_password(PASSWORD)
+    names = sorted(set(START_WEIGHT))
+    type_ids = catalog.resolve(session, names)
+    session.commit()
+
+    created = {}
+    for username in usernames:
+        rng = random.Random(f"{seed}:{username}")
+        start = end - timedelta(days=round(365 * years))
+        templates, entries = user_history(rng, start, end)
+
+        user = User(username=username, hashed_password=hashed_password, revision=1)
+        session.add(user)
+        session.flush()
+        template_ids = session.exec(
+            insert(Template).returning(Template.id, sort_by_parameter_order=True),
+            params=[{"user_id": user.id, "name": name, "rev": 1} for name in templates],
+        ).scalars().all()
+        session.exec(insert(TemplateItem), params=[
+            {"template_id": template_id, "position": position, "exercise_type_id": type_ids[name], "name": name}
+            for template_id, exercises in zip(template_ids, templates.values())
+            for position, name in enumerate(exercises)
+        ])
+
+        exercise_ids = session.exec(
+            insert(Exercise).returning(Exercise.id, sort_by_parameter_order=True),
+            params=[
+                {"user_id": user.id, "date": d, "exercise_type_id": type_ids[name], "name": name, "rev": 1}
+                for d, name, _ in entries
+            ],
+        ).scalars().all()
+        session.exec(insert(Workout), params=[
+            {
+                "user_id": user.id, "exercise_id": exercise_id, "date": d, "exercise_type_id": type_ids[name],
+                "ordinal": ordinal, "reps": reps, "weight": weight, "rev": 1,
+            }
+            for exercise_id, (d, name, sets) in zip(exercise_ids, entries)
+            for ordinal, (reps, weight) in enumerate(sets, start=1)
+        ])
+        for i in range(0, len(exercise_ids), 2000):
+            refresh_stats(session, exercise_ids[i:i + 2000])
+        session.commit()
+        created[username] = user.id
+        if progress:
+            progress(username, len(entries), sum(len(sets) for _, _, sets in entries))
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate users with multi-year training histories")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", type=date.fromisoformat, default=END_DATE, help="last day of history")
+    parser.add_argument("--prefix", default="user", help="usernames are <prefix>1, <prefix>2, ...")
+    args = parser.parse_args()
+
+    engine.echo = False
+    init_db()
+    usernames = [f"{args.prefix}{n}" for n in range(1, args.users + 1)]
+    with Session(engine) as session:
+        taken = session.exec(select(User.username).where(User.username.in_(usernames))).all()
+        if taken:
+            sys.exit(f"Users already exist: {', '.join(sorted(taken))}")
+        totals = [0, 0]
+
+        def report(username, exercises, sets):
+            totals[0] += exercises
+            totals[1] += sets
+            print(f"\r{username}: {exercises} exercises, {sets} sets", end="", flush=True)
+
+        t0 = time.perf_counter()
+        generate(session, usernames, args.years, args.seed, args.end, progress=report)
+    print(f"\nGenerated {args.users} users, {totals[0]} exercises, {totals[1]} sets "
+          f"in {time.perf_counter() - t0:.1f}s (password: {PASSWORD})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# idempotency.py
+# Idempotency-Key support for the write endpoints. A client that retries a
+# write (e.g. the response was lost on a flaky connection) sends the same
+# key again and gets the stored response back instead of a second write.
+# The key is claimed at the start of the write's transaction and its
+# response filled in before the commit, so the write and the key commit
+# together: a concurrent retry with the same key waits on the claim and
+# then replays. Reusing a key for a different request is a 422. Keys
+# expire after IDEMPOTENCY_TTL_HOURS.
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Optional
+from fastapi import Depends, Header, HTTPException, Request, Response
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from auth import get_current_user
+from database import IdempotencyKey, User
+from serialization import dumps
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+class Idempotency:
+    def __init__(self, user_id: int, key: Optional[str], fingerprint: Optional[str]):
+        self.user_id = user_id
+        self.key = key
+        self.fingerprint = fingerprint
+
+    def cutoff(self):
+        return datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+    def replay(self, session: Session):
+        # The stored response for this key, or None when it has not been used
+        if self.key is None:
+            return None
+        row = session.exec(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.response).where(
+                IdempotencyKey.user_id == self.user_id,
+                IdempotencyKey.key == self.key,
+                IdempotencyKey.created_at >= self.cutoff()
+            )
+        ).first()
+        if row is None:
+            return None
+        if row[0] != self.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return Response(content=row[1], media_type="application/json", headers={"Idempotency-Replayed": "true"})
+
+    def begin(self, session: Session):
+        # Replay a used key, or claim it in the current transaction (None).
+        # A concurrent request holding the same key makes the claim wait
+        # until it commits, and its response is replayed.
+        for _ in range(2):
+            replayed = self.replay(session)
+            if replayed is not None or self.key is None:
+                return replayed
+            session.exec(delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == self.user_id,
+                IdempotencyKey.created_at < self.cutoff()
+            ))
+            try:
+                self.record(session, None)
+                return None
+            except IntegrityError:
+                session.rollback()
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+
+    def record(self, session: Session, content):
+        # Insert the key with its response. Does not commit.
+        session.exec(insert(IdempotencyKey).values(
+            user_id=self.user_id,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            response=dump(content),
+            created_at=datetime.now(timezone.utc),
+        ))
+
+    def commit(self, session: Session, content):
+        # Store the response of a claimed key and commit the write with it
+        if self.key is not None:
+            session.exec(update(IdempotencyKey).where(
+                IdempotencyKey.user_id == self.user_id,
+                IdempotencyKey.key == self.key
+            ).values(response=dump(content)))
+        session.commit()
+        return content
+
+def dump(content) -> str:
+    # Rendered like the original response, so a replay is byte-identical
+    return dumps(content).decode()
+
+async def idempotency_key(
+    request: Request,
+    key: Annotated[Optional[str], Header(alias="Idempotency-Key", min_length=1, max_length=255)] = None,
+    current_user: User = Depends(get_current_user),
+) -> Idempotency:
+    if key is None:
+        return Idempotency(current_user.id, None, None)
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.url.path.encode(), request.url.query.encode(), await request.body()):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return Idempotency(current_user.id, key, digest.hexdigest())
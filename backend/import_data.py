@@ -0,0 +1,45 @@
+# import_data.py
+# Imports a CSV or JSONL training log for an existing user.
+#   python import_data.py testuser history.csv
+#   python import_data.py testuser history.jsonl --column exercise=Lift --chunk-size 10000
+import argparse
+import sys
+from sqlmodel import Session, select
+from database import init_db, engine, User
+from importer import import_file, CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Import historical training logs")
+    parser.add_argument("username")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--date-format", default="ISO8601", help="strftime format of the date column")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=COLUMN",
+                        help="map a field (date, exercise, reps, weight) to a column name")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    mapping = dict(item.split("=", 1) for item in args.column)
+
+    engine.echo = False
+    init_db()
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.username == args.username)).first()
+        if not user:
+            sys.exit(f"User '{args.username}' not found")
+
+        def progress(report):
+            print(f"\r{report.rows} rows read, {report.imported} imported, "
+                  f"{report.duplicates} duplicates, {report.error_count} errors", end="", flush=True)
+
+        report = import_file(session, user.id, args.path, fmt, args.chunk_size, mapping,
+                             args.date_format, progress)
+        print()
+        for error in report.errors:
+            print(f"row {error['row']}: {error['error']}")
+        if report.error_count > len(report.errors):
+            print(f"... and {report.error_count - len(report.errors)} more errors")
+
+if __name__ == "__main__":
+    main()
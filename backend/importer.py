@@ -0,0 +1,168 @@
+# importer.py
+# Streams CSV / JSONL training logs into Exercise/Workout rows in bounded
+# chunks, so memory stays flat however long the file is.
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from database import Workout
+from crud import ensure_exercises, insert_sets, refresh_stats
+import versions
+import catalog
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+# Accepted header names (case-insensitive) for each field
+COLUMN_ALIASES = {
+    "date": ["date", "day", "workout_date"],
+    "exercise": ["exercise", "exercise_name", "name", "lift"],
+    "reps": ["reps", "rep", "repetitions"],
+    "weight": ["weight", "kg", "load", "weight_kg"],
+}
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+def read_chunks(source, fmt: str, chunk_size: int = CHUNK_SIZE):
+    if fmt == "csv":
+        return pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    if fmt == "jsonl":
+        return pd.read_json(source, lines=True, chunksize=chunk_size, dtype=False)
+    raise ValueError(f"Unsupported format '{fmt}', expected csv or jsonl")
+
+def resolve_columns(columns, mapping=None):
+    # Returns {field: source column}; mapping overrides the aliases
+    lookup = {str(c).strip().lower(): c for c in columns}
+    resolved = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        if mapping and field in mapping:
+            if mapping[field] not in columns:
+                raise ValueError(f"Column '{mapping[field]}' not found in file")
+            resolved[field] = mapping[field]
+            continue
+        for alias in aliases:
+            if alias in lookup:
+                resolved[field] = lookup[alias]
+                break
+    missing = [f for f in ("date", "exercise", "reps") if f not in resolved]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return resolved
+
+def parse_chunk(chunk, columns, first_row: int, date_format: str, report: ImportReport):
+    # Vectorised parsing of one chunk; bad rows are reported and dropped
+    def blank(values):
+        return values.isna() | (values.astype("string").str.strip() == "")
+
+    raw_date = chunk[columns["date"]]
+    raw_reps = chunk[columns["reps"]]
+    raw_weight = chunk[columns["weight"]] if "weight" in columns else pd.Series(pd.NA, index=chunk.index)
+
+    parsed = pd.DataFrame({
+        "row": range(first_row, first_row + len(chunk)),
+        "date": pd.to_datetime(raw_date, format=date_format, errors="coerce").dt.date,
+        "exercise": chunk[columns["exercise"]].astype("string").str.strip(),
+        "reps": pd.to_numeric(raw_reps, errors="coerce"),
+        "weight": pd.to_numeric(raw_weight, errors="coerce"),
+    }, index=chunk.index)
+
+    checks = [
+        (parsed["date"].isna(), "invalid date"),
+        (parsed["exercise"].isna() | (parsed["exercise"] == ""), "missing exercise"),
+        (parsed["reps"].isna() | (parsed["reps"] < 0) | (parsed["reps"] % 1 != 0), "invalid reps"),
+        (parsed["weight"].isna() & ~blank(raw_weight), "invalid weight"),
+    ]
+    reasons = pd.Series(None, index=chunk.index, dtype=object)
+    for mask, message in checks:
+        reasons[mask & reasons.isna()] = message
+    bad = reasons.notna()
+    for row, message in zip(parsed.loc[bad, "row"], reasons[bad]):
+        report.add_error(int(row), message)
+    return parsed[~bad]
+
+def existing_sets(session: Session, user_id: int, parsed, watermark: int):
+    # Sets that were already stored before this import started
+    rows = session.exec(
+        select(Workout.date, Workout.exercise_type_id, Workout.reps, Workout.weight).distinct().where(
+            Workout.user_id == user_id,
+            Workout.exercise_type_id.in_(set(parsed["type_id"])),
+            Workout.date.in_(set(parsed["date"])),
+            Workout.id <= watermark
+        )
+    ).all()
+    return set(rows)
+
+def import_file(session: Session, user_id: int, source, fmt: str, chunk_size: int = CHUNK_SIZE,
+                mapping=None, date_format: str = "ISO8601", progress=None):
+    # A row counts as a duplicate when an identical set (date, exercise, reps,
+    # weight) existed before the import began, so re-importing a file is a
+    # no-op while repeated identical sets inside the file are all kept.
+    report = ImportReport()
+    watermark = session.exec(select(func.max(Workout.id)).where(Workout.user_id == user_id)).one() or 0
+    columns = None
+
+    for chunk in read_chunks(source, fmt, chunk_size):
+        if columns is None:
+            columns = resolve_columns(list(chunk.columns), mapping)
+        first_row = report.rows + 1
+        report.rows += len(chunk)
+
+        parsed = parse_chunk(chunk, columns, first_row, date_format, report)
+        if len(parsed):
+            # New exercise names are committed to the catalog first, so the
+            # retry below cannot roll them back under the sets
+            type_ids = catalog.resolve(session, (str(name) for name in parsed["exercise"].unique()))
+            session.commit()
+            parsed["type_id"] = parsed["exercise"].astype(str).map(type_ids)
+            known = existing_sets(session, user_id, parsed, watermark)
+            new_sets = []
+            names = {}  # (date, type id) -> first spelling, for new day entries
+            for d, type_id, name, reps, weight in zip(parsed["date"], parsed["type_id"], parsed["exercise"],
+                                                      parsed["reps"], parsed["weight"]):
+                key = (d, int(type_id), int(reps), None if pd.isna(weight) else float(weight))
+                if key in known:
+                    report.duplicates += 1
+                else:
+                    new_sets.append(key)
+                    names.setdefault(key[:2], str(name))
+
+            for attempt in range(2):
+                try:
+                    exercise_ids = ensure_exercises(session, user_id, names)
+                    inserted = insert_sets(session, user_id, exercise_ids, new_sets)
+                    refresh_stats(session, exercise_ids.values())
+                    if new_sets:
+                        versions.bump(session, user_id, versions.days_touched({d for d, _, _, _ in new_sets}) | {versions.SETS})
+                    session.commit()
+                    # Counted once committed: a retried chunk must not count twice
+                    report.imported += inserted
+                    break
+                except IntegrityError:
+                    # Another request created one of the exercises; retry once
+                    session.rollback()
+                    if attempt:
+                        raise
+
+        if progress:
+            progress(report)
+    return report
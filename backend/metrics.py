@@ -0,0 +1,217 @@
+# metrics.py
+# Per-request performance metrics in Prometheus text format (GET /metrics),
+# instead of reading SQL_ECHO output. MetricsMiddleware times every request
+# under its route template and, through SQLAlchemy engine events, counts
+# the SQL statements each request runs and the time they take. Time spent
+# authenticating (token checks and bcrypt) is added by auth.py. A request
+# that runs a query per row (N+1) shows up as a shifted
+# gymtracker_sql_statements_per_request histogram for its route.
+# Statements the DB_WRITE_QUEUE writer thread runs belong to no request and
+# are not counted.
+#   METRICS=on (default) | off
+#   SLOW_REQUEST_MS=500   log requests slower than this with their queries (0: off)
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS = os.getenv("METRICS", "on").strip().lower() in ("1", "true", "yes", "on")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_LOG_MAX_QUERIES = 50
+
+logger = logging.getLogger("gymtracker.slow")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+BCRYPT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}  # label values -> total
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self.lock:
+            for labels, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else format_value(float(bound))
+                    lines.append(f"{self.name}_bucket{format_labels(names, labels + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(float(total))}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+ROUTE = ("method", "route")
+requests_total = Counter("gymtracker_http_requests_total", "Requests served.", ROUTE + ("status",))
+request_duration = Histogram("gymtracker_http_request_duration_seconds", "Request latency.", ROUTE)
+sql_statements = Histogram("gymtracker_sql_statements_per_request", "SQL statements run by one request.",
+                           ROUTE, STATEMENT_BUCKETS)
+sql_duration = Counter("gymtracker_sql_duration_seconds_total", "Time spent in SQL statements.", ROUTE)
+auth_duration = Counter("gymtracker_auth_duration_seconds_total",
+                        "Time spent authenticating (token checks and bcrypt).", ROUTE)
+bcrypt_duration = Histogram("gymtracker_bcrypt_duration_seconds",
+                            "bcrypt hash or verify, including the wait for the hash pool.",
+                            ("operation",), BCRYPT_BUCKETS)
+slow_requests = Counter("gymtracker_slow_requests_total", "Requests slower than SLOW_REQUEST_MS.", ROUTE)
+REGISTRY = [requests_total, request_duration, sql_statements, sql_duration, auth_duration, bcrypt_duration,
+            slow_requests]
+
+class RequestMetrics:
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.queries = []  # (statement, seconds), only kept for the slow log
+
+current = ContextVar("request_metrics", default=None)
+
+def add_auth_time(seconds: float):
+    request = current.get()
+    if request is not None:
+        request.auth_seconds += seconds
+
+def observe_bcrypt(operation: str, seconds: float):
+    bcrypt_duration.observe((operation,), seconds)
+    add_auth_time(seconds)
+
+# Engine class events cover every engine (primary, replica and the sync
+# side of the async engines). The request's RequestMetrics is found through
+# the context, which Starlette copies into threadpool calls.
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    if current.get() is not None:
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    request = current.get()
+    starts = conn.info.get("statement_start")
+    if request is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    request.statements += 1
+    request.sql_seconds += elapsed
+    if SLOW_REQUEST_MS > 0:
+        request.queries.append((statement, elapsed))
+
+@event.listens_for(Engine, "handle_error")
+def failed_statement(exception_context):
+    # A statement that raised never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("statement_start"):
+        connection.info["statement_start"].pop()
+
+def route_label(scope) -> str:
+    # The route template ("/workouts/{date}"), so label values stay bounded
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS:
+            return await self.app(scope, receive, send)
+        request = RequestMetrics()
+        token = current.set(request)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - t0
+            current.reset(token)
+            self.record(scope, status, elapsed, request)
+
+    def record(self, scope, status: int, elapsed: float, request: RequestMetrics):
+        labels = (scope["method"], route_label(scope))
+        requests_total.inc(labels + (str(status),))
+        request_duration.observe(labels, elapsed)
+        sql_statements.observe(labels, request.statements)
+        sql_duration.inc(labels, request.sql_seconds)
+        auth_duration.inc(labels, request.auth_seconds)
+        if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS:
+            slow_requests.inc(labels)
+            queries = "".join(
+                f"\n  {seconds * 1000:8.2f}ms  {' '.join(statement.split())}"
+                for statement, seconds in request.queries[:SLOW_LOG_MAX_QUERIES]
+            )
+            more = len(request.queries) - SLOW_LOG_MAX_QUERIES
+            logger.warning(
+                "Slow request %s %s -> %s in %.1fms: %d SQL statements in %.1fms, auth %.1fms%s%s",
+                scope["method"], scope["path"], status, elapsed * 1000, request.statements,
+                request.sql_seconds * 1000, request.auth_seconds * 1000, queries,
+                f"\n  ... {more} more" if more > 0 else "",
+            )
+
+def snapshot(name: str, help: str, labels, values: dict, kind: str = "gauge"):
+    # Lines of a metric kept elsewhere (pools, caches) and read at scrape
+    # time; values maps label values -> value
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for label_values, value in sorted(values.items()):
+        if value is not None:
+            lines.append(f"{name}{format_labels(labels, label_values)} {format_value(value)}")
+    return lines
+
+def render(extra=()) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for metric_lines in extra:
+        lines += metric_lines
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,295 @@
+# migrations.py
+# Brings existing gymtracker.db files up to the current schema.
+# Each step runs once, in order; the applied version is kept in schema_version.
+import json
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel
+
+def seed_catalog(conn):
+    from sqlmodel import Session
+    import catalog
+    with Session(bind=conn) as session:
+        catalog.seed(session)
+        session.flush()
+
+def create_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def migrate_exercise_keys(conn):
+    # Duplicate exercises could be created by concurrent add_exercise calls;
+    # keep the oldest row so the unique index can be built
+    conn.execute(text("""
+        DELETE FROM exercise WHERE id NOT IN (
+            SELECT MIN(id) FROM exercise GROUP BY user_id, date, name
+        )
+    """))
+    # Sets logged without an exercise row (e.g. by seed_db.py) get one
+    conn.execute(text("""
+        INSERT INTO exercise (user_id, date, name)
+        SELECT DISTINCT w.user_id, w.date, w.exercise_name FROM workout w
+        WHERE NOT EXISTS (
+            SELECT 1 FROM exercise e
+            WHERE e.user_id = w.user_id AND e.date = w.date AND e.name = w.exercise_name
+        )
+    """))
+    columns = [c["name"] for c in inspect(conn).get_columns("workout")]
+    if "exercise_id" not in columns:
+        conn.execute(text("ALTER TABLE workout ADD COLUMN exercise_id INTEGER REFERENCES exercise (id)"))
+    conn.execute(text("""
+        UPDATE workout SET exercise_id = (
+            SELECT e.id FROM exercise e
+            WHERE e.user_id = workout.user_id AND e.date = workout.date AND e.name = workout.exercise_name
+        )
+    """))
+
+def migrate_typed_dates(conn):
+    # Dates are now DATE columns. SQLite keeps them as ISO-8601 text, so rows
+    # only need normalising (e.g. "2025-09-01 18:30" -> "2025-09-01") to compare
+    # and range-scan correctly; anything unparseable has to be fixed by hand.
+    # Other databases store real DATE values already.
+    if conn.dialect.name != "sqlite":
+        return
+    for table in ("exercise", "workout"):
+        bad = conn.execute(text(
+            f"SELECT COUNT(*) FROM {table} WHERE date(date) IS NULL"
+        )).scalar()
+        if bad:
+            raise RuntimeError(f"{bad} row(s) in '{table}' have a date that is not YYYY-MM-DD")
+        conn.execute(text(f"UPDATE {table} SET date = date(date) WHERE date != date(date)"))
+
+def migrate_exercise_stats(conn):
+    # The exercisestats table is created by create_all; it is rebuilt from
+    # history by migrate_set_ordinals, which always runs after this step
+    pass
+
+def template_names(raw: str):
+    # Template.exercises held a JSON list (seed_db.py wrote a comma list)
+    try:
+        names = json.loads(raw)
+    except (TypeError, ValueError):
+        names = raw.split(",") if raw else []
+    return [str(name).strip() for name in names if str(name).strip()]
+
+def migrate_exercise_catalog(conn):
+    # Exercise names become ids into the exercisetype catalog: day entries
+    # and sets get exercise_type_id, templates get templateitem rows, and the
+    # old name columns are dropped, except the day entries' own, which is
+    # the name they are shown under. Rows whose names only differed in case
+    # or spacing (or were aliases) are merged onto the oldest day entry.
+    from sqlmodel import Session
+    import catalog
+    from database import ExerciseStats
+
+    # Summaries are rebuilt by migrate_set_ordinals, against the new columns
+    ExerciseStats.__table__.drop(conn, checkfirst=True)
+
+    session = Session(bind=conn)
+    catalog.seed(session)
+    names = set(conn.execute(text("SELECT DISTINCT name FROM exercise")).scalars())
+    names |= set(conn.execute(text("SELECT DISTINCT exercise_name FROM workout")).scalars())
+    templates = {tid: template_names(raw) for tid, raw in conn.execute(text("SELECT id, exercises FROM template"))}
+    for template in templates.values():
+        names.update(template)
+    type_ids = catalog.resolve(session, sorted(names))
+    session.flush()
+
+    for table, column in (("exercise", "name"), ("workout", "exercise_name")):
+        if "exercise_type_id" not in [c["name"] for c in inspect(conn).get_columns(table)]:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN exercise_type_id INTEGER REFERENCES exercisetype (id)"))
+        if type_ids:
+            conn.execute(
+                text(f"UPDATE {table} SET exercise_type_id = :type_id WHERE {column} = :name"),
+                [{"type_id": type_id, "name": name} for name, type_id in type_ids.items()],
+            )
+
+    conn.execute(text("""
+        UPDATE workout SET exercise_id = (
+            SELECT MIN(e2.id) FROM exercise e1
+            JOIN exercise e2 ON e2.user_id = e1.user_id AND e2.date = e1.date
+                AND e2.exercise_type_id = e1.exercise_type_id
+            WHERE e1.id = workout.exercise_id
+        )
+    """))
+    conn.execute(text("""
+        DELETE FROM exercise WHERE id NOT IN (
+            SELECT MIN(id) FROM exercise GROUP BY user_id, date, exercise_type_id
+        )
+    """))
+
+    for template_id, template in templates.items():
+        items = {}  # type id -> first spelling
+        for name in template:
+            items.setdefault(type_ids[name], name)
+        if items:
+            conn.execute(
+                text("INSERT INTO templateitem (template_id, position, exercise_type_id, name) VALUES (:t, :p, :e, :n)"),
+                [{"t": template_id, "p": position, "e": type_id, "n": name}
+                 for position, (type_id, name) in enumerate(items.items())],
+            )
+
+    # Indexes on the old columns have to go before the columns can
+    for table, column in (("exercise", "name"), ("workout", "exercise_name"), ("template", "exercises")):
+        for index in inspect(conn).get_indexes(table):
+            if column in index["column_names"]:
+                conn.execute(text(f"DROP INDEX {index['name']}"))
+        if table != "exercise":
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+    session.close()
+
+def migrate_set_ordinals(conn):
+    # Sets get an explicit position within their exercise, numbered in the
+    # order they were logged. The unique (exercise_id, ordinal) index
+    # replaces the plain exercise_id one.
+    from sqlmodel import Session
+    from crud import rebuild_stats
+    from database import ExerciseStats
+
+    if "ordinal" not in [c["name"] for c in inspect(conn).get_columns("workout")]:
+        conn.execute(text("ALTER TABLE workout ADD COLUMN ordinal INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("""
+        UPDATE workout SET ordinal = numbered.ordinal
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY exercise_id ORDER BY id) AS ordinal FROM workout
+        ) AS numbered
+        WHERE workout.id = numbered.id
+    """))
+    conn.execute(text("DROP INDEX IF EXISTS ix_workout_exercise_id"))
+
+    # Dropped by migrate_exercise_catalog when it ran in this same upgrade
+    if not inspect(conn).has_table("exercisestats"):
+        ExerciseStats.__table__.create(conn)
+        with Session(bind=conn) as session:
+            rebuild_stats(session)
+
+def migrate_revisions(conn):
+    # Change-log revisions for GET /sync: users get a revision counter and
+    # exercises, sets and templates the revision of their last change. Rows
+    # from before start at 0 and reach clients through a full sync (since=0).
+    # The tombstone table is created by create_all.
+    for table, column in (('"user"', "revision"), ("exercise", "rev"), ("workout", "rev"), ("template", "rev")):
+        if column not in [c["name"] for c in inspect(conn).get_columns(table.strip('"'))]:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+
+def add_display_name_columns(conn):
+    # Empty until migrate_display_names backfills them
+    for table in ("exercise", "templateitem"):
+        if "name" not in [c["name"] for c in inspect(conn).get_columns(table)]:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN name VARCHAR NOT NULL DEFAULT ''"))
+
+def migrate_autoincrement_ids(conn):
+    # Exercise, set and template ids are never reused, so a retried request
+    # or a sync tombstone holding a deleted id cannot name a newer row. SQLite
+    # can only add AUTOINCREMENT by rebuilding the table (run_migrations has
+    # foreign keys off for this); the counters start above the highest id
+    # ever deleted that a tombstone remembers. Other databases use sequences,
+    # which never hand an id out twice.
+    if conn.dialect.name != "sqlite":
+        return
+    from sqlalchemy.schema import CreateTable
+    from database import Exercise, Template, Workout
+    # The rebuilt exercise table has the name column migrate_display_names
+    # fills in; databases from before it need the column to copy from
+    add_display_name_columns(conn)
+    for model, kind in ((Exercise, "exercise"), (Workout, "set"), (Template, "template")):
+        table = model.__table__
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+        ).scalar()
+        if "AUTOINCREMENT" in sql.upper():
+            continue
+        # The model's table under another name, then swapped in for the old one
+        rebuilt = f"{table.name}_rebuilt"
+        create = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)))
+        # Only the columns the old table has: a missing one would be read as
+        # a string literal
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))}
+        columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name in existing)
+        conn.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}"))
+        # Drops the table's indexes too; run_migrations recreates them
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}"))
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+        conn.execute(text(f"""
+            INSERT INTO sqlite_sequence (name, seq) SELECT :name, MAX(
+                COALESCE((SELECT MAX(id) FROM {table.name}), 0),
+                COALESCE((SELECT MAX(entity_id) FROM tombstone WHERE kind = :kind), 0)
+            )
+        """), {"name": table.name, "kind": kind})
+    for table in ("exercise", "workout", "exercisestats", "template", "templateitem"):
+        broken = conn.execute(text(f"PRAGMA foreign_key_check({table})")).fetchall()
+        if broken:
+            raise RuntimeError(f"{len(broken)} row(s) in '{table}' refer to missing rows")
+
+def migrate_display_names(conn):
+    # Day entries and template items show the name the user typed again
+    # instead of the catalog's label, which is shared by all users. Rows that
+    # lost their spelling to an earlier version of migrate_exercise_catalog
+    # keep the name they were being shown. The seeded catalog names move to
+    # display case.
+    import catalog
+    add_display_name_columns(conn)
+    for table in ("exercise", "templateitem"):
+        conn.execute(text(f"""
+            UPDATE {table} SET name = (SELECT t.name FROM exercisetype t WHERE t.id = {table}.exercise_type_id)
+            WHERE name IS NULL OR name = ''
+        """))
+    conn.execute(
+        text("UPDATE exercisetype SET name = :name WHERE key = :key"),
+        [{"name": name, "key": catalog.normalize(name)} for name in sorted(set(catalog.DEFAULT_ALIASES.values()))],
+    )
+
+MIGRATIONS = [
+    (1, migrate_exercise_keys),
+    (2, migrate_typed_dates),
+    (3, migrate_exercise_stats),
+    (4, migrate_exercise_catalog),
+    (5, migrate_set_ordinals),
+    (6, migrate_revisions),
+    (7, migrate_autoincrement_ids),
+    (8, migrate_display_names),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def run_migrations(engine):
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # Rebuilding a table other tables refer to needs foreign keys off,
+            # which SQLite only lets a connection switch outside a transaction
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            conn.commit()
+        try:
+            with conn.begin():
+                migrate(conn)
+        finally:
+            if sqlite:
+                conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+                conn.commit()
+
+def migrate(conn):
+    tables = inspect(conn).get_table_names()
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+
+    if "user" not in tables:
+        # Fresh database: create_all builds the current schema directly
+        SQLModel.metadata.create_all(conn)
+        seed_catalog(conn)
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": LATEST_VERSION})
+        return
+
+    # Tables added since the database was created
+    SQLModel.metadata.create_all(conn)
+
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    for step_version, step in MIGRATIONS:
+        if step_version > version:
+            step(conn)
+            conn.execute(text("DELETE FROM schema_version"))
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": step_version})
+
+    # Indexes declared on the models, including ones added by the steps above
+    create_indexes(conn)
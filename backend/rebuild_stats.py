@@ -0,0 +1,14 @@
+# rebuild_stats.py
+# Recomputes the per-day exercise summaries used by the progression charts,
+# e.g. after editing sets directly in the database.
+#   python rebuild_stats.py
+from sqlmodel import Session
+from database import init_db, engine
+from crud import rebuild_stats
+
+if __name__ == "__main__":
+    engine.echo = False
+    init_db()
+    with Session(engine) as session:
+        total = rebuild_stats(session, progress=lambda done: print(f"\r{done} exercises", end="", flush=True))
+    print(f"\nRebuilt stats for {total} exercises")
@@ -0,0 +1,207 @@
+# response_cache.py
+# Cache of rendered /analytics/* responses. Each entry is keyed by user,
+# endpoint and parameters plus the version stamp the response was built from
+# (see versions.py), so a stale entry can never be served, even by another
+# worker. Committed writes also evict the user's entries for the stamps they
+# bumped, so dead entries do not sit in memory until the LRU or TTL drops them.
+#   ANALYTICS_CACHE=memory (default) | redis | off
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from serialization import dumps
+
+ANALYTICS_CACHE = os.getenv("ANALYTICS_CACHE", "memory").strip().lower()
+ANALYTICS_CACHE_URL = os.getenv("ANALYTICS_CACHE_URL", "redis://localhost:6379/0")
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "2048"))
+ANALYTICS_CACHE_MAX_BYTES = int(os.getenv("ANALYTICS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "3600"))
+
+class CacheCounters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+class MemoryCache:
+    # LRU bounded by entry count and total body size; entries expire after ttl
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (tag, expires, body)
+        self.tags = {}  # (user_id, resource) -> set of keys
+        self.bytes = 0
+        self.lru_evictions = 0
+        self.expirations = 0
+        self.counters = CacheCounters()
+        self.lock = threading.Lock()
+
+    def _remove(self, key):
+        tag, _, body = self.entries.pop(key)
+        self.bytes -= len(key) + len(body)
+        keys = self.tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.tags[tag]
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.counters.hits += 1
+                return entry[2]
+            if entry:
+                self._remove(key)
+                self.expirations += 1
+            self.counters.misses += 1
+            return None
+
+    def put(self, key: str, tag, body: bytes):
+        size = len(key) + len(body)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (tag, time.monotonic() + self.ttl, body)
+            self.tags.setdefault(tag, set()).add(key)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.lru_evictions += 1
+
+    def evict(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self._remove(key)
+                    self.counters.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "memory",
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "lru_evictions": self.lru_evictions,
+                "expirations": self.expirations,
+                **self.counters.as_dict(),
+            }
+
+class RedisCache:
+    # Any Redis-compatible server (Redis, Valkey, KeyDB, ...). Each
+    # (user, resource) tag keeps a set of its keys for precise eviction;
+    # size is bounded by the TTL plus the server's maxmemory policy.
+    def __init__(self, client, ttl: float, prefix: str = "gymtracker:analytics"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.counters = CacheCounters()
+
+    def tag_key(self, tag):
+        return f"{self.prefix}:tag:{tag[0]}:{tag[1]}"
+
+    def get(self, key: str):
+        body = self.client.get(f"{self.prefix}:{key}")
+        if body is None:
+            self.counters.misses += 1
+        else:
+            self.counters.hits += 1
+        return body
+
+    def put(self, key: str, tag, body: bytes):
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}:{key}", body, ex=self.ttl)
+        pipe.sadd(self.tag_key(tag), key)
+        pipe.expire(self.tag_key(tag), self.ttl)
+        pipe.execute()
+
+    def evict(self, tags):
+        for tag in tags:
+            keys = self.client.smembers(self.tag_key(tag))
+            if keys:
+                self.client.delete(*(f"{self.prefix}:{k.decode() if isinstance(k, bytes) else k}" for k in keys))
+                self.counters.invalidations += len(keys)
+            self.client.delete(self.tag_key(tag))
+
+    def stats(self):
+        try:
+            memory = self.client.info("memory")
+        except Exception:
+            # Not every Redis-compatible server implements INFO
+            memory = {}
+        return {
+            "backend": "redis",
+            "used_memory": memory.get("used_memory"),
+            "maxmemory": memory.get("maxmemory"),
+            "ttl": self.ttl,
+            **self.counters.as_dict(),
+        }
+
+def make_cache():
+    if ANALYTICS_CACHE == "off":
+        return None
+    if ANALYTICS_CACHE == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("ANALYTICS_CACHE=redis needs the redis package installed")
+        return RedisCache(redis.Redis.from_url(ANALYTICS_CACHE_URL), ANALYTICS_CACHE_TTL)
+    if ANALYTICS_CACHE == "memory":
+        return MemoryCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_MAX_BYTES, ANALYTICS_CACHE_TTL)
+    raise ValueError(f"Unknown ANALYTICS_CACHE '{ANALYTICS_CACHE}', expected memory, redis or off")
+
+response_cache = make_cache()
+
+def cache_key(stamp, name: str, params: dict) -> str:
+    return f"{stamp.user_id}:{stamp.resource}:{stamp.version}:{name}:{json.dumps(params, sort_keys=True, default=str)}"
+
+def lookup(stamp, name: str, params: dict):
+    # The cached response for (stamp, name, params), or None
+    if response_cache is None:
+        return None
+    body = response_cache.get(cache_key(stamp, name, params))
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json", headers=stamp.headers())
+
+def store(stamp, name: str, params: dict, content):
+    # Render content once, cache the bytes and return them as the response
+    body = dumps(content)
+    if response_cache is not None:
+        response_cache.put(cache_key(stamp, name, params), (stamp.user_id, stamp.resource), body)
+    return Response(content=body, media_type="application/json", headers=stamp.headers())
+
+def cache_stats():
+    return response_cache.stats() if response_cache else {"backend": "off"}
+
+# versions.bump records the stamps it bumped in session.info; once the
+# transaction commits, the entries built from their old versions are dropped
+@event.listens_for(Session, "after_commit")
+def evict_bumped(session):
+    bumped = session.info.pop("bumped", None)
+    if bumped and response_cache is not None:
+        response_cache.evict(bumped)
+
+@event.listens_for(Session, "after_rollback")
+def forget_bumped(session):
+    session.info.pop("bumped", None)
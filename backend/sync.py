@@ -0,0 +1,295 @@
+# sync.py
+# Delta sync for offline-first clients. Every change to a user's exercises,
+# sets and templates is stamped with the user's next revision
+# (crud.revision) and every delete leaves a Tombstone, so a client keeping a
+# local copy only transfers what changed since the revision it last saw:
+#   GET /sync?since=<revision>   rows created or changed after it and the ids
+#                                deleted after it (since=0: a full copy)
+#   POST /sync                   apply changes made offline, optionally
+#                                followed by the same delta
+# Updates and deletes carry the rev of the row as the client last saw it
+# (base_rev). A row changed on the server since then is a conflict: it is
+# left alone and returned as it is now, for the client to resolve. A batch
+# applies its deletes, then its updates, then its creates, in one
+# transaction stamped with one revision.
+from collections import defaultdict
+from sqlalchemy import bindparam, delete, func, update
+from sqlmodel import Session, select
+from database import User, Exercise, ExerciseStats, Template, TemplateItem, Tombstone, Workout
+from crud import ensure_exercises, insert_sets, record_deletes, refresh_stats, revision, save_template_items
+import catalog
+import versions
+
+KINDS = {"exercise": "exercises", "set": "sets", "template": "templates"}
+
+def exercise_view(row):
+    return {"id": row.id, "date": row.date, "name": row.name, "rev": row.rev}
+
+def set_view(row):
+    return {"id": row.id, "exercise_id": row.exercise_id, "ordinal": row.ordinal, "reps": row.reps,
+            "weight": row.weight, "rev": row.rev}
+
+def exercise_rows(session: Session, user_id: int, *where):
+    return session.exec(
+        select(Exercise.id, Exercise.date, Exercise.name, Exercise.rev)
+        .where(Exercise.user_id == user_id, *where)
+        .order_by(Exercise.id)
+    ).all()
+
+def set_rows(session: Session, user_id: int, *where):
+    return session.exec(
+        select(Workout.id, Workout.exercise_id, Workout.date, Workout.ordinal, Workout.reps, Workout.weight,
+               Workout.rev)
+        .where(Workout.user_id == user_id, *where)
+        .order_by(Workout.id)
+    ).all()
+
+def template_views(session: Session, user_id: int, *where):
+    # Templates with their exercise names, in one query
+    rows = session.exec(
+        select(Template.id, Template.name, Template.rev, TemplateItem.name)
+        .outerjoin(TemplateItem, TemplateItem.template_id == Template.id)
+        .where(Template.user_id == user_id, *where)
+        .order_by(Template.id, TemplateItem.position)
+    ).all()
+    templates = {}
+    for template_id, name, rev, exercise_name in rows:
+        entry = templates.get(template_id)
+        if entry is None:
+            entry = templates[template_id] = {"id": template_id, "name": name, "exercises": [], "rev": rev}
+        if exercise_name is not None:
+            entry["exercises"].append(exercise_name)
+    return list(templates.values())
+
+def current_revision(session: Session, user_id: int) -> int:
+    return session.exec(select(User.revision).where(User.id == user_id)).one()
+
+def load_changes(session: Session, user_id: int, since: int = 0):
+    # Rows created or changed after since, and the ids deleted after it. A
+    # full copy ("full": true, to replace rather than merge) when since is 0
+    # or a revision this server never reached. The revision is read first,
+    # so a change committed meanwhile is sent again next time, never skipped.
+    revision = current_revision(session, user_id)
+    full = since <= 0 or since > revision
+    changed = (lambda rev: ()) if full else (lambda rev: (rev > since,))
+    content = {
+        "revision": revision,
+        "full": full,
+        "exercises": [exercise_view(row) for row in exercise_rows(session, user_id, *changed(Exercise.rev))],
+        "sets": [set_view(row) for row in set_rows(session, user_id, *changed(Workout.rev))],
+        "templates": template_views(session, user_id, *changed(Template.rev)),
+        "deleted": {plural: [] for plural in KINDS.values()},
+    }
+    if not full:
+        for kind, entity_id in session.exec(
+            select(Tombstone.kind, Tombstone.entity_id)
+            .where(Tombstone.user_id == user_id, Tombstone.rev > since)
+            .order_by(Tombstone.rev, Tombstone.entity_id)
+        ).all():
+            content["deleted"][KINDS[kind]].append(entity_id)
+    return content
+
+def result(change, status: str, **fields):
+    return {"ref": change.ref, "status": status, **fields}
+
+def apply_changes(session: Session, user_id: int, changes):
+    # Applies a batch of changes (app.SyncChange) without committing and
+    # returns a result per change, in order: "applied" with the row's id and
+    # rev, "conflict" with the row as it is now (None once deleted), or
+    # "error" with a message. Deleting a row that is already gone applies.
+    results = [None] * len(changes)
+    if not changes:
+        return results
+    rev = revision(session, user_id)
+    resources, refresh = set(), set()  # versions to bump, exercises whose stats change
+
+    ids = defaultdict(set)
+    for change in changes:
+        if change.op != "create" and change.id is not None:
+            ids[change.kind].add(change.id)
+    current = {
+        "exercise": {r.id: r for r in exercise_rows(session, user_id, Exercise.id.in_(ids["exercise"]))}
+        if ids["exercise"] else {},
+        "set": {r.id: r for r in set_rows(session, user_id, Workout.id.in_(ids["set"]))} if ids["set"] else {},
+        "template": {t["id"]: t for t in template_views(session, user_id, Template.id.in_(ids["template"]))}
+        if ids["template"] else {},
+    }
+    # An exercise counts as changed when any of its sets did
+    set_revs = dict(session.exec(
+        select(Workout.exercise_id, func.max(Workout.rev))
+        .where(Workout.exercise_id.in_(ids["exercise"]))
+        .group_by(Workout.exercise_id)
+    ).all()) if ids["exercise"] else {}
+    views = {"exercise": exercise_view, "set": set_view, "template": lambda t: t}
+
+    def check(i, change):
+        # The current row when the change may go ahead; otherwise records the
+        # change's result and returns None
+        if change.id is None:
+            results[i] = result(change, "error", error="id is required")
+            return None
+        row = current[change.kind].get(change.id)
+        if row is None:
+            results[i] = (result(change, "applied", id=change.id) if change.op == "delete"
+                          else result(change, "conflict", id=change.id, current=None))
+            return None
+        rev_now = row["rev"] if change.kind == "template" else row.rev
+        if change.kind == "exercise":
+            rev_now = max(rev_now, set_revs.get(row.id, 0))
+        if rev_now > change.base_rev:
+            results[i] = result(change, "conflict", id=change.id, current=views[change.kind](row))
+            return None
+        return row
+
+    # Deletes
+    deleted = {kind: {} for kind in KINDS}
+    for i, change in enumerate(changes):
+        if change.op == "delete":
+            row = check(i, change)
+            if row is not None:
+                deleted[change.kind][change.id] = row
+                results[i] = result(change, "applied", id=change.id)
+    if deleted["exercise"]:
+        exercise_ids = list(deleted["exercise"])
+        session.exec(delete(ExerciseStats).where(ExerciseStats.exercise_id.in_(exercise_ids)))
+        set_ids = session.exec(
+            delete(Workout).where(Workout.exercise_id.in_(exercise_ids)).returning(Workout.id)
+        ).scalars().all()
+        session.exec(delete(Exercise).where(Exercise.id.in_(exercise_ids)))
+        record_deletes(session, user_id, {"exercise": exercise_ids, "set": set_ids})
+        resources |= versions.days_touched({row.date for row in deleted["exercise"].values()}) | {versions.SETS}
+        # Their sets went with them
+        for set_id in set_ids:
+            current["set"].pop(set_id, None)
+            deleted["set"].pop(set_id, None)
+    if deleted["set"]:
+        session.exec(delete(Workout).where(Workout.id.in_(list(deleted["set"]))))
+        record_deletes(session, user_id, {"set": list(deleted["set"])})
+        refresh.update(row.exercise_id for row in deleted["set"].values())
+        resources |= versions.days_touched({row.date for row in deleted["set"].values()}, exercises=False)
+        resources.add(versions.SETS)
+    if deleted["template"]:
+        template_ids = list(deleted["template"])
+        session.exec(delete(TemplateItem).where(TemplateItem.template_id.in_(template_ids)))
+        session.exec(delete(Template).where(Template.id.in_(template_ids)))
+        record_deletes(session, user_id, {"template": template_ids})
+        resources.add(versions.TEMPLATES)
+    for kind, rows in deleted.items():
+        for row_id in rows:
+            current[kind].pop(row_id, None)
+
+    # Updates: sets (reps, weight) and templates (name, exercises)
+    set_updates = {}
+    for i, change in enumerate(changes):
+        if change.op != "update":
+            continue
+        if change.kind == "exercise":
+            results[i] = result(change, "error", error="Exercises cannot be updated; delete and create instead.")
+            continue
+        row = check(i, change)
+        if row is None:
+            continue
+        values = change.model_dump(include={"reps", "weight"} if change.kind == "set" else {"name", "exercises"},
+                                   exclude_unset=True)
+        if not values:
+            results[i] = result(change, "error", error="Nothing to update.")
+        elif change.kind == "set":
+            set_updates[change.id] = {"set_id": change.id, "new_reps": values.get("reps", row.reps),
+                                      "new_weight": values.get("weight", row.weight)}
+            refresh.add(row.exercise_id)
+            resources |= versions.days_touched([row.date], exercises=False) | {versions.SETS}
+            results[i] = result(change, "applied", id=change.id, rev=rev)
+        else:
+            name = values.get("name") or row["name"]
+            taken = name != row["name"] and session.exec(
+                select(Template.id).where(Template.user_id == user_id, Template.name == name)
+            ).first()
+            if taken:
+                results[i] = result(change, "error", error=f"Template '{name}' already exists.")
+                continue
+            session.exec(update(Template).where(Template.id == change.id).values(name=name, rev=rev))
+            if values.get("exercises") is not None:
+                save_template_items(session, change.id, values["exercises"])
+            resources.add(versions.TEMPLATES)
+            results[i] = result(change, "applied", id=change.id, rev=rev)
+    if set_updates:
+        session.connection().execute(
+            update(Workout.__table__).where(Workout.__table__.c.id == bindparam("set_id"))
+            .values(reps=bindparam("new_reps"), weight=bindparam("new_weight"), rev=rev),
+            list(set_updates.values()),
+        )
+
+    # Creates: exercises and sets by date and exercise name, appended in
+    # batch order; templates by name
+    creates = [(i, change) for i, change in enumerate(changes) if change.op == "create"]
+    entries = []  # (result index, change)
+    for i, change in creates:
+        if change.kind == "template":
+            continue
+        if change.date is None or not change.exercise:
+            results[i] = result(change, "error", error="date and exercise are required")
+        elif change.kind == "set" and change.reps is None:
+            results[i] = result(change, "error", error="reps is required")
+        else:
+            entries.append((i, change))
+    if entries:
+        type_ids = catalog.resolve(session, (change.exercise for _, change in entries))
+        keys = [(change.date, type_ids[change.exercise]) for _, change in entries]
+        names = {}  # the first spelling of each new day entry
+        for key, (_, change) in zip(keys, entries):
+            names.setdefault(key, change.exercise)
+        exercise_ids = ensure_exercises(session, user_id, names)
+        new_sets = [
+            (key, change) for key, (_, change) in zip(keys, entries) if change.kind == "set"
+        ]
+        insert_sets(session, user_id, exercise_ids, (
+            (d, type_id, change.reps, change.weight) for (d, type_id), change in new_sets
+        ))
+        # The new sets are the ones stamped with this revision that were not
+        # updated, in insertion order within each exercise
+        created = defaultdict(list)
+        if new_sets:
+            for set_id, exercise_id in session.exec(
+                select(Workout.id, Workout.exercise_id)
+                .where(Workout.user_id == user_id, Workout.rev == rev)
+                .order_by(Workout.exercise_id, Workout.ordinal)
+            ).all():
+                if set_id not in set_updates:
+                    created[exercise_id].append(set_id)
+        for key, (i, change) in zip(keys, entries):
+            exercise_id = exercise_ids[key]
+            if change.kind == "set":
+                results[i] = result(change, "applied", id=created[exercise_id].pop(0), exercise_id=exercise_id,
+                                    rev=rev)
+            else:
+                results[i] = result(change, "applied", id=exercise_id)
+        refresh.update(exercise_ids[key] for key, _ in new_sets)
+        resources |= versions.days_touched({d for d, _ in keys})
+        if new_sets:
+            resources.add(versions.SETS)
+
+    templates = [(i, change) for i, change in creates if change.kind == "template"]
+    if templates:
+        names = {change.name for _, change in templates if change.name}
+        existing = {
+            t["name"]: t for t in template_views(session, user_id, Template.name.in_(names))
+        } if names else {}
+        for i, change in templates:
+            if not change.name:
+                results[i] = result(change, "error", error="name is required")
+            elif change.name in existing:
+                results[i] = result(change, "conflict", id=existing[change.name]["id"],
+                                    current=existing[change.name])
+            else:
+                template = Template(user_id=user_id, name=change.name, rev=rev)
+                session.add(template)
+                session.flush()
+                save_template_items(session, template.id, change.exercises or [])
+                existing[change.name] = {"id": template.id, "name": change.name, "exercises": change.exercises or [],
+                                         "rev": rev}
+                results[i] = result(change, "applied", id=template.id, rev=rev)
+                resources.add(versions.TEMPLATES)
+
+    refresh_stats(session, refresh)
+    versions.bump(session, user_id, resources)
+    return results
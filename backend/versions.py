@@ -0,0 +1,110 @@
+# versions.py
+# Per-user, per-resource version stamps behind the ETag / Last-Modified
+# headers of the read endpoints. Mutations bump the stamps of what they
+# touched; a conditional GET whose ETag still matches is answered with a
+# 304 after a single primary-key lookup, without running the view's queries.
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from sqlmodel import Session, select
+from database import ResourceVersion
+from crud import dialect_insert
+
+TEMPLATES = "templates"
+SETS = "sets"  # any set of the user; progression and analytics
+
+def day(d) -> str:
+    return f"day:{d.isoformat()}"
+
+def month(year: int, month: int) -> str:
+    return f"month:{year:04d}-{month:02d}"
+
+def days_touched(dates, exercises: bool = True):
+    # Stamps to bump when sets change on the given dates; the month (calendar)
+    # only changes when exercises may have been added or removed
+    resources = set()
+    for d in dates:
+        resources.add(day(d))
+        if exercises:
+            resources.add(month(d.year, d.month))
+    return resources
+
+def bump(session: Session, user_id: int, resources):
+    # One upsert for all the given resources. Does not commit.
+    resources = sorted(set(resources))
+    if not resources:
+        return
+    insert = dialect_insert(session)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    stmt = insert(ResourceVersion).values([
+        {"user_id": user_id, "resource": resource, "version": 1, "updated_at": now}
+        for resource in resources
+    ])
+    # Picked up after commit by response_cache to evict what was built from
+    # the old versions
+    session.info.setdefault("bumped", set()).update((user_id, resource) for resource in resources)
+    session.exec(stmt.on_conflict_do_update(
+        index_elements=["user_id", "resource"],
+        set_={"version": ResourceVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    ))
+
+class Stamp:
+    def __init__(self, user_id: int, resource: str, version: int, updated_at):
+        self.user_id = user_id
+        self.resource = resource
+        self.version = version
+        self.etag = f'W/"{user_id}-{resource}-{version}"'
+        self.last_modified = updated_at.replace(tzinfo=timezone.utc) if updated_at else None  # stored as UTC
+
+    def headers(self):
+        # no-cache: the browser keeps the body but revalidates on every use
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.1.3)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                return self.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def not_modified(self):
+        return Response(status_code=304, headers=self.headers())
+
+    def apply(self, response: Response):
+        response.headers.update(self.headers())
+
+def stamp(session: Session, user_id: int, resource: str) -> Stamp:
+    row = session.exec(
+        select(ResourceVersion.version, ResourceVersion.updated_at).where(
+            ResourceVersion.user_id == user_id,
+            ResourceVersion.resource == resource
+        )
+    ).first()
+    version, updated_at = row if row else (0, None)
+    return Stamp(user_id, resource, version, updated_at)
+
+def combined(session: Session, user_id: int, name: str, resources) -> Stamp:
+    # One stamp for a view built from several resources, read in one query;
+    # its ETag changes whenever any of theirs does
+    rows = {
+        resource: (version, updated_at)
+        for resource, version, updated_at in session.exec(
+            select(ResourceVersion.resource, ResourceVersion.version, ResourceVersion.updated_at).where(
+                ResourceVersion.user_id == user_id,
+                ResourceVersion.resource.in_(resources)
+            )
+        ).all()
+    }
+    version = ".".join(str(rows.get(resource, (0, None))[0]) for resource in resources)
+    updated_at = max((updated for _, updated in rows.values() if updated), default=None)
+    return Stamp(user_id, name, version, updated_at)
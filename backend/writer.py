@@ -0,0 +1,124 @@
+# writer.py
+# Single-writer queue for SQLite. Request threads hand their set inserts to
+# one background thread, which commits whatever has queued up in a single
+# transaction, so N concurrent add_set calls cost one fsync and one lock
+# acquisition instead of N competing ones.
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlmodel import Session
+from database import engine
+from crud import insert_sets, refresh_stats
+import versions
+
+MAX_BATCH = 500
+MAX_WAIT = 0.005  # seconds to wait for more work after the first item
+
+class SetWriter:
+    def __init__(self, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.written = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="set-writer", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        # Flushes what is queued, then ends the thread
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, user_id: int, exercise_id: int, d, exercise_type_id: int, reps, weight,
+               idempotency=None, content=None) -> Future:
+        # idempotency: an idempotency.Idempotency whose key is recorded with
+        # content in the same transaction as the set
+        self.start()
+        future = Future()
+        record = (idempotency, content) if idempotency is not None else None
+        self.pending.put((future, user_id, exercise_id, (d, exercise_type_id, reps, weight), record))
+        return future
+
+    def add_set(self, *args, timeout: float = 30, **kwargs):
+        return self.submit(*args, **kwargs).result(timeout)
+
+    def next_batch(self):
+        item = self.pending.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so run() sees it after this batch
+                self.pending.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def write(self, session: Session, batch):
+        by_user = {}
+        for _, user_id, exercise_id, row, record in batch:
+            by_user.setdefault(user_id, []).append((exercise_id, row))
+            if record is not None:
+                # A repeated key fails the batch, and then just its own set
+                record[0].record(session, record[1])
+        for user_id, rows in by_user.items():
+            exercise_ids = {(d, type_id): exercise_id for exercise_id, (d, type_id, _, _) in rows}
+            insert_sets(session, user_id, exercise_ids, [row for _, row in rows])
+            versions.bump(session, user_id, versions.days_touched((d for d, _ in exercise_ids), exercises=False) | {versions.SETS})
+        refresh_stats(session, [item[2] for item in batch])
+        session.commit()
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            with Session(engine) as session:
+                try:
+                    self.write(session, batch)
+                    results = [None] * len(batch)
+                except Exception:
+                    # One bad set (e.g. its exercise was just deleted) must not
+                    # fail the others: replay the batch one set at a time
+                    session.rollback()
+                    results = []
+                    for item in batch:
+                        try:
+                            self.write(session, [item])
+                            results.append(None)
+                        except Exception as e:
+                            session.rollback()
+                            results.append(e)
+            self.batches += 1
+            self.written += results.count(None)
+            for (future, *_), error in zip(batch, results):
+                if error is None:
+                    future.set_result(True)
+                else:
+                    future.set_exception(error)
+
+    def stats(self):
+        return {
+            "queued": self.pending.qsize(),
+            "batches": self.batches,
+            "written": self.written,
+            "average_batch": round(self.written / self.batches, 2) if self.batches else 0,
+        }
+
+set_writer = SetWriter()
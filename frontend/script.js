@@ -39,9 +39,10 @@ async function checkExistingLogin() {
     }
 
     try {
-        const res = await authFetch("http://127.0.0.1:8000/templates");
+        // The dashboard request doubles as the token check
+        const res = await authFetch(dashboardUrl(todayString()));
         if (res.ok) {
-            showMainContent(); // This will now set date and load data
+            showMainContent(await res.json());
         } else {
             localStorage.removeItem("token");
         }
@@ -115,23 +116,46 @@ registerBtn.addEventListener("click", async () => {
     }
 });
 
-function showMainContent() {
+function todayString() {
+    return new Date().toISOString().split("T")[0];
+}
+
+function dashboardUrl(date) {
+    return `http://127.0.0.1:8000/dashboard?date=${date}`;
+}
+
+function showMainContent(dashboard) {
     loginSection.style.display = "none";
     mainContent.style.display = "block";
     
     // Initialize the page when main content is shown
-    const today = new Date().toISOString().split("T")[0];
-    document.getElementById("global-date").value = today;
+    document.getElementById("global-date").value = todayString();
     
     // Load initial data
-    loadTemplates();
-    viewWorkouts();
+    if (dashboard) renderDashboard(dashboard);
+    else loadDashboard();
+}
+
+// Day view, calendar and templates for the selected date in one request
+async function loadDashboard() {
+    const date = document.getElementById("global-date").value;
+    try {
+        const res = await authFetch(dashboardUrl(date));
+        renderDashboard(await res.json());
+    } catch (err) { console.error(err); }
+}
+
+function renderDashboard(data) {
+    renderTemplates(data.templates);
+    renderDay(data.date, data.day);
+    currentYear = data.calendar.year;
+    currentMonth = data.calendar.month;
+    renderCalendar(data.calendar);
 }
 
 mainContent.style.display = "none";
 
-viewBtn.addEventListener("click", viewWorkouts);
-window.addEventListener('load', loadTemplates);
+viewBtn.addEventListener("click", loadDashboard);
 
 addBtn.addEventListener("click", async (e) => {
     e.preventDefault();
@@ -140,7 +164,7 @@ addBtn.addEventListener("click", async (e) => {
     if (!name) return alert("Please enter an exercise name");
 
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/add_exercise/${date}`, {
+        const res = await authFetch(`http://127.0.0.1:8000/add_exercise/${date}?include_day=true`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ name, sets: [] })
@@ -149,7 +173,7 @@ addBtn.addEventListener("click", async (e) => {
         if (data.error) alert(data.error);
         else {
             document.getElementById("exercise-name").value = "";
-            viewWorkouts();
+            renderDay(date, data.day);
         }
     } catch (err) { console.error(err); }
 });
@@ -160,12 +184,12 @@ applyTemplateBtn.addEventListener("click", async () => {
     const templateName = templateSelect.value;
 
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/apply_template/${date}/${templateName}`, {
+        const res = await authFetch(`http://127.0.0.1:8000/apply_template/${date}/${templateName}?include_day=true`, {
             method: "POST"
         });
         const data = await res.json();
         if (data.error) alert(data.error);
-        else viewWorkouts();
+        else renderDay(date, data.day);
     } catch (err) { console.error(err); }
 });
 
@@ -197,78 +221,86 @@ async function loadTemplates() {
     try {
         const res = await authFetch("http://127.0.0.1:8000/templates");
         const data = await res.json();
-        const templates = data.templates;
-        templateSelect.innerHTML = "";
-        templateListDiv.innerHTML = "";
-
-        Object.keys(templates).forEach(templateName => {
-            const option = document.createElement("option");
-            option.value = templateName;
-            option.textContent = templateName;
-            templateSelect.appendChild(option);
-
-            const templateDiv = document.createElement("div");
-            templateDiv.classList.add("template-item");
-            templateDiv.style.marginBottom = "10px";
-
-            const nameHeading = document.createElement("h4");
-            nameHeading.textContent = templateName;
-            templateDiv.appendChild(nameHeading);
-
-            const exercisesInput = document.createElement("input");
-            exercisesInput.type = "text";
-            exercisesInput.value = templates[templateName].join(", ");
-            exercisesInput.style.width = "70%";
-            templateDiv.appendChild(exercisesInput);
-
-            const saveBtn = document.createElement("button");
-            saveBtn.textContent = "Save";
-            templateDiv.appendChild(saveBtn);
-
-            const deleteBtn = document.createElement("button");
-            deleteBtn.textContent = "Delete";
-            deleteBtn.style.backgroundColor = "red";
-            deleteBtn.style.color = "white";
-            templateDiv.appendChild(deleteBtn);
-
-            saveBtn.addEventListener("click", async () => {
-                const updatedExercises = exercisesInput.value.split(",").map(e => e.trim()).filter(e => e);
-                try {
-                    const res = await authFetch(`http://127.0.0.1:8000/edit_template/${templateName}`, {
-                        method: "PUT",
-                        headers: { "Content-Type": "application/json" },
-                        body: JSON.stringify({ exercises: updatedExercises })
-                    });
-                    const data = await res.json();
-                    if (data.error) alert(data.error);
-                    else loadTemplates();
-                } catch (err) { console.error(err); }
-            });
-
-            deleteBtn.addEventListener("click", async () => {
-                try {
-                    const res = await authFetch(`http://127.0.0.1:8000/delete_template/${templateName}`, {
-                        method: "DELETE"
-                    });
-                    const data = await res.json();
-                    if (data.error) alert(data.error);
-                    else loadTemplates();
-                } catch (err) { console.error(err); }
-            });
-
-            templateListDiv.appendChild(templateDiv);
-        });
+        renderTemplates(data.templates);
     } catch (err) { console.error(err); }
 }
 
+function renderTemplates(templates) {
+    templateSelect.innerHTML = "";
+    templateListDiv.innerHTML = "";
+
+    Object.keys(templates).forEach(templateName => {
+        const option = document.createElement("option");
+        option.value = templateName;
+        option.textContent = templateName;
+        templateSelect.appendChild(option);
+
+        const templateDiv = document.createElement("div");
+        templateDiv.classList.add("template-item");
+        templateDiv.style.marginBottom = "10px";
+
+        const nameHeading = document.createElement("h4");
+        nameHeading.textContent = templateName;
+        templateDiv.appendChild(nameHeading);
+
+        const exercisesInput = document.createElement("input");
+        exercisesInput.type = "text";
+        exercisesInput.value = templates[templateName].join(", ");
+        exercisesInput.style.width = "70%";
+        templateDiv.appendChild(exercisesInput);
+
+        const saveBtn = document.createElement("button");
+        saveBtn.textContent = "Save";
+        templateDiv.appendChild(saveBtn);
+
+        const deleteBtn = document.createElement("button");
+        deleteBtn.textContent = "Delete";
+        deleteBtn.style.backgroundColor = "red";
+        deleteBtn.style.color = "white";
+        templateDiv.appendChild(deleteBtn);
+
+        saveBtn.addEventListener("click", async () => {
+            const updatedExercises = exercisesInput.value.split(",").map(e => e.trim()).filter(e => e);
+            try {
+                const res = await authFetch(`http://127.0.0.1:8000/edit_template/${templateName}`, {
+                    method: "PUT",
+                    headers: { "Content-Type": "application/json" },
+                    body: JSON.stringify({ exercises: updatedExercises })
+                });
+                const data = await res.json();
+                if (data.error) alert(data.error);
+                else loadTemplates();
+            } catch (err) { console.error(err); }
+        });
+
+        deleteBtn.addEventListener("click", async () => {
+            try {
+                const res = await authFetch(`http://127.0.0.1:8000/delete_template/${templateName}`, {
+                    method: "DELETE"
+                });
+                const data = await res.json();
+                if (data.error) alert(data.error);
+                else loadTemplates();
+            } catch (err) { console.error(err); }
+        });
+
+        templateListDiv.appendChild(templateDiv);
+    });
+}
+
 
 async function viewWorkouts() {
     const date = document.getElementById("global-date").value;
+    renderDay(date, await fetchWorkouts(date));
+}
+
+// Write endpoints called with ?include_day=true return the updated day,
+// so there is no refetch after a change
+function renderDay(date, data) {
     const displayDiv = document.getElementById("workouts-display");
     const currentScrollY = window.scrollY; // Store current position
     
     displayDiv.innerHTML = "";
-    const data = await fetchWorkouts(date);
     if (!data.exercises || data.exercises.length === 0) {
         displayDiv.textContent = "No exercises found for this date.";
         return;
@@ -393,38 +425,38 @@ function createSetForm(date, exerciseName) {
 
 async function deleteExercise(date, exerciseName) {
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/delete_exercise/${date}/${exerciseName}`, {
+        const res = await authFetch(`http://127.0.0.1:8000/delete_exercise/${date}/${exerciseName}?include_day=true`, {
             method: "DELETE"
         });
         const data = await res.json();
         if (data.error) alert(data.error);
-        else viewWorkouts();
+        else renderDay(date, data.day);
     } catch (err) { console.error(err); }
 }
 
 
 async function addSet(date, exerciseName, reps, weight) {
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/add_set/${date}/${exerciseName}`, {
+        const res = await authFetch(`http://127.0.0.1:8000/add_set/${date}/${exerciseName}?include_day=true`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ reps: parseInt(reps), weight: parseFloat(weight) })
         });
         const data = await res.json();
         if (data.error) alert(data.error);
-        else viewWorkouts();
+        else renderDay(date, data.day);
     } catch (err) { console.error(err); }
 }
 
 
 async function deleteSet(date, exerciseName, setIndex) {
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/delete_set/${date}/${exerciseName}/${setIndex}`, {
+        const res = await authFetch(`http://127.0.0.1:8000/delete_set/${date}/${exerciseName}/${setIndex}?include_day=true`, {
             method: "DELETE"
         });
         const data = await res.json();
         if (data.error) alert(data.error);
-        else viewWorkouts();
+        else renderDay(date, data.day);
     } catch (err) { console.error(err); }
 }
 
@@ -462,52 +494,56 @@ let currentMonth = new Date().getMonth() + 1; // 1–12
 async function loadCalendar(year, month) {
     try {
         const res = await authFetch(`http://127.0.0.1:8000/analytics/calendar/${year}/${month}`);
-        const data = await res.json();
+        renderCalendar(await res.json());
+    } catch (err) {
+        console.error("Error loading calendar:", err);
+    }
+}
 
-        // Update header
-        const monthName = new Date(year, month - 1).toLocaleString("default", { month: "long" });
-        currentMonthYear.textContent = `${monthName} ${year}`;
+function renderCalendar(data) {
+    const year = data.year;
+    const month = data.month;
 
-        // Clear old grid
-        calendarGrid.innerHTML = "";
+    // Update header
+    const monthName = new Date(year, month - 1).toLocaleString("default", { month: "long" });
+    currentMonthYear.textContent = `${monthName} ${year}`;
 
-        // Days of week header (optional)
-        ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"].forEach(d => {
-            const headerCell = document.createElement("div");
-            headerCell.textContent = d;
-            headerCell.style.fontWeight = "bold";
-            calendarGrid.appendChild(headerCell);
-        });
+    // Clear old grid
+    calendarGrid.innerHTML = "";
 
-        // Calculate first weekday offset
-        const firstDay = new Date(year, month - 1, 1).getDay();
-        for (let i = 0; i < firstDay; i++) {
-            const emptyCell = document.createElement("div");
-            emptyCell.className = "calendar-day empty";
-            calendarGrid.appendChild(emptyCell);
-        }
+    // Days of week header (optional)
+    ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"].forEach(d => {
+        const headerCell = document.createElement("div");
+        headerCell.textContent = d;
+        headerCell.style.fontWeight = "bold";
+        calendarGrid.appendChild(headerCell);
+    });
+
+    // Calculate first weekday offset
+    const firstDay = new Date(year, month - 1, 1).getDay();
+    for (let i = 0; i < firstDay; i++) {
+        const emptyCell = document.createElement("div");
+        emptyCell.className = "calendar-day empty";
+        calendarGrid.appendChild(emptyCell);
+    }
 
-        // Fill in days
-        const days = data.days;
-        Object.keys(days).forEach(dateStr => {
-            const isWorkout = days[dateStr];
-            const day = parseInt(dateStr.split("-")[2]);
-
-            const dayDiv = document.createElement("div");
-            dayDiv.className = "calendar-day " + (isWorkout ? "workout-day" : "rest-day");
-            dayDiv.textContent = day;
-            dayDiv.addEventListener("click", () => {
-                    document.getElementById("global-date").value = dateStr; // update global date input
-                    viewWorkouts(); // load workouts for clicked day
-                    window.scrollTo({ top: document.getElementById("workouts-display").offsetTop, behavior: "smooth" });
-            });
-
-            calendarGrid.appendChild(dayDiv);
+    // Fill in days
+    const days = data.days;
+    Object.keys(days).forEach(dateStr => {
+        const isWorkout = days[dateStr];
+        const day = parseInt(dateStr.split("-")[2]);
+
+        const dayDiv = document.createElement("div");
+        dayDiv.className = "calendar-day " + (isWorkout ? "workout-day" : "rest-day");
+        dayDiv.textContent = day;
+        dayDiv.addEventListener("click", () => {
+                document.getElementById("global-date").value = dateStr; // update global date input
+                viewWorkouts(); // load workouts for clicked day
+                window.scrollTo({ top: document.getElementById("workouts-display").offsetTop, behavior: "smooth" });
         });
 
-    } catch (err) {
-        console.error("Error loading calendar:", err);
-    }
+        calendarGrid.appendChild(dayDiv);
+    });
 }
 
 // Event listeners for navigation
@@ -529,10 +565,6 @@ nextMonthBtn.addEventListener("click", () => {
     loadCalendar(currentYear, currentMonth);
 });
 
-// Initialize
-window.addEventListener("load", () => {
-    loadCalendar(currentYear, currentMonth);
-});
 
 const loadChartBtn = document.getElementById("load-chart-btn");
 let progressionChart = null; // Store chart instance so we can update it
@@ -555,7 +587,11 @@ loadChartBtn.addEventListener("click", async () => {
     }
     
     try {
-        const res = await authFetch(`http://127.0.0.1:8000/analytics/exercise_progression/${encodeURIComponent(exerciseName)}`);
+        // About one point per 3 pixels is all the canvas can show; the server
+        // downsamples longer histories but keeps every record
+        const canvas = document.getElementById('progression-chart');
+        const maxPoints = Math.max(50, Math.floor((canvas.clientWidth || 900) / 3));
+        const res = await authFetch(`http://127.0.0.1:8000/analytics/exercise_progression/${encodeURIComponent(exerciseName)}?max_points=${maxPoints}`);
         const data = await res.json();
         
         if (data.error) {